@@ -0,0 +1,13 @@
+import os
+from django.core.asgi import get_asgi_application
+from AP_knowledge.assets import StaticFilesASGI
+
+# 指向你的 settings 文件
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AP_knowledge.settings')
+# ASGI 部署默认启用异步版本的公开视图 (见 knowledge/async_views.py)
+os.environ.setdefault('KNOWLEDGE_ASYNC_VIEWS', '1')
+# 不使用持久数据库连接 (见 settings.DATABASE_CONN_MAX_AGE)
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
+
+# 静态文件由 assets 层直接返回 (哈希文件名 + 预压缩 + 长缓存)，其余请求交给 Django
+application = StaticFilesASGI(get_asgi_application())
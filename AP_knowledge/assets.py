@@ -0,0 +1,211 @@
+"""
+轻量静态文件服务层，包在 WSGI / ASGI 应用外面使用
+
+- 从 STATIC_ROOT (collectstatic 输出) 直接返回文件，不经过 Django 中间件和视图
+- 根据 Accept-Encoding (含 q 值) 返回预压缩的 .br / .gz 版本
+- 带内容哈希的文件名 (staticfiles.json 清单中的值) 返回一年的 immutable 缓存头，
+  其他文件返回较短的缓存时间；支持 ETag / If-None-Match
+- STATIC_ROOT 的查找结果缓存在进程内 (collectstatic 后重启生效)；媒体文件会被删除、覆盖，每次请求重新 stat，
+  文件不存在时交给应用处理 (404)
+"""
+import json
+import mimetypes
+import os
+import posixpath
+from email.utils import formatdate
+from urllib.parse import unquote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+def accepted_encodings(header):
+    """
+    按 Accept-Encoding 返回客户端接受的预压缩版本，q 值高的在前，相同时按 ENCODINGS 的顺序；
+    q=0 表示不接受，未列出的编码取 * 的 q 值
+
+    >>> accepted_encodings('gzip, deflate, br')
+    (('br', '.br'), ('gzip', '.gz'))
+    >>> accepted_encodings('br;q=0, gzip')
+    (('gzip', '.gz'),)
+    >>> accepted_encodings('gzip;q=0.5, br;q=0.8')
+    (('br', '.br'), ('gzip', '.gz'))
+    >>> accepted_encodings('gzip;q=1, *;q=0.1')
+    (('gzip', '.gz'), ('br', '.br'))
+    >>> accepted_encodings('')
+    ()
+    """
+    qualities = {}
+    for part in header.lower().split(','):
+        coding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            qualities[coding.strip()] = quality
+    default = qualities.get('*', 0.0)
+    accepted = [(qualities.get(enc, default), enc, ext) for enc, ext in ENCODINGS]
+    # sorted 是稳定排序，q 值相同时保持 ENCODINGS 的优先顺序
+    return tuple((enc, ext) for quality, enc, ext in sorted(accepted, key=lambda item: -item[0]) if quality > 0)
+
+
+class StaticFile:
+    def __init__(self, path, headers, etag):
+        self.path = path
+        self.headers = headers
+        self.etag = etag
+
+
+class StaticFileIndex:
+    """URL -> 文件及响应头的映射，静态文件的 stat 结果缓存在进程内"""
+
+    def __init__(self):
+        self.roots = []
+        if settings.STATIC_ROOT:
+            self.roots.append((settings.STATIC_URL, str(settings.STATIC_ROOT), self._load_manifest(), True))
+        if getattr(settings, 'ASSETS_SERVE_MEDIA', False) and settings.MEDIA_ROOT:
+            self.roots.append((settings.MEDIA_URL, str(settings.MEDIA_ROOT), set(), False))
+        self.max_age = getattr(settings, 'ASSETS_MAX_AGE', 60)
+        self._cache = {}
+
+    def _load_manifest(self):
+        manifest = os.path.join(str(settings.STATIC_ROOT), 'staticfiles.json')
+        try:
+            with open(manifest, encoding='utf-8') as f:
+                return set(json.load(f).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def find(self, url_path, accept_encoding):
+        for prefix, root, hashed_names, cacheable in self.roots:
+            if url_path.startswith(prefix):
+                name = posixpath.normpath(unquote(url_path[len(prefix):])).lstrip('/')
+                if name.startswith('..'):
+                    return None
+                return self._lookup(root, name, name in hashed_names, accepted_encodings(accept_encoding), cacheable)
+        return None
+
+    def _lookup(self, root, name, immutable, encodings, cacheable=True):
+        key = (root, name, encodings)
+        if cacheable and key in self._cache:
+            return self._cache[key]
+
+        try:
+            result = self._stat(os.path.join(root, *name.split('/')), immutable, encodings)
+        except OSError:
+            # 检查与读取之间文件被删除
+            return None
+        # 只缓存命中的静态文件，避免不存在的 URL 把缓存撑大
+        if cacheable and result is not None:
+            self._cache[key] = result
+        return result
+
+    def _stat(self, path, immutable, encodings):
+        if os.path.isfile(path):
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+                content_type += '; charset=utf-8'
+            served, encoding = path, None
+            for enc, ext in encodings:
+                if os.path.isfile(path + ext):
+                    served, encoding = path + ext, enc
+                    break
+            stat = os.stat(served)
+            etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+            headers = [
+                ('Content-Type', content_type),
+                ('Content-Length', str(stat.st_size)),
+                ('Cache-Control', IMMUTABLE_CACHE if immutable else f'public, max-age={self.max_age}'),
+                ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+                ('ETag', etag),
+                ('Vary', 'Accept-Encoding'),
+            ]
+            if encoding:
+                headers.append(('Content-Encoding', encoding))
+            return StaticFile(served, headers, etag)
+        return None
+
+
+class StaticFilesWSGI:
+    def __init__(self, application):
+        self.application = application
+        self.index = StaticFileIndex()
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD')
+        if method in ('GET', 'HEAD'):
+            found = self.index.find(environ.get('PATH_INFO', ''), environ.get('HTTP_ACCEPT_ENCODING', ''))
+            if found is not None:
+                if environ.get('HTTP_IF_NONE_MATCH') == found.etag:
+                    start_response('304 Not Modified', [h for h in found.headers if h[0] != 'Content-Length'])
+                    return []
+                # 先打开文件再发送响应头，文件刚被删除时交给应用返回 404
+                try:
+                    f = open(found.path, 'rb')
+                except OSError:
+                    return self.application(environ, start_response)
+                start_response('200 OK', found.headers)
+                if method == 'HEAD':
+                    f.close()
+                    return []
+                file_wrapper = environ.get('wsgi.file_wrapper')
+                if file_wrapper:
+                    return file_wrapper(f, CHUNK_SIZE)
+                return iter(lambda: f.read(CHUNK_SIZE), b'')
+        return self.application(environ, start_response)
+
+
+def to_thread(func):
+    return sync_to_async(func, thread_sensitive=False)
+
+
+class StaticFilesASGI:
+    def __init__(self, application):
+        self.application = application
+        self.index = StaticFileIndex()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            headers = dict(scope.get('headers', []))
+            found = self.index.find(scope['path'], headers.get(b'accept-encoding', b'').decode('latin-1'))
+            if found is not None:
+                not_modified = headers.get(b'if-none-match', b'').decode('latin-1') == found.etag
+                f = None
+                if not not_modified and scope['method'] == 'GET':
+                    # 先打开文件再发送响应头，文件刚被删除时交给应用返回 404
+                    try:
+                        f = await to_thread(open)(found.path, 'rb')
+                    except OSError:
+                        await self.application(scope, receive, send)
+                        return
+                response_headers = [
+                    (k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in found.headers
+                    if not (not_modified and k == 'Content-Length')
+                ]
+                await send({'type': 'http.response.start', 'status': 304 if not_modified else 200,
+                            'headers': response_headers})
+                if f is None:
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return
+                # 分块读取发送，大文件不整个读入内存
+                try:
+                    read = to_thread(f.read)
+                    more_body = True
+                    while more_body:
+                        chunk = await read(CHUNK_SIZE)
+                        # 读到不足一块即文件结束；大小正好是整块时最后多发一个空块
+                        more_body = len(chunk) == CHUNK_SIZE
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                finally:
+                    await to_thread(f.close)()
+                return
+        await self.application(scope, receive, send)
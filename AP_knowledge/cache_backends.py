@@ -0,0 +1,279 @@
+"""
+两级缓存：进程内 LRU + 多进程/多节点共享的缓存 (文件缓存、Redis、Memcached 均可)
+
+- 读：先查进程内 LRU，未命中再查共享缓存并回填；写：同时写两级
+- 一致性：进程内条目记录写入时的全局内容版本号 (knowledge.cache.CONTENT_VERSION_KEY，保存在共享缓存中)，
+  版本号变化后进程内条目全部作废。每个进程最多每 VERSION_CHECK_INTERVAL 秒读一次版本号，
+  本进程递增版本号时立即生效；进程内条目另有 LOCAL_TIMEOUT 上限
+- 版本号本身和 LOCAL_EXCLUDE_PREFIXES 开头的 key (限流计数等需要跨进程实时一致的状态) 只走共享缓存
+- 命中、回源、淘汰、作废次数按进程统计，定期写入共享缓存，manage.py cache_stats 汇总查看
+- Django 为每个线程创建单独的缓存实例，进程内 LRU、计数和版本号因此放在模块级的 _states 中
+  (按 LOCATION 区分，同 LocMemCache)，同一进程的所有线程共用
+"""
+import os
+import pickle
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STATS_INDEX_KEY = 'cache_stats:workers'
+STATS_KEY_PREFIX = 'cache_stats:'
+STAT_NAMES = ('local_hits', 'shared_hits', 'misses', 'evictions', 'invalidations', 'sets')
+
+_MISSING = object()
+
+# LOCATION -> _ProcessState
+_states = {}
+_states_lock = threading.Lock()
+
+
+class LocalLRU:
+    """进程内 LRU：key -> (pickle 后的值, 过期时间, 写入时的内容版本号)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """返回 (状态, 值)；状态为 hit / miss / stale"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return 'miss', None
+            data, expires, content_version = entry
+            if content_version != version or (expires is not None and expires <= time.monotonic()):
+                del self._data[key]
+                return 'stale', None
+            self._data.move_to_end(key)
+        return 'hit', pickle.loads(data)
+
+    def set(self, key, data, ttl, version):
+        """返回淘汰的条目数"""
+        expires = time.monotonic() + ttl if ttl is not None else None
+        evicted = 0
+        with self._lock:
+            self._data[key] = (data, expires, version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _ProcessState:
+    """一个进程内共用的 LRU、统计计数和内容版本号"""
+
+    def __init__(self, max_entries):
+        self.pid = os.getpid()
+        self.local = LocalLRU(max_entries)
+        self.counters = dict.fromkeys(STAT_NAMES, 0)
+        self.lock = threading.Lock()
+        self.version = None
+        self.version_checked = 0.0
+        self.stats_published = time.monotonic()
+
+
+def _process_state(location, max_entries):
+    with _states_lock:
+        state = _states.get(location)
+        # fork 出的子进程不沿用父进程的条目和计数
+        if state is None or state.pid != os.getpid():
+            state = _states[location] = _ProcessState(max_entries)
+        return state
+
+
+class TwoTierCache(BaseCache):
+    """
+    CACHES 配置示例：
+        'default': {'BACKEND': 'AP_knowledge.cache_backends.TwoTierCache',
+                    'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAX_ENTRIES': 1000}},
+        'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '...'},
+    """
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(params)
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.version_key = options.get('VERSION_KEY', 'knowledge:content_version')
+        self.version_check_interval = options.get('VERSION_CHECK_INTERVAL', 1.0)
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 300)
+        self.local_max_value_size = options.get('LOCAL_MAX_VALUE_SIZE', 512 * 1024)
+        self.exclude_prefixes = tuple(options.get('LOCAL_EXCLUDE_PREFIXES', ('ratelimit:',))) + (
+            self.version_key, STATS_KEY_PREFIX)
+        self.stats_interval = options.get('STATS_INTERVAL', 60)
+        self._location = location
+        self._max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._state = _process_state(location, self._max_entries)
+
+    @property
+    def state(self):
+        if self._state.pid != os.getpid():
+            self._state = _process_state(self._location, self._max_entries)
+        return self._state
+
+    @property
+    def local(self):
+        return self.state.local
+
+    @property
+    def worker_id(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    # --- 版本号与统计 ---
+
+    def current_version(self):
+        state = self.state
+        now = time.monotonic()
+        if state.version is None or now - state.version_checked >= self.version_check_interval:
+            state.version = self.shared.get(self.version_key)
+            state.version_checked = now
+        return state.version
+
+    def _count(self, name, amount=1):
+        state = self.state
+        with state.lock:
+            state.counters[name] += amount
+            due = time.monotonic() - state.stats_published >= self.stats_interval
+            if due:
+                state.stats_published = time.monotonic()
+        if due:
+            self.publish_stats()
+
+    def stats(self):
+        state = self.state
+        with state.lock:
+            stats = dict(state.counters)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['local_entries'] = len(self.local)
+        stats['local_hit_rate'] = stats['local_hits'] / lookups if lookups else 0
+        stats['hit_rate'] = (stats['local_hits'] + stats['shared_hits']) / lookups if lookups else 0
+        return stats
+
+    def publish_stats(self):
+        """把本进程的统计写入共享缓存，供 cache_stats 命令汇总"""
+        try:
+            shared = self.shared
+            shared.set(STATS_KEY_PREFIX + self.worker_id, {**self.stats(), 'updated': time.time()},
+                       timeout=max(self.stats_interval * 10, 600))
+            workers = shared.get(STATS_INDEX_KEY) or []
+            if self.worker_id not in workers:
+                # 非原子的读-改-写，并发时可能丢失个别进程，下个周期会再补上
+                shared.set(STATS_INDEX_KEY, (workers + [self.worker_id])[-200:], timeout=None)
+        except Exception:
+            pass
+
+    # --- 缓存接口 ---
+
+    def _local_key(self, key, version):
+        if key.startswith(self.exclude_prefixes):
+            return None
+        return self.make_and_validate_key(key, version=version)
+
+    def _local_ttl(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(max(timeout - time.time(), 0), self.local_timeout)
+
+    def _store_local(self, local_key, value, timeout):
+        if local_key is None:
+            return
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.local_max_value_size:
+            return
+        evicted = self.local.set(local_key, data, self._local_ttl(timeout), self.current_version())
+        if evicted:
+            self._count('evictions', evicted)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            state, value = self.local.get(local_key, self.current_version())
+            if state == 'hit':
+                self._count('local_hits')
+                return value
+            if state == 'stale':
+                self._count('invalidations')
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('shared_hits')
+        # 共享缓存不提供剩余有效期，进程内最多保留 LOCAL_TIMEOUT 秒
+        self._store_local(local_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._count('sets')
+        self._store_local(self._local_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._store_local(self._local_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.delete(local_key)
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.delete(local_key)
+        if key == self.version_key:
+            # 部分后端 (如文件缓存) 的 incr 是读后重写，会把有效期重置为默认值，版本号需要永久保存
+            self.shared.touch(key, timeout=None, version=version)
+            # 本进程递增的版本号立即生效
+            self.state.version, self.state.version_checked = value, time.monotonic()
+        return value
+
+    def clear(self):
+        self.local.clear()
+        self.state.version = None
+        return self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def collect_stats(cache_alias='default'):
+    """读取共享缓存中各进程的统计，返回 [(进程, 统计)]"""
+    cache = caches[cache_alias]
+    if not isinstance(cache, TwoTierCache):
+        return []
+    cache.publish_stats()
+    shared = cache.shared
+    workers = shared.get(STATS_INDEX_KEY) or []
+    found = shared.get_many([STATS_KEY_PREFIX + worker for worker in workers])
+    return [(worker, found[STATS_KEY_PREFIX + worker]) for worker in workers if STATS_KEY_PREFIX + worker in found]
@@ -0,0 +1,102 @@
+"""
+SQLite 生产环境配置与读写分离路由
+
+- 每个新连接执行 PRAGMA：WAL 日志、synchronous=NORMAL、mmap、页缓存、busy_timeout
+- 写事务使用 BEGIN IMMEDIATE，避免读锁升级为写锁时的死锁 ("database is locked")
+- 公开只读页面通过 use_readonly_db 使用独立的只读连接 (同一个数据库文件，mode=ro)
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+
+READONLY_ALIAS = 'readonly'
+
+# 读写连接共用的 PRAGMA (journal_mode 只能由可写连接设置)
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',       # WAL 模式下 NORMAL 已能保证一致性，显著减少 fsync
+    'mmap_size': 256 * 1024 * 1024,  # 通过 mmap 读取数据库文件，减少 read() 拷贝
+    'cache_size': -64 * 1024,      # 负数单位为 KiB，即每个连接 64MB 页缓存
+    'busy_timeout': 5000,          # 遇到锁时最多等待 5 秒，而不是立即报错
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_init_command(pragmas=None, readonly=False):
+    pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+    commands = [] if readonly else ['PRAGMA journal_mode=WAL']
+    commands += [f'PRAGMA {key}={value}' for key, value in pragmas.items()]
+    if readonly:
+        commands.append('PRAGMA query_only=1')
+    return ';'.join(commands)
+
+
+def sqlite_database(path, readonly=False, conn_max_age=60, pragmas=None):
+    """生成 settings.DATABASES 中的 SQLite 配置项"""
+    config = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{path}?mode=ro' if readonly else path,
+        # 持久连接，避免每个请求重新打开文件并执行 PRAGMA；ASGI 部署传 0 (连接按线程保存)
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': sqlite_init_command(pragmas, readonly=readonly),
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+    }
+    if readonly:
+        # 测试时只读连接指向默认测试库，而不是另建一个
+        config['TEST'] = {'MIRROR': 'default'}
+    else:
+        config['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    return config
+
+
+# 当前请求是否允许走只读连接
+_use_readonly = ContextVar('knowledge_use_readonly_db', default=False)
+
+
+@contextmanager
+def readonly_db():
+    token = _use_readonly.set(True)
+    try:
+        yield
+    finally:
+        _use_readonly.reset(token)
+
+
+def use_readonly_db(view):
+    """视图装饰器：视图内的读查询使用只读连接，写操作仍走默认连接"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            with readonly_db():
+                return await view(*args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with readonly_db():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+class ReadOnlyRouter:
+    """把 use_readonly_db 视图中的读查询路由到只读连接"""
+
+    def db_for_read(self, model, **hints):
+        from django.conf import settings
+        if _use_readonly.get() and READONLY_ALIAS in settings.DATABASES:
+            return READONLY_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # 从只读连接读出的对象保存时也必须写入默认库
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 两个连接指向同一个数据库文件
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READONLY_ALIAS
@@ -3,6 +3,8 @@ from pathlib import Path
 
 from django.utils.translation import gettext_lazy as _
 
+from .database import sqlite_database
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-test-key-replace-this-in-production'
 DEBUG = True
@@ -26,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'knowledge.middleware.PerformanceMiddleware',  # 放在最前面，统计整个请求耗时
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # 即使做纯中文，这个也建议留着，防报错
@@ -55,12 +58,49 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'AP_knowledge.wsgi.application'
+ASGI_APPLICATION = 'AP_knowledge.asgi.application'
+
+# 公开页面使用异步视图 (knowledge/async_views.py)，ASGI 入口会自动开启
+KNOWLEDGE_ASYNC_VIEWS = os.environ.get('KNOWLEDGE_ASYNC_VIEWS', '0') == '1'
+# 异步视图中存储 I/O、图片处理等阻塞操作使用的线程池大小
+BLOCKING_IO_WORKERS = int(os.environ.get('BLOCKING_IO_WORKERS', 8))
 
+# 持久连接的保持时间 (秒)。ASGI 入口默认为 0：同步查询在不固定的线程中执行，
+# 连接按线程保存，持久连接会随线程累积而不会被复用和关闭
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+# SQLite 连接参数 (WAL、PRAGMA、持久连接) 见 AP_knowledge/database.py
 DATABASES = {
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3', conn_max_age=DATABASE_CONN_MAX_AGE),
+    # 公开只读页面使用的只读连接，同一个数据库文件
+    'readonly': sqlite_database(BASE_DIR / 'db.sqlite3', readonly=True, conn_max_age=DATABASE_CONN_MAX_AGE),
+}
+DATABASE_ROUTERS = ['AP_knowledge.database.ReadOnlyRouter']
+
+# === 缓存 ===
+# 两级缓存 (AP_knowledge/cache_backends.py)：进程内 LRU + 各进程/节点共享的缓存，以内容版本号保持一致。
+# 共享缓存默认是本机文件缓存 (同一节点的多个 worker 共享)；多节点部署时通过环境变量换成 Redis，如
+# SHARED_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache SHARED_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'AP_knowledge.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            # 进程内缓存单条上限 (pickle 后字节数) 与最长保留秒数
+            'LOCAL_MAX_VALUE_SIZE': 512 * 1024,
+            'LOCAL_TIMEOUT': 60,
+            # 每个进程读取内容版本号的最短间隔 (秒)，即其他进程修改内容后本进程最多滞后的时间
+            'VERSION_CHECK_INTERVAL': 1.0,
+            # 只走共享缓存的 key 前缀 (需要跨进程实时一致的状态)
+            'LOCAL_EXCLUDE_PREFIXES': ('ratelimit:',),
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
 # === 国际化配置 (全中文) ===
@@ -80,11 +120,150 @@ LANGUAGES = (
 # === 静态文件与媒体文件 ===
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
+# collectstatic 输出目录：文件名带内容哈希，并生成 .gz/.br 预压缩版本 (knowledge/staticfiles.py)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic 时需要压缩的 CSS 目录前缀
+STATIC_MINIFY_PREFIXES = ('css/',)
+STORAGES = {
+    # MEDIA_STORAGE=s3 时上传文件保存到对象存储 (见下方 S3_* 配置)
+    'default': {'BACKEND': 'knowledge.s3storage.S3Storage' if os.environ.get('MEDIA_STORAGE') == 's3'
+                else 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'knowledge.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# wsgi.py / asgi.py 中的静态文件服务层 (AP_knowledge/assets.py)
+# 非哈希文件名的缓存时间 (秒)；是否同时直接服务 MEDIA_ROOT 下的文件
+ASSETS_MAX_AGE = 60
+ASSETS_SERVE_MEDIA = False
 
 # 必须配置 Media，否则图片上传后无法显示
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# === 对象存储 (S3 兼容，knowledge/s3storage.py，需要 boto3) ===
+# 多节点部署时共享上传文件；MinIO 等自建服务填写 S3_ENDPOINT_URL 并使用 path 形式地址
+S3_BUCKET = os.environ.get('S3_BUCKET')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+S3_REGION = os.environ.get('S3_REGION') or None
+S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY') or None
+S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY') or None
+S3_ADDRESSING_STYLE = os.environ.get('S3_ADDRESSING_STYLE', 'auto')
+# 对象 key 的前缀 (同一个桶存放多个站点时区分)
+S3_PREFIX = 'media'
+# 'redirect': /media/ 地址跳转到临时签名地址；'proxy': 由 Django 读取后返回；'public': 直接使用 S3_PUBLIC_URL
+S3_URL_MODE = os.environ.get('S3_URL_MODE', 'redirect')
+S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL') or None
+S3_PRESIGN_EXPIRES = 3600
+# 每个进程的 HTTP 连接池大小；超过阈值的文件分片上传，分片大小与并行数
+S3_MAX_POOL_CONNECTIONS = 20
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+S3_MAX_CONCURRENCY = 4
+# exists() / size() 结果的缓存 (只缓存存在的文件)
+S3_METADATA_CACHE = 'default'
+S3_METADATA_CACHE_TIMEOUT = 3600
+
+# === 附件下载 ===
+# 设为 'nginx' 使用 X-Accel-Redirect，设为 'apache' 使用 X-Sendfile，由前端代理直接发送文件
+ATTACHMENT_SENDFILE_BACKEND = os.environ.get('ATTACHMENT_SENDFILE_BACKEND') or None
+# Nginx 中对应 MEDIA_ROOT 的 internal location
+ATTACHMENT_SENDFILE_PREFIX = '/protected-media/'
+# Django 自己发送文件时每次读取的块大小
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+# 下载次数等计数的批量写回策略：累计次数或间隔秒数任一达到即写回
+COUNTER_FLUSH_THRESHOLD = 50
+COUNTER_FLUSH_INTERVAL = 10
+
+# === 附件正文提取 (参与搜索) ===
+# 附件保存后在后台提取正文；关闭后只由 manage.py extract_attachments 处理
+ATTACHMENT_EXTRACT_ON_SAVE = True
+# 提取用的子进程数、单个文件的超时 (秒) 与子进程内存上限 (MB)
+ATTACHMENT_EXTRACT_WORKERS = 2
+ATTACHMENT_EXTRACT_TIMEOUT = 30
+ATTACHMENT_EXTRACT_MEMORY_MB = 512
+# 超过该大小的文件不提取；提取出的正文最多保存的字符数
+ATTACHMENT_EXTRACT_MAX_BYTES = 50 * 1024 * 1024
+ATTACHMENT_TEXT_MAX_CHARS = 100000
+
+# === 图片压缩优化 (manage.py optimize_media) ===
+# 上传时即压缩优化编辑器图片 (截图量化、照片类 PNG 转 JPEG)，关闭时保持原格式
+MEDIA_OPTIMIZE_ON_UPLOAD = False
+# 重新编码为 JPEG 时的质量 (已有 JPEG 沿用原质量，不重新量化)
+MEDIA_OPTIMIZE_JPEG_QUALITY = 85
+# 颜色较少的 PNG 截图量化为 256 色；不透明的照片类 PNG 转为 JPEG
+MEDIA_OPTIMIZE_QUANTIZE = True
+MEDIA_OPTIMIZE_CONVERT = True
+# 至少变小这个比例才替换原文件
+MEDIA_OPTIMIZE_MIN_SAVING = 0.05
+
+# === 后台 (Admin) ===
+# 列表总数缓存时间 (秒)，避免翻页时反复 COUNT(*)
+ADMIN_COUNT_CACHE_TIMEOUT = 60
+# PostgreSQL 上未筛选的列表行数超过该值时使用估算行数
+ADMIN_ESTIMATE_THRESHOLD = 10000
+# 文章编辑页评论内联显示的最新评论数
+ADMIN_INLINE_COMMENTS = 20
+
+# === 修订历史 ===
+# 每隔多少个版本存一次完整快照 (还原任一版本最多回放这么多个增量)
+REVISION_SNAPSHOT_INTERVAL = 10
+# manage.py prune_revisions 默认每篇文章保留的版本数
+REVISION_KEEP = 50
+
+# === 正文压缩存储 (knowledge/content_storage.py，manage.py compress_content) ===
+# 'zlib'、'zstd' (需要 pip install zstandard) 或 None (明文存储)；只影响之后保存的文章，
+# 已有文章用 compress_content 转换 (关闭前先运行 compress_content --decompress)
+ARTICLE_CONTENT_COMPRESSION = None
+# 小于该字节数的正文不压缩 (收益小，还要多一次解压)
+ARTICLE_CONTENT_COMPRESS_MIN_BYTES = 2048
+# 压缩级别，None 使用默认值 (zlib 6，zstd 9)
+ARTICLE_CONTENT_COMPRESS_LEVEL = None
+
+# === 启动耗时预算 (manage.py check_startup) ===
+# worker_boot: 初始化 Django 并加载全部视图的耗时；imports: 其中模块导入的总耗时；
+# manage_check: 执行 manage.py check 的总耗时 (含解释器启动)。单位毫秒
+STARTUP_BUDGETS = {
+    'worker_boot': 1200,
+    'imports': 1000,
+    'manage_check': 2500,
+}
+# 只在需要时才导入的模块，出现在 Web 进程启动阶段视为回归
+STARTUP_LAZY_MODULES = ('markdown', 'django.test', 'knowledge.archive', 'knowledge.search_index')
+
+# === 限流 ===
+# 写入接口的频率限制 (按接口 + 客户端 IP 的令牌桶)，格式 "次数/周期"，周期可为 s/m/h/d，如 "10/5m"
+RATE_LIMIT_ENABLED = True
+# 反向代理的地址或网段。只有 REMOTE_ADDR 属于这些代理时才从 X-Forwarded-For 取客户端 IP
+# (从右往左第一个不受信任的地址)，否则一律使用 REMOTE_ADDR；同机 Nginx 转发时配置为 ['127.0.0.1', '::1']
+TRUSTED_PROXIES = []
+# 令牌桶状态所在的缓存 (多进程部署时应配置为共享缓存)；缓存不可用时退回进程内计数
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMITS = {
+    'comment': '5/m',
+    'feedback': '3/m',
+    'upload': '30/m',
+}
+# 每个进程同时处理的图片上传数，排队超过该秒数返回 503
+UPLOAD_MAX_CONCURRENCY = 2
+UPLOAD_QUEUE_TIMEOUT = 5
+
+# === 验证码池 (manage.py refill_captcha_pool) ===
+# 表单从预生成的验证码池领取验证码；同时关闭 django-simple-captcha 在每次校验时的过期清理，改由命令批量清理
+CAPTCHA_GET_FROM_POOL = True
+# 池中保持的可用验证码数
+CAPTCHA_POOL_SIZE = 200
+# 池中验证码的有效期 (分钟)；领取时至少还剩 CAPTCHA_TIMEOUT (默认 5 分钟) 供用户填写
+CAPTCHA_POOL_TTL = 60
+
+# === 站点地图与订阅 ===
+# 每个文章站点地图分片最多包含的 URL 数 (协议上限 50000)
+SITEMAP_SHARD_SIZE = 50000
+# 每个 RSS / Atom 订阅包含的文章数
+FEED_ITEMS = 20
+# 生成结果的缓存时间 (秒)；缓存 key 带数据签名，内容变化会自动换 key
+SYNDICATION_CACHE_TIMEOUT = 24 * 3600
+# 响应的 Cache-Control max-age (秒)
+SYNDICATION_MAX_AGE = 300
+
 # === Martor 编辑器配置 (修复上传问题) ===
 # 这里的路径必须是相对于 MEDIA_ROOT 的
 MARTOR_UPLOAD_PATH = 'images/uploads'
@@ -198,6 +377,43 @@ CKEDITOR_5_CONFIGS = {
 CKEDITOR_5_UPLOAD_PATH = 'uploads/'
 CKEDITOR_5_ALLOW_ALL_FILE_TYPES = True
 
+# === 性能监控 ===
+# 是否输出 Server-Timing 响应头 (会暴露内部耗时，生产环境按需开启)
+PERF_SERVER_TIMING = DEBUG
+# 超过该耗时 (毫秒) 的请求写入慢请求日志
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', 500))
+# 对匹配以下正则的 URL 进行性能剖析，结果写入 PERF_PROFILE_DIR；为空则不剖析
+PERF_PROFILE_DIR = os.environ.get('PERF_PROFILE_DIR') or None
+PERF_PROFILE_URLS = [p for p in os.environ.get('PERF_PROFILE_URLS', '').split(',') if p]
+# 'cprofile' 导出 .prof 文件；'sample' 定时采样调用栈，导出 flamegraph 折叠栈
+PERF_PROFILE_MODE = os.environ.get('PERF_PROFILE_MODE', 'cprofile')
+PERF_SAMPLE_INTERVAL = 0.005
+
+# /metrics (Prometheus 文本格式，knowledge/metrics.py)：携带 "Authorization: Bearer <METRICS_TOKEN>"
+# 或来自以下地址 (REMOTE_ADDR，且没有 X-Forwarded-For) 的请求才能访问，否则返回 404。
+# 默认不按地址放行：同机反向代理转发的公网请求 REMOTE_ADDR 也是 127.0.0.1
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+# 多进程部署时各进程写入指标快照的目录 (/metrics 合并目录中所有进程的数据)；多台服务器时需使用共享目录
+METRICS_DIR = os.environ.get('METRICS_DIR', str(BASE_DIR / 'metrics'))
+METRICS_FLUSH_INTERVAL = 10
+# 超过该时间 (秒) 未更新的进程快照合并进 archived.json
+METRICS_COMPACT_AFTER = 3600
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'knowledge': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 # 默认主键
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 X_FRAME_OPTIONS = 'SAMEORIGIN'
@@ -1,27 +1,57 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.core.files.storage import default_storage
 from knowledge import views as k_views
-from feedback.views import feedback_view
-from knowledge.admin import cleanup_media_view
+from knowledge import async_views
+from knowledge import feeds, sitemaps
+from feedback import views as feedback_views
+from knowledge.admin import cleanup_media_view, export_archive_view
+
+# ASGI 部署时公开页面切换为异步版本
+public_views = async_views if settings.KNOWLEDGE_ASYNC_VIEWS else k_views
 
 urlpatterns = [
     path('admin/cleanup-media/', cleanup_media_view, name='admin_cleanup_media'),
+    path('admin/export-archive/', export_archive_view, name='admin_export_archive'),
     path('admin/', admin.site.urls),
+    # 验证码图片和刷新走验证码池 (feedback/captcha_pool.py)，需放在 captcha.urls 之前
+    re_path(r'^captcha/image/(?P<key>\w+)/$', feedback_views.captcha_image, name='captcha_pool_image'),
+    path('captcha/refresh/', feedback_views.captcha_refresh, name='captcha_pool_refresh'),
     path('captcha/', include('captcha.urls')),
     path('i18n/', include('django.conf.urls.i18n')),
 
     path('ckeditor5/image_upload/', k_views.ckeditor_upload_view, name='ckeditor_upload'),
     path('ckeditor5/', include('django_ckeditor_5.urls')),
 
-    path('', k_views.doc_index, name='index'),
-    path('category/<int:pk>/', k_views.category_detail, name='category_detail'),
-path('tag/<str:slug>/', k_views.tag_detail, name='tag_detail'),
-    path('doc/<int:pk>/', k_views.doc_detail, name='doc_detail'),
-    path('search/', k_views.search_view, name='search'),
-    path('feedback/', feedback_view, name='feedback'),
+    path('', public_views.doc_index, name='index'),
+    path('category/<int:pk>/', public_views.category_detail, name='category_detail'),
+    path('tag/<str:slug>/', public_views.tag_detail, name='tag_detail'),
+    path('doc/<int:pk>/', public_views.doc_detail, name='doc_detail'),
+    path('search/', public_views.search_view, name='search'),
+    path('archive/', public_views.archive_index, name='archive'),
+    path('archive/<int:year>/', public_views.archive_detail, name='archive_year'),
+    path('archive/<int:year>/<int:month>/', public_views.archive_detail, name='archive_month'),
+    path('attachment/<int:pk>/', k_views.attachment_download, name='attachment_download'),
+    path('feedback/', feedback_views.feedback_view, name='feedback'),
+
+    # 站点地图与订阅 (按签名缓存，带 Last-Modified)
+    path('metrics', k_views.metrics_view, name='metrics'),
+    path('robots.txt', sitemaps.robots_txt, name='robots_txt'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap'),
+    path('sitemap-pages.xml', sitemaps.sitemap_pages, name='sitemap_pages'),
+    path('sitemap-articles-<int:shard>.xml', sitemaps.sitemap_articles, name='sitemap_articles'),
+    path('feed/rss/', feeds.site_rss, name='feed_rss'),
+    path('feed/atom/', feeds.site_atom, name='feed_atom'),
+    path('category/<int:pk>/feed/rss/', feeds.category_rss, name='category_feed_rss'),
+    path('category/<int:pk>/feed/atom/', feeds.category_atom, name='category_feed_atom'),
+    path('tag/<str:slug>/feed/rss/', feeds.tag_rss, name='tag_feed_rss'),
+    path('tag/<str:slug>/feed/atom/', feeds.tag_atom, name='tag_feed_atom'),
 ]
 
-if settings.DEBUG:
+if getattr(default_storage, 'serves_via_django', False):
+    # 对象存储的 redirect / proxy 模式，媒体地址由 Django 转到对象存储 (knowledge/s3storage.py)
+    urlpatterns.append(path(settings.MEDIA_URL.lstrip('/') + '<path:path>', k_views.serve_media, name='serve_media'))
+elif settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,7 +1,9 @@
 import os
 from django.core.wsgi import get_wsgi_application
+from AP_knowledge.assets import StaticFilesWSGI
 
 # 指向你的 settings 文件
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AP_knowledge.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+# 静态文件由 assets 层直接返回 (哈希文件名 + 预压缩 + 长缓存)，其余请求交给 Django
+application = StaticFilesWSGI(get_wsgi_application())
\ No newline at end of file
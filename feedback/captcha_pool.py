@@ -0,0 +1,174 @@
+"""
+验证码池：预先生成验证码图片，页面请求时直接领取，不再每次渲染 PNG
+
+- refill_captcha_pool 命令 (cron 或 --interval 常驻) 批量生成挑战，图片字节存入 CaptchaImage，
+  对应的 CaptchaStore 一并批量写入，有效期为 CAPTCHA_POOL_TTL 分钟
+- 表单渲染时按生成顺序轮流领取一条未发放的验证码 (一条 UPDATE 标记 served_at)，
+  验证码只发放一次，避免一人提交后其他人拿到的同一验证码失效
+- lazy=True 的表单 (文章页评论) 首次渲染时不领取，显示占位图，用户开始填写时由 base.html 中的脚本
+  通过 captcha_refresh 领取，浏览页面和爬虫不消耗验证码池
+- 图片接口直接返回存好的字节；池子空了退回 django-simple-captcha 的即时生成
+- 过期记录由命令批量删除，不在提交表单时逐次清理 (CAPTCHA_GET_FROM_POOL = True 关闭了库的逐次清理)；
+  命令没有运行、池子空了时，即时生成的路径每 PURGE_INTERVAL 秒清理一次，CaptchaStore 不会无限增长
+"""
+import datetime
+import logging
+import random
+import secrets
+import threading
+import time
+from urllib.parse import quote
+
+from captcha.conf import settings as captcha_settings
+from captcha.fields import CaptchaField, CaptchaTextInput
+from captcha.models import CaptchaStore
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CaptchaImage
+
+logger = logging.getLogger(__name__)
+
+# 领取时的并发冲突重试次数
+CLAIM_ATTEMPTS = 3
+# 池子空了 (refill_captcha_pool 没有运行) 时清理过期记录的最短间隔 (秒)
+PURGE_INTERVAL = 300
+# 延迟领取时显示的占位图片
+PLACEHOLDER_IMAGE = 'data:image/svg+xml,' + quote(
+    '<svg xmlns="http://www.w3.org/2000/svg" width="120" height="40">'
+    '<text x="60" y="25" font-size="13" text-anchor="middle" fill="#888">点击获取验证码</text></svg>')
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def pool_ttl():
+    return datetime.timedelta(minutes=getattr(settings, 'CAPTCHA_POOL_TTL', 60))
+
+
+def answer_window():
+    """领取的验证码至少还要有效这么久，留给用户填写"""
+    return datetime.timedelta(minutes=int(captcha_settings.CAPTCHA_TIMEOUT))
+
+
+def render_image(store):
+    """用 django-simple-captcha 自带的绘制逻辑生成图片，返回 (字节, content_type)"""
+    from captcha.views import _captcha_image
+    # 与 captcha.views.captcha_image 一致：以 key 为随机种子绘制，结束后重置随机数
+    random.seed(store.hashkey)
+    try:
+        response = _captcha_image(store, 1)
+    finally:
+        random.seed()
+    return response.content, response['Content-Type']
+
+
+def generate(count, batch_size=100):
+    """生成 count 条验证码，返回实际生成数"""
+    challenge_funct = captcha_settings.get_challenge()
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        expiration = timezone.now() + pool_ttl()
+        stores = []
+        for _ in range(size):
+            challenge, response = challenge_funct()
+            stores.append(CaptchaStore(challenge=challenge, response=response.lower(),
+                                       hashkey=secrets.token_hex(20), expiration=expiration))
+        CaptchaStore.objects.bulk_create(stores)
+        images = []
+        for store in stores:
+            image, content_type = render_image(store)
+            images.append(CaptchaImage(hashkey=store.hashkey, image=image, content_type=content_type,
+                                       expiration=expiration))
+        CaptchaImage.objects.bulk_create(images)
+        created += size
+    return created
+
+
+def available_count():
+    return CaptchaImage.objects.filter(served_at__isnull=True,
+                                       expiration__gt=timezone.now() + answer_window()).count()
+
+
+def purge_expired():
+    """批量删除过期的验证码和图片，返回 (删除的 CaptchaStore 数, 删除的图片数)"""
+    now = timezone.now()
+    # 两张表之间没有外键，各自一条 DELETE
+    images, _ = CaptchaImage.objects.filter(expiration__lte=now).delete()
+    stores, _ = CaptchaStore.objects.filter(expiration__lte=now).delete()
+    return stores, images
+
+
+def refill(size=None):
+    """清理过期记录并补足到 size 条可用验证码，返回 (生成数, 删除的 CaptchaStore 数, 删除的图片数)"""
+    size = getattr(settings, 'CAPTCHA_POOL_SIZE', 200) if size is None else size
+    stores, images = purge_expired()
+    generated = generate(max(size - available_count(), 0))
+    return generated, stores, images
+
+
+def claim():
+    """按生成顺序领取一条未发放的验证码，返回 hashkey；池子空了返回 None"""
+    now = timezone.now()
+    for _ in range(CLAIM_ATTEMPTS):
+        row = (CaptchaImage.objects
+               .filter(served_at__isnull=True, expiration__gt=now + answer_window())
+               .order_by('pk').values_list('pk', 'hashkey').first())
+        if row is None:
+            return None
+        # 被其他请求抢先领取时 UPDATE 影响 0 行，取下一条
+        if CaptchaImage.objects.filter(pk=row[0], served_at__isnull=True).update(served_at=now):
+            return row[1]
+    return None
+
+
+def purge_if_due():
+    """每个进程最多每 PURGE_INTERVAL 秒清理一次过期记录"""
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < PURGE_INTERVAL:
+            return
+        _last_purge = time.monotonic()
+    purge_expired()
+
+
+def pick_key():
+    key = claim()
+    if key is None:
+        logger.warning('验证码池为空，即时生成验证码 (请检查 refill_captcha_pool 是否在运行)')
+        # 命令没有运行时由这里清理，代替库在每次校验时的清理
+        purge_if_due()
+        key = CaptchaStore.generate_key()
+    return key
+
+
+def get_image(key):
+    """返回 (字节, content_type)；不在池中时返回 None"""
+    return (CaptchaImage.objects.filter(hashkey=key, expiration__gt=timezone.now())
+            .values_list('image', 'content_type').first())
+
+
+class PooledCaptchaTextInput(CaptchaTextInput):
+    def __init__(self, *args, lazy=False, **kwargs):
+        self.lazy = lazy
+        super().__init__(*args, **kwargs)
+
+    def fetch_captcha_store(self, name, value, attrs=None, generator=None):
+        # 未提交过的表单 (value 为 None) 延迟领取；提交出错重新显示时用户正在填写，直接领取
+        key = '' if self.lazy and value is None else pick_key()
+        self._value = [key, '']
+        self._key = key
+        self.id_ = self.build_attrs(attrs).get('id', None)
+
+    def image_url(self):
+        return reverse('captcha-image', kwargs={'key': self._key}) if self._key else PLACEHOLDER_IMAGE
+
+
+class PooledCaptchaField(CaptchaField):
+    """从验证码池取验证码的 CaptchaField，校验逻辑不变 (每个验证码只能提交一次)"""
+
+    def __init__(self, *args, lazy=False, **kwargs):
+        kwargs.setdefault('widget', PooledCaptchaTextInput(id_prefix=kwargs.pop('id_prefix', None), lazy=lazy))
+        super().__init__(*args, **kwargs)
@@ -1,9 +1,9 @@
 from django import forms
-from captcha.fields import CaptchaField # 引入验证码字段
+from .captcha_pool import PooledCaptchaField # 验证码从预生成的验证码池领取
 from .models import Message
 
 class MessageForm(forms.ModelForm):
-    captcha = CaptchaField(label="安全验证") # 自动生成图片和输入框
+    captcha = PooledCaptchaField(label="安全验证") # 自动生成图片和输入框
 
     class Meta:
         model = Message
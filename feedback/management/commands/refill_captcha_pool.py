@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import time
+from feedback import captcha_pool
+from knowledge import metrics
+from knowledge.metrics import track_command
+
+
+class Command(BaseCommand):
+    help = '批量清理过期验证码，并把验证码池补足到 CAPTCHA_POOL_SIZE 条 (建议 cron 每几分钟运行，或用 --interval 常驻)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=None, help='池中保持的可用验证码数，默认 CAPTCHA_POOL_SIZE')
+        parser.add_argument('--interval', type=int, default=0, help='常驻运行，每隔多少秒补充一次 (0 表示只运行一次)')
+
+    @track_command
+    def handle(self, *args, **options):
+        size = options['size'] if options['size'] is not None else getattr(settings, 'CAPTCHA_POOL_SIZE', 200)
+        while True:
+            start = time.perf_counter()
+            generated, stores, images = captcha_pool.refill(size)
+            metrics.captcha_generated.inc(generated)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(self.style.SUCCESS(
+                f'生成 {generated} 条，清理过期验证码 {stores} 条、图片 {images} 张，'
+                f'当前可用 {captcha_pool.available_count()} 条 ({elapsed:.0f} ms)'))
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
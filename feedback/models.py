@@ -18,4 +18,20 @@ class Message(models.Model):
         verbose_name_plural = verbose_name
 
     def __str__(self):
-        return f"{self.company_name} - {self.contact_person}"
\ No newline at end of file
+        return f"{self.company_name} - {self.contact_person}"
+
+class CaptchaImage(models.Model):
+    """验证码池中预先生成的图片 (见 feedback/captcha_pool.py)，hashkey 对应 captcha.CaptchaStore"""
+    hashkey = models.CharField("验证码 key", max_length=40, unique=True)
+    image = models.BinaryField("图片")
+    content_type = models.CharField("类型", max_length=32, default='image/png')
+    expiration = models.DateTimeField("过期时间", db_index=True)
+    served_at = models.DateTimeField("发放时间", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "验证码池"
+        verbose_name_plural = verbose_name
+        indexes = [models.Index(fields=['served_at', 'expiration'])]
+
+    def __str__(self):
+        return self.hashkey
@@ -1,24 +1,55 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages # 消息闪现
+from django.http import HttpResponse, JsonResponse, Http404
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
 from .forms import MessageForm
+from . import captcha_pool
+from knowledge import metrics
+from knowledge.ratelimit import get_client_ip, ratelimit
 
+@ratelimit('feedback')
 def feedback_view(request):
     if request.method == 'POST':
         form = MessageForm(request.POST)
         if form.is_valid():
             msg = form.save(commit=False)
             # 获取IP地址
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                msg.ip_address = x_forwarded_for.split(',')[0]
-            else:
-                msg.ip_address = request.META.get('REMOTE_ADDR')
+            msg.ip_address = get_client_ip(request)
             msg.save()
+            metrics.feedback_submissions.inc(status='accepted')
             messages.success(request, '留言提交成功！我们会尽快联系您。')
             return redirect('index') # 提交成功回首页
         else:
+            metrics.feedback_submissions.inc(status='invalid')
             messages.error(request, '验证码错误或填写不完整。')
     else:
         form = MessageForm()
 
-    return render(request, 'feedback_page.html', {'form': form})
\ No newline at end of file
+    return render(request, 'feedback_page.html', {'form': form})
+
+
+def captcha_image(request, key):
+    """验证码图片：池中的直接返回预先生成的字节，否则交给 django-simple-captcha 即时绘制"""
+    found = captcha_pool.get_image(key)
+    if found is None:
+        from captcha.views import captcha_image as render_captcha
+        return render_captcha(request, key)
+    image, content_type = found
+    response = HttpResponse(bytes(image), content_type=content_type)
+    # 同一 key 的图片不会变化，只允许浏览器自身缓存
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
+@never_cache
+def captcha_refresh(request):
+    """点击验证码图片换一张 (从验证码池领取)"""
+    if request.headers.get('x-requested-with') != 'XMLHttpRequest':
+        raise Http404
+    key = captcha_pool.pick_key()
+    return JsonResponse({
+        'key': key,
+        'image_url': reverse('captcha-image', kwargs={'key': key}),
+        'audio_url': None,
+    })
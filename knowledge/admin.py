@@ -1,9 +1,26 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from mptt.admin import DraggableMPTTAdmin
 from modeltranslation.admin import TranslationAdmin, TranslationTabularInline  # 多语言支持
-from .models import Category, Article, Attachment, Comment
-from django.urls import path
-from django.http import HttpResponseRedirect
+from .models import Category, Article, ArticleRevision, Attachment, Comment
+from . import revisions
+from .fts import FTS_TABLE, MIN_TERM_LENGTH, fts_available, match_expression
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils.text import smart_split, unescape_string_literal
+import hashlib
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.http import content_disposition_header
+from django.utils.timezone import now
 from django.contrib import messages
 from django.core.management import call_command
 from io import StringIO
@@ -19,29 +36,178 @@ class CategoryAdmin(DraggableMPTTAdmin, TranslationAdmin):
 admin.site.register(Category, CategoryAdmin)
 
 
+# 后台列表分页：避免每次翻页都对大表执行精确 COUNT(*)
+class EstimatedCountPaginator(Paginator):
+    """
+    总数缓存 ADMIN_COUNT_CACHE_TIMEOUT 秒 (新增/删除后列表总数可能短暂滞后)；
+    PostgreSQL 上未加筛选的大表直接使用统计信息中的估算行数
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= getattr(settings, 'ADMIN_ESTIMATE_THRESHOLD', 10000):
+                return row[0]
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except Exception:
+            return queryset.count()
+        key = 'admin_count:' + hashlib.md5(f'{queryset.db}:{sql}:{params}'.encode('utf-8')).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, getattr(settings, 'ADMIN_COUNT_CACHE_TIMEOUT', 60))
+        return count
+
+
 # 2. 附件内联 (在文章页直接添加附件)
 class AttachmentInline(admin.TabularInline):
     model = Attachment
     extra = 1
+    readonly_fields = ('downloads', 'extraction_status')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('extracted_text')
 
 
-# 3. 评论内联
+# 3. 评论内联 (只显示最新的若干条，全部评论在评论管理中查看)
 class CommentInline(admin.StackedInline):
     model = Comment
     extra = 0
     readonly_fields = ('created_at', 'ip_address')
     classes = ['collapse']
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        object_id = request.resolver_match.kwargs.get('object_id') if request.resolver_match else None
+        if object_id:
+            latest = (queryset.filter(article_id=object_id).order_by('-created_at')
+                      .values_list('pk', flat=True)[:getattr(settings, 'ADMIN_INLINE_COMMENTS', 20)])
+            queryset = queryset.filter(pk__in=list(latest))
+        return queryset
+
+
+# 列表页不需要的大字段 (正文及其派生字段)
+ARTICLE_LARGE_FIELDS = ('content', 'content_compressed', 'plain_text', 'rendered_content', 'toc')
+
+
+class ArticleChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(request, exclude_parameters).defer(*ARTICLE_LARGE_FIELDS)
+
 
 # 4. 文章管理 (多语言支持)
 @admin.register(Article)
 class ArticleAdmin(TranslationAdmin):
     list_display = ('title', 'category', 'is_public', 'created_at')
     list_filter = ('category', 'is_public')
-    search_fields = ('title', 'content', 'summary')
+    list_select_related = ('category',)
+    # 未启用全文索引时的 LIKE 搜索字段；纯文本比 content 少了 HTML 标记
+    search_fields = ('title', 'summary', 'plain_text')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [AttachmentInline, CommentInline]
     # 添加摘要字段到编辑页面
-    fields = ('category', 'title', 'summary', 'content', 'tags', 'cover', 'cover_style', 'is_public')
+    fields = ('category', 'title', 'summary', 'content', 'tags', 'cover', 'cover_style', 'is_public',
+              'comment_overview', 'revision_overview')
+    readonly_fields = ('comment_overview', 'revision_overview')
+
+    def get_changelist(self, request, **kwargs):
+        return ArticleChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """3 个字符以上的词走 FTS5 trigram 索引，更短的词 (如两个汉字) 退回 LIKE"""
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        terms = []
+        for term in smart_split(search_term):
+            if term[0] in '"\'' and term[0] == term[-1] and len(term) > 1:
+                term = unescape_string_literal(term)
+            terms.append(term)
+        long_terms = [t for t in terms if len(t) >= MIN_TERM_LENGTH]
+        short_terms = [t for t in terms if t and len(t) < MIN_TERM_LENGTH]
+        if long_terms:
+            queryset = queryset.filter(pk__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match_expression(long_terms)]))
+        if short_terms:
+            queryset, _ = super().get_search_results(request, queryset, ' '.join(short_terms))
+        return queryset, False
+
+    @admin.display(description='评论')
+    def comment_overview(self, obj):
+        if not obj or not obj.pk:
+            return '-'
+        total = obj.comments.count()
+        url = reverse('admin:knowledge_comment_changelist') + f'?article__id__exact={obj.pk}'
+        return format_html('共 {} 条 (下方显示最新 {} 条)，<a href="{}">在评论管理中查看全部</a>',
+                           total, min(total, getattr(settings, 'ADMIN_INLINE_COMMENTS', 20)), url)
+
+    @admin.display(description='修订历史')
+    def revision_overview(self, obj):
+        if not obj or not obj.pk:
+            return '-'
+        url = reverse('admin:knowledge_article_revisions', args=[obj.pk])
+        return format_html('共 {} 个版本，<a href="{}">查看历史与对比</a>', obj.revisions.count(), url)
+
+    def save_model(self, request, obj, form, change):
+        # 启用修订历史前创建的文章，先把修改前的正文记为第 1 版
+        if change and 'content' in form.changed_data:
+            revisions.ensure_baseline(obj.pk)
+        super().save_model(request, obj, form, change)
+        revisions.record_revision(obj, user=request.user)
+
+    def get_urls(self):
+        urls = [
+            path('<int:object_id>/revisions/', self.admin_site.admin_view(self.revisions_view),
+                 name='knowledge_article_revisions'),
+            path('<int:object_id>/revisions/<int:number>/', self.admin_site.admin_view(self.revision_diff_view),
+                 name='knowledge_article_revision_diff'),
+        ]
+        return urls + super().get_urls()
+
+    def revisions_view(self, request, object_id):
+        article = get_object_or_404(Article.objects.only('pk', 'title'), pk=object_id)
+        if not self.has_view_or_change_permission(request, article):
+            raise Http404
+        queryset = ArticleRevision.objects.filter(article=article)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'修订历史: {article.title}',
+            'article': article,
+            'revisions': queryset.defer('data').select_related('author').order_by('-number'),
+            'stats': revisions.storage_stats(queryset),
+        }
+        return TemplateResponse(request, 'admin/knowledge/article/revisions.html', context)
+
+    def revision_diff_view(self, request, object_id, number):
+        """对比某个版本与上一版本 (或 ?against=版本号 指定的版本)"""
+        article = get_object_or_404(Article.objects.only('pk', 'title'), pk=object_id)
+        if not self.has_view_or_change_permission(request, article):
+            raise Http404
+        against = request.GET.get('against', '')
+        against = int(against) if against.isdigit() else number - 1
+        try:
+            new = revisions.get_content(article.pk, number)
+            old = revisions.get_content(article.pk, against) if against >= 1 else ''
+        except ArticleRevision.DoesNotExist:
+            raise Http404('版本不存在')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'{article.title}: v{against} → v{number}',
+            'article': article,
+            'number': number,
+            'against': against,
+            'diff': revisions.diff_lines(old, new, f'v{against}', f'v{number}'),
+        }
+        return TemplateResponse(request, 'admin/knowledge/article/revision_diff.html', context)
 
     # Martor 编辑器在 Admin 中需要的 Media
     class Media:
@@ -51,6 +217,16 @@ class ArticleAdmin(TranslationAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('email', 'display_name', 'article', 'created_at', 'is_public')
+    list_filter = ('is_public',)
+    # 文章下拉框会加载全部文章，改为输入 ID
+    raw_id_fields = ('article',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # 列表中文章只显示标题，不加载正文
+        return (super().get_queryset(request).select_related('article')
+                .defer(*(f'article__{name}' for name in ARTICLE_LARGE_FIELDS)))
 
 
 # 自定义清理媒体文件的视图
@@ -67,6 +243,17 @@ def cleanup_media_view(request):
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/admin/'))
 
 
+# 全量导出 (流式 zip 下载)
+@staff_member_required
+def export_archive_view(request):
+    from .archive import stream_zip
+    include_media = request.GET.get('media') != '0'
+    filename = f"knowledge_archive_{now().strftime('%Y%m%d_%H%M%S')}.zip"
+    response = StreamingHttpResponse(stream_zip(include_media=include_media), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
 # 获取admin site实例并添加URL
 admin_site = admin.site
 admin_site.cleanup_media_view = cleanup_media_view
\ No newline at end of file
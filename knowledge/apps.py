@@ -14,4 +14,10 @@ class KnowledgeConfig(AppConfig):
 
     def ready(self):
         # 注册信号
-        post_migrate.connect(create_default_superuser, sender=self)
\ No newline at end of file
+        post_migrate.connect(create_default_superuser, sender=self)
+        from .fts import setup_fts
+        post_migrate.connect(setup_fts, sender=self)
+        from . import signals  # noqa: F401
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_sql_timer
+        connection_created.connect(install_sql_timer)
\ No newline at end of file
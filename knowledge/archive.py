@@ -0,0 +1,162 @@
+"""
+全量导出 (备份 / 迁移)：数据表按 JSON Lines 输出，媒体文件一起打包为 zip
+
+所有查询使用 .iterator() 分批读取，zip 边写边产出字节块，导出任意大小的数据内存占用都保持不变，
+HTTP 下载在第一批数据准备好后就开始发送。
+"""
+import json
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils.timezone import now
+from taggit.models import Tag, TaggedItem
+
+from . import content_storage
+from .models import Article, Attachment, Category, Comment, MediaFile
+
+ARCHIVE_VERSION = 1
+CHUNK_SIZE = 2000
+# 缓冲区超过该大小就交给调用方写出
+FLUSH_SIZE = 256 * 1024
+# 已经是压缩格式的文件直接存储，不再 deflate
+STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.gz', '.br', '.7z', '.rar',
+                     '.mp4', '.mp3', '.pdf', '.docx', '.xlsx', '.pptx')
+
+
+def iter_tables():
+    """返回 [(表名, 记录迭代器)]，按导入时需要的依赖顺序排列"""
+    article_fields = [f.attname for f in Article._meta.concrete_fields if f.name not in Article.DERIVED_FIELDS]
+    content_type = ContentType.objects.get_for_model(Article)
+    return [
+        ('categories', Category.objects.order_by('tree_id', 'lft').values()),
+        ('tags', Tag.objects.order_by('pk').values()),
+        # 派生字段 (纯文本、渲染结果) 导入后可由 refresh_derived_fields 重新生成，不导出
+        ('articles', Article.objects.order_by('pk').values(*article_fields)),
+        ('article_tags', TaggedItem.objects.filter(content_type=content_type).order_by('pk')
+         .values('tag_id', article_id=F('object_id'))),
+        ('comments', Comment.objects.order_by('pk').values()),
+        ('attachments', Attachment.objects.order_by('pk').values()),
+        ('media_files', MediaFile.objects.order_by('pk').values()),
+    ]
+
+
+def table_records(table, queryset):
+    for record in queryset.iterator(chunk_size=CHUNK_SIZE):
+        if table == 'articles':
+            # 压缩存储的正文导出为原文，导入时不依赖压缩设置
+            record['content'] = content_storage.load(record['content'], record.pop('content_compressed'))
+        yield record
+
+
+def iter_records():
+    for table, queryset in iter_tables():
+        for record in table_records(table, queryset):
+            yield table, record
+
+
+def dumps(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def iter_storage_files(path=''):
+    """递归列出存储中的所有文件 (只使用 Storage API，换成对象存储同样适用)"""
+    try:
+        dirs, files = default_storage.listdir(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for name in sorted(files):
+        yield f'{path}/{name}' if path else name
+    for name in sorted(dirs):
+        yield from iter_storage_files(f'{path}/{name}' if path else name)
+
+
+def copy_storage_files(dest_dir, path='', workers=8):
+    """把存储中的文件复制到本地目录 (静态导出用)；对象存储下载耗时主要在网络等待，用多线程并行，返回文件数"""
+    def copy(name):
+        relative = name[len(path):].lstrip('/') if path else name
+        target = os.path.join(dest_dir, *relative.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with default_storage.open(name, 'rb') as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    names = list(iter_storage_files(path))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() 让子线程中的异常在这里抛出
+        list(pool.map(copy, names))
+    return len(names)
+
+
+def stream_jsonl():
+    """单个 JSON Lines 流，每行 {"table": ..., "data": {...}}，不含媒体文件"""
+    for table, record in iter_records():
+        yield dumps({'table': table, 'data': record})
+
+
+class _ZipStream:
+    """只追加写入的缓冲区；ZipFile 写入后由生成器取走数据 (不可 seek，zip 使用数据描述符)"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _member(name, compress=True):
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    return info
+
+
+def stream_zip(include_media=True):
+    """
+    逐块产出 zip 数据：<表名>.jsonl、media/<存储路径>、最后是 manifest.json (各表记录数)
+    """
+    buffer = _ZipStream()
+    counts = {}
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for table, queryset in iter_tables():
+            counts[table] = 0
+            with zf.open(_member(f'{table}.jsonl'), 'w', force_zip64=True) as f:
+                for record in table_records(table, queryset):
+                    f.write(dumps(record))
+                    counts[table] += 1
+                    if buffer.size >= FLUSH_SIZE:
+                        yield buffer.pop()
+            yield buffer.pop()
+
+        if include_media:
+            counts['media'] = 0
+            for name in iter_storage_files():
+                compress = not name.lower().endswith(STORED_EXTENSIONS)
+                with default_storage.open(name, 'rb') as src, \
+                        zf.open(_member(f'media/{name}', compress), 'w', force_zip64=True) as dst:
+                    for chunk in src.chunks():
+                        dst.write(chunk)
+                        if buffer.size >= FLUSH_SIZE:
+                            yield buffer.pop()
+                counts['media'] += 1
+                yield buffer.pop()
+
+        manifest = {'version': ARCHIVE_VERSION, 'exported_at': now(), 'counts': counts}
+        zf.writestr(_member('manifest.json'), json.dumps(manifest, cls=DjangoJSONEncoder, indent=2))
+    yield buffer.pop()
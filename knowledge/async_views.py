@@ -0,0 +1,212 @@
+"""
+公开页面的异步版本 (ASGI 部署时使用，见 settings.KNOWLEDGE_ASYNC_VIEWS)
+
+数据库查询使用 Django 的异步 ORM，存储 I/O 放到有界线程池执行，
+模板渲染前把所有查询集物化为列表，渲染本身通过 sync_to_async 执行。
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.http import Http404
+from django.shortcuts import render, redirect, aget_object_or_404
+from taggit.models import Tag
+from AP_knowledge.database import use_readonly_db
+
+from . import metrics
+from .executor import run_blocking
+from .forms import CommentForm
+from .instrumentation import timed
+from .models import Article, ArchiveMonth, Category
+from .ratelimit import get_client_ip, ratelimit
+from .search import search_article_ids, build_snippet
+from .views import (get_common_context, get_gravatar_url, get_attachment_size, group_archive_months,
+                    archive_period, archive_list_queryset)
+
+arender = sync_to_async(render)
+
+
+async def aget_common_context():
+    context = get_common_context()  # 只构造查询集，不会触发查询
+    # recursetree 接收列表时要求按树结构排序
+    context['categories'] = context['categories'].order_by('tree_id', 'lft')
+    for key, queryset in context.items():
+        context[key] = [obj async for obj in queryset]
+    return context
+
+
+async def apaginate(queryset, page_number, per_page=10):
+    """异步分页：用 acount() 预先填充 Paginator.count，再异步取当前页"""
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()  # count 是 cached_property，赋值后不再同步查询
+    page_obj = paginator.get_page(page_number)
+    page_obj.object_list = [obj async for obj in page_obj.object_list]
+    return paginator, page_obj
+
+
+def build_pagination_links(paginator, page_obj, prefix='?'):
+    return [
+        {'number': i, 'url': f'{prefix}page={i}', 'is_active': i == page_obj.number}
+        for i in paginator.page_range
+    ]
+
+
+def article_list_queryset(**filters):
+    return Article.objects.filter(is_public=True, **filters) \
+        .select_related('category').prefetch_related('tags').order_by('-created_at')
+
+
+async def render_list(request, queryset, extra):
+    paginator, page_obj = await apaginate(queryset, request.GET.get('page'))
+    context = await aget_common_context()
+    context.update({
+        'page_obj': page_obj,
+        'pagination_links': build_pagination_links(paginator, page_obj),
+    })
+    context.update(extra)
+    with timed('template'):
+        return await arender(request, 'knowledge/index.html', context)
+
+
+@use_readonly_db
+async def doc_index(request):
+    return await render_list(request, article_list_queryset(), {'title': '最新文档'})
+
+
+@use_readonly_db
+async def category_detail(request, pk):
+    """分类文章列表"""
+    category = await aget_object_or_404(Category, pk=pk)
+    categories = category.get_descendants(include_self=True)
+    ancestors = category.get_ancestors(include_self=True).values_list('id', flat=True)
+    expanded_ids = {ancestor_id async for ancestor_id in ancestors}
+    return await render_list(request, article_list_queryset(category__in=categories), {
+        'title': f'分类: {category.name}',
+        'current_category': category,
+        'expanded_ids': expanded_ids,
+    })
+
+
+@use_readonly_db
+async def tag_detail(request, slug):
+    tag = await aget_object_or_404(Tag, slug=slug)
+    return await render_list(request, article_list_queryset(tags=tag), {'title': f'标签: {tag.name}'})
+
+
+@use_readonly_db
+async def archive_index(request):
+    """按年月列出归档 (只读统计表，不对文章表分组计数)"""
+    context = await aget_common_context()
+    months = [month async for month in ArchiveMonth.objects.all()]
+    context.update({'years': group_archive_months(months), 'title': '文档归档'})
+    with timed('template'):
+        return await arender(request, 'knowledge/archive.html', context)
+
+
+@use_readonly_db
+async def archive_detail(request, year, month=None):
+    """某年或某月的文章列表；总数取自 ArchiveMonth，不再对文章表 COUNT"""
+    months = ArchiveMonth.objects.filter(year=year)
+    if month is not None:
+        months = months.filter(month=month)
+    total = sum([count async for count in months.values_list('count', flat=True)])
+    if not total:
+        raise Http404
+    start, end, title = archive_period(year, month)
+
+    paginator = Paginator(archive_list_queryset(start, end), 10)
+    paginator.count = total
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = [obj async for obj in page_obj.object_list]
+    context = await aget_common_context()
+    context.update({
+        'page_obj': page_obj,
+        'pagination_links': build_pagination_links(paginator, page_obj),
+        'title': title,
+        'archive_year': year,
+        'archive_month': month,
+    })
+    with timed('template'):
+        return await arender(request, 'knowledge/index.html', context)
+
+
+@use_readonly_db
+@ratelimit('comment')
+@metrics.doc_detail_duration.timed
+async def doc_detail(request, pk):
+    article = await aget_object_or_404(Article.objects.select_related('category'), pk=pk)
+    # 直接 UPDATE 自增，不需要先读后写整行
+    await Article.objects.filter(pk=pk).aupdate(views=F('views') + 1)
+    metrics.article_views.inc()
+    article.views += 1
+
+    if request.method == 'POST':
+        comment_form = CommentForm(request.POST)
+        # 验证码校验需要查询数据库
+        if await sync_to_async(comment_form.is_valid)():
+            comment = comment_form.save(commit=False)
+            comment.article = article
+            comment.ip_address = get_client_ip(request)
+            await comment.asave()
+            messages.success(request, '留言提交成功！')
+            return redirect('doc_detail', pk=pk)
+        else:
+            messages.error(request, '提交失败，请检查输入。')
+    else:
+        comment_form = CommentForm()
+
+    comments = [c async for c in article.comments.filter(is_public=True)]
+    for c in comments:
+        c.avatar_url = get_gravatar_url(c.email)
+
+    # 过滤出存在的附件；文件检查在线程池中并发执行
+    candidates = [
+        attachment async for attachment in article.attachments.defer('extracted_text')
+        if attachment.file.name.replace('\\', '/') not in (article.rendered_content or article.content)
+    ]
+    with timed('storage'):
+        sizes = await asyncio.gather(*(run_blocking(get_attachment_size, a) for a in candidates))
+    existing_attachments = []
+    for attachment, file_size in zip(candidates, sizes):
+        if file_size is not None:
+            attachment.file_size = file_size
+            existing_attachments.append(attachment)
+
+    context = await aget_common_context()
+    context.update({
+        'article': article,
+        'comment_form': comment_form,
+        'comments': comments,
+        'existing_attachments': existing_attachments
+    })
+    with timed('template'):
+        return await arender(request, 'knowledge/detail.html', context)
+
+
+@use_readonly_db
+@metrics.search_duration.timed
+async def search_view(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return redirect('index')
+
+    result_ids = await sync_to_async(search_article_ids)(query)
+    metrics.search_requests.inc(result='hit' if result_ids else 'empty')
+    paginator = Paginator(result_ids, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    articles = Article.objects.filter(pk__in=page_obj.object_list) \
+        .select_related('category').prefetch_related('tags').defer('content', 'content_compressed', 'rendered_content', 'toc')
+    articles_by_id = {art.id: art async for art in articles}
+    page_obj.object_list = [articles_by_id[pk] for pk in page_obj.object_list if pk in articles_by_id]
+    for art in page_obj.object_list:
+        art.snippet = build_snippet(art.plain_text, query, fallback=art.summary)
+
+    with timed('template'):
+        return await arender(request, 'knowledge/search.html', {
+            'page_obj': page_obj,
+            'pagination_links': build_pagination_links(paginator, page_obj, prefix=f'?q={query}&'),
+            'query': query,
+        })
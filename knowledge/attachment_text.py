@@ -0,0 +1,181 @@
+"""
+附件正文提取的调度与写回
+
+- 附件保存 (事务提交) 后 queue_extraction 把任务交给后台线程，线程再把文件交给进程池提取，
+  请求本身不等待；进程池用 spawn 启动，不继承 Web 进程的数据库连接等状态
+- 每个文件的超时、内存上限由子进程自己执行 (extraction.py)，这里再加一层等待超时兜底
+- 提取结果写回 Attachment 后递增内容版本号，搜索结果缓存随之失效
+- 存量附件用 manage.py extract_attachments 批量处理，同时在途的任务数有上限：
+  非本地存储的文件要读出内容交给子进程，不限制的话整批文件会同时留在内存中
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils.timezone import now
+
+from . import extraction, metrics
+from .cache import bump_content_version
+from .models import Attachment
+
+logger = logging.getLogger(__name__)
+
+# 子进程已按 ATTACHMENT_EXTRACT_TIMEOUT 自行中断，这里多等一会儿用于兜底
+WAIT_GRACE_SECONDS = 10
+
+_lock = threading.Lock()
+_pool = None
+_dispatcher = None
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+def create_pool(workers=None):
+    return ProcessPoolExecutor(
+        max_workers=workers or option('ATTACHMENT_EXTRACT_WORKERS', 2),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=extraction.init_worker,
+        initargs=(option('ATTACHMENT_EXTRACT_MEMORY_MB', 512),),
+    )
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = create_pool()
+        return _pool
+
+
+def terminate_pool(pool):
+    """关闭进程池并结束子进程；子进程卡住时 shutdown 不会让它退出"""
+    processes = list((getattr(pool, '_processes', None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def reset_pool(broken):
+    """子进程异常退出 (如被系统杀掉) 或超时未返回后进程池不可再用，换一个新的"""
+    global _pool
+    with _lock:
+        if _pool is broken:
+            _pool = None
+    terminate_pool(broken)
+
+
+def source_for(attachment):
+    """本地存储直接传路径给子进程，其他存储读出内容再传 (超过大小上限返回 None)"""
+    try:
+        return attachment.file.path
+    except NotImplementedError:
+        max_bytes = option('ATTACHMENT_EXTRACT_MAX_BYTES', 50 * 1024 * 1024)
+        if attachment.file.size > max_bytes:
+            return None
+        with attachment.file.open('rb') as f:
+            return f.read()
+
+
+def submit(pool, attachment):
+    """提交一个附件到进程池，返回 Future；文件缺失或过大时直接返回结果元组"""
+    if not attachment.file:
+        return extraction.SKIPPED, '没有文件'
+    ext = os.path.splitext(attachment.file.name)[1]
+    if ext.lower() not in extraction.SUPPORTED_EXTENSIONS:
+        return extraction.SKIPPED, f'不支持的文件类型: {ext or "(无扩展名)"}'
+    try:
+        source = source_for(attachment)
+    except (OSError, ValueError) as e:
+        return extraction.FAILED, f'读取文件失败: {e}'[:200]
+    if source is None:
+        return extraction.SKIPPED, '文件过大'
+    return pool.submit(
+        extraction.run, source, ext,
+        option('ATTACHMENT_TEXT_MAX_CHARS', 100000),
+        option('ATTACHMENT_EXTRACT_MAX_BYTES', 50 * 1024 * 1024),
+        option('ATTACHMENT_EXTRACT_TIMEOUT', 30),
+    )
+
+
+def wait_timeout():
+    return option('ATTACHMENT_EXTRACT_TIMEOUT', 30) + WAIT_GRACE_SECONDS
+
+
+def timeout_result(timeout):
+    return extraction.FAILED, f'超过 {timeout} 秒未返回'
+
+
+def wait(future):
+    if isinstance(future, tuple):
+        return future
+    timeout = wait_timeout()
+    # Python 3.10 中 concurrent.futures.TimeoutError 不是内置的 TimeoutError
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        return timeout_result(timeout)
+
+
+def store_result(attachment_id, result):
+    status, text = result
+    metrics.attachment_extractions.inc(status=status)
+    fields = {'extraction_status': status, 'extracted_at': now()}
+    if status == extraction.DONE:
+        fields.update(extracted_text=text, extraction_note='')
+    else:
+        fields.update(extracted_text='', extraction_note=text[:200])
+        logger.info('附件 %s 未提取正文 (%s): %s', attachment_id, status, text)
+    return Attachment.objects.filter(pk=attachment_id).update(**fields)
+
+
+def extract_attachment(attachment_id):
+    """提取单个附件并写回 (后台线程中执行)"""
+    attachment = Attachment.objects.filter(pk=attachment_id).only('pk', 'file').first()
+    if attachment is None:
+        return
+    pool = get_pool()
+    try:
+        future = submit(pool, attachment)
+        result = wait(future)
+    except BrokenProcessPool:
+        reset_pool(pool)
+        result = extraction.FAILED, '提取进程异常退出'
+    else:
+        if not isinstance(future, tuple) and not future.done():
+            # 子进程没有按时自行中断，占着的进程不会再释放
+            reset_pool(pool)
+    if store_result(attachment_id, result) and result[0] == extraction.DONE:
+        bump_content_version()
+
+
+def _job(attachment_id):
+    close_old_connections()
+    try:
+        extract_attachment(attachment_id)
+    except Exception:
+        logger.exception('附件 %s 正文提取失败', attachment_id)
+    finally:
+        connection.close()
+
+
+def queue_extraction(attachment_id):
+    """后台提取附件正文；ATTACHMENT_EXTRACT_ON_SAVE = False 时只由 extract_attachments 命令处理"""
+    global _dispatcher
+    if not option('ATTACHMENT_EXTRACT_ON_SAVE', True):
+        return
+    with _lock:
+        if _dispatcher is None:
+            # 每个线程同时占用一个子进程，线程数与进程数一致
+            _dispatcher = ThreadPoolExecutor(max_workers=option('ATTACHMENT_EXTRACT_WORKERS', 2),
+                                             thread_name_prefix='attachment-extract')
+        dispatcher = _dispatcher
+    dispatcher.submit(_job, attachment_id)
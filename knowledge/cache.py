@@ -0,0 +1,61 @@
+import time
+
+from django.core.cache import cache
+
+# 内容版本号：文章、分类、附件、评论、标签发生变化时递增，依赖内容的缓存以此为失效依据
+# 两级缓存 (AP_knowledge/cache_backends.py) 也以它判断进程内缓存是否过期
+CONTENT_VERSION_KEY = 'knowledge:content_version'
+
+
+def _initial_version():
+    # 缓存被清空后以当前时间为起点，避免与清空前用过的版本号重复 (进程内缓存中可能还有旧版本号的结果)
+    return int(time.time())
+
+
+def get_content_version():
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        # add 保证并发下只有一个进程写入
+        cache.add(CONTENT_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(CONTENT_VERSION_KEY, 1)
+    return version
+
+
+def bump_content_version():
+    """内容变更后调用，使所有基于旧版本号的缓存失效"""
+    try:
+        return cache.incr(CONTENT_VERSION_KEY)
+    except ValueError:
+        # key 不存在 (缓存被清空)，重新初始化
+        version = _initial_version()
+        cache.set(CONTENT_VERSION_KEY, version, timeout=None)
+        return version
+
+
+def cached_response(request, key, build, timeout=None):
+    """
+    按 key 缓存生成的响应 (key 中应带数据签名或版本号，内容变化后自然换成新 key)，
+    返回带 Last-Modified 的响应，并处理 If-Modified-Since
+    build() 返回 (内容 bytes, Content-Type, 最后修改时间戳或 None)
+    """
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from django.utils.http import http_date
+
+    entry = cache.get(key)
+    if entry is None:
+        entry = build()
+        cache.set(key, entry, timeout if timeout is not None else settings.SYNDICATION_CACHE_TIMEOUT)
+    content, content_type, last_modified = entry
+
+    if last_modified is not None:
+        last_modified = int(last_modified)
+        not_modified = get_conditional_response(request, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+    response = HttpResponse(content, content_type=content_type)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=settings.SYNDICATION_MAX_AGE)
+    return response
@@ -0,0 +1,43 @@
+import gzip
+import os
+
+try:
+    import brotli  # 可选依赖：pip install brotli
+except ImportError:
+    brotli = None
+
+# 值得预压缩的文本类文件
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.txt', '.xml', '.map', '.bin')
+# 太小的文件压缩收益不明显
+MIN_COMPRESS_SIZE = 256
+
+
+def compress_bytes(data):
+    """返回 {'gz': bytes, 'br': bytes}，未安装 brotli 时只有 gz"""
+    variants = {'gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def write_compressed_variants(path, data=None):
+    """为文件生成 .gz / .br 同名压缩版本，压缩后没有变小则不生成；返回写入的文件列表"""
+    if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+        return []
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    written = []
+    for ext, compressed in compress_bytes(data).items():
+        target = f'{path}.{ext}'
+        if len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written.append(target)
+    return written
@@ -0,0 +1,110 @@
+"""
+文章正文的压缩存储 (ARTICLE_CONTENT_COMPRESSION)
+
+- 开启后，保存时超过 ARTICLE_CONTENT_COMPRESS_MIN_BYTES 的正文压缩写入 content_compressed (二进制列)，
+  content 列写入空串；数据库文件和页缓存中只有压缩后的数据
+- 读取 article.content 时才解压 (同一实例只解压一次)，列表、搜索等不读正文的查询不受影响；
+  详情页输出的是未压缩的 rendered_content
+- 压缩数据第一个字节标记算法 (z: zlib, s: zstd)，切换算法或关闭压缩后旧数据仍可读取，
+  文章再次保存或运行 compress_content 时按当前设置重写
+- 按正文内容过滤 (content__contains) 查不到压缩的文章，需要改查 rendered_content
+"""
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.query_utils import DeferredAttribute
+from django_ckeditor_5.fields import CKEditor5Field
+
+try:
+    import zstandard  # 可选依赖：pip install zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_MARKERS = {'zlib': b'z', 'zstd': b's'}
+
+
+def option(name, default=None):
+    return getattr(settings, name, default)
+
+
+def compress(text, codec=None, level=None):
+    """压缩正文；未开启压缩、正文太短或压缩后没有变小时返回 None"""
+    codec = codec or option('ARTICLE_CONTENT_COMPRESSION')
+    if not codec or not text:
+        return None
+    data = text.encode('utf-8')
+    if len(data) < option('ARTICLE_CONTENT_COMPRESS_MIN_BYTES', 2048):
+        return None
+    level = level or option('ARTICLE_CONTENT_COMPRESS_LEVEL')
+    if codec == 'zlib':
+        payload = zlib.compress(data, level or 6)
+    elif codec == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured('ARTICLE_CONTENT_COMPRESSION = "zstd" 需要安装 zstandard: pip install zstandard')
+        payload = zstandard.ZstdCompressor(level=level or 9).compress(data)
+    else:
+        raise ImproperlyConfigured(f'未知的 ARTICLE_CONTENT_COMPRESSION: {codec!r}，可选 "zlib"、"zstd" 或 None')
+    blob = CODEC_MARKERS[codec] + payload
+    return blob if len(blob) < len(data) else None
+
+
+def decompress(blob):
+    blob = bytes(blob)
+    marker, payload = blob[:1], blob[1:]
+    if marker == CODEC_MARKERS['zlib']:
+        data = zlib.decompress(payload)
+    elif marker == CODEC_MARKERS['zstd']:
+        if zstandard is None:
+            raise ImproperlyConfigured('正文使用 zstd 压缩存储，需要安装 zstandard: pip install zstandard')
+        data = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raise ValueError(f'无法识别的正文压缩格式: {marker!r}')
+    return data.decode('utf-8')
+
+
+def load(content, blob):
+    """由两列的原始值得到正文 (values() 等不经过模型实例的查询使用)"""
+    return decompress(blob) if blob is not None and not content else content
+
+
+class CompressedContentDescriptor(DeferredAttribute):
+    """读取属性时才解压；content 与压缩列任一未加载时一起补查"""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        data = instance.__dict__
+        name, blob_name = self.field.attname, self.field.compressed_attname
+        if name not in data:
+            instance.refresh_from_db(fields=[name, blob_name])
+        elif not data[name] and blob_name not in data:
+            instance.refresh_from_db(fields=[blob_name])
+        blob = data.get(blob_name)
+        if blob is not None and not data[name]:
+            data[name] = decompress(blob)
+        return data[name]
+
+    def __set__(self, instance, value):
+        # 直接赋值的正文是最新的，已加载的压缩数据作废 (保存时按当前设置重新压缩)；
+        # 模型初始化时 content 先于压缩列赋值，此时压缩列还不在 __dict__ 中
+        instance.__dict__[self.field.attname] = value
+        if self.field.compressed_attname in instance.__dict__:
+            instance.__dict__[self.field.compressed_attname] = None
+
+
+class CompressibleContentField(CKEditor5Field):
+    """
+    CKEditor 正文字段，可配合 <字段名>_compressed 二进制列压缩存储：
+    实例上有压缩数据时本列写入空串
+    """
+    descriptor_class = CompressedContentDescriptor
+
+    @property
+    def compressed_attname(self):
+        return f'{self.attname}_compressed'
+
+    def pre_save(self, model_instance, add):
+        if model_instance.__dict__.get(self.compressed_attname) is not None:
+            return ''
+        return super().pre_save(model_instance, add)
@@ -0,0 +1,62 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedCounter:
+    """
+    进程内累加计数，攒够一定数量或间隔一定时间后批量写回数据库，
+    避免每次请求都对同一行执行 UPDATE 抢占 SQLite 写锁。
+    """
+
+    # 所有实例，供 /metrics 导出未写回的计数 (knowledge/metrics.py)
+    instances = []
+
+    def __init__(self, model, field, interval=None, threshold=None):
+        self.model = model
+        self.field = field
+        self.name = f'{model._meta.model_name}_{field}'
+        self.interval = interval if interval is not None else getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10)
+        self.threshold = threshold if threshold is not None else getattr(settings, 'COUNTER_FLUSH_THRESHOLD', 50)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+        BatchedCounter.instances.append(self)
+
+    def incr(self, pk, amount=1):
+        with self._lock:
+            self._pending[pk] = self._pending.get(pk, 0) + amount
+            due = (sum(self._pending.values()) >= self.threshold
+                   or time.monotonic() - self._last_flush >= self.interval)
+        if due:
+            self.flush()
+
+    def backlog(self):
+        """尚未写回数据库的累计次数"""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                for pk, amount in pending.items():
+                    self.model.objects.filter(pk=pk).update(**{self.field: F(self.field) + amount})
+        except Exception:
+            # 写回失败时放回队列，下次再试
+            logger.exception('计数写回失败: %s.%s', self.model.__name__, self.field)
+            with self._lock:
+                for pk, amount in pending.items():
+                    self._pending[pk] = self._pending.get(pk, 0) + amount
@@ -0,0 +1,24 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_executor = None
+
+
+def get_executor():
+    """阻塞型工作 (存储 I/O、PIL) 专用的有界线程池，避免占满默认线程池"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BLOCKING_IO_WORKERS', 8),
+            thread_name_prefix='knowledge-blocking',
+        )
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在有界线程池中执行阻塞函数，不占用事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
@@ -0,0 +1,153 @@
+"""
+附件正文提取 (TXT / Markdown / DOCX / PDF)
+
+不导入 Django，在独立的子进程 (ProcessPoolExecutor, spawn) 中运行：
+- init_worker 限制子进程的地址空间 (RLIMIT_AS)，超大或畸形文件只会让该任务 MemoryError
+- run 用 SIGALRM 限制单个文件的处理时间
+- 结果统一为 (状态, 文本)，文本压缩空白并截断到 max_chars
+
+PDF 需要可选依赖 pypdf (pip install pypdf)，未安装时 PDF 附件标记为跳过。
+调度与写回数据库见 attachment_text.py。
+"""
+import html
+import io
+import os
+import re
+import signal
+import zipfile
+
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.markdown', '.rst', '.csv', '.log')
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + ('.docx', '.pdf')
+# DOCX 中 document.xml 解压后的大小上限，防止压缩炸弹
+MAX_DOCX_XML_BYTES = 64 * 1024 * 1024
+
+_DOCX_TOKEN = re.compile(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>|<w:tab/>|</w:p>|<w:br/>')
+_WHITESPACE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+class Unsupported(Exception):
+    pass
+
+
+def init_worker(memory_mb=None):
+    """子进程初始化：在当前占用的基础上再允许 memory_mb 的地址空间"""
+    if not memory_mb:
+        return
+    try:
+        import resource
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+        limit = current + memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ImportError, OSError, ValueError):
+        # 非 Linux 平台不限制内存，只依赖超时
+        pass
+
+
+def decode_text(data):
+    for encoding in ('utf-8-sig', 'gb18030'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def extract_docx(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        info = zf.getinfo('word/document.xml')
+        if info.file_size > MAX_DOCX_XML_BYTES:
+            raise Unsupported('document.xml 过大')
+        xml = zf.read(info).decode('utf-8', errors='replace')
+    parts = []
+    for match in _DOCX_TOKEN.finditer(xml):
+        token = match.group(0)
+        if match.group(1) is not None:
+            parts.append(html.unescape(match.group(1)))
+        elif token == '<w:tab/>':
+            parts.append(' ')
+        else:
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def extract_pdf(data, max_chars):
+    try:
+        import pypdf  # 可选依赖
+    except ImportError:
+        raise Unsupported('未安装 pypdf，无法提取 PDF')
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    parts, total = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        total += len(text)
+        if total >= max_chars:
+            break
+    return '\n'.join(parts)
+
+
+def normalize(text, max_chars):
+    text = _WHITESPACE.sub(' ', text.replace('\x00', ''))
+    text = _BLANK_LINES.sub('\n', text).strip()
+    return text[:max_chars]
+
+
+def extract(data, ext, max_chars):
+    ext = ext.lower()
+    if ext in TEXT_EXTENSIONS:
+        text = decode_text(data)
+    elif ext == '.docx':
+        text = extract_docx(data)
+    elif ext == '.pdf':
+        text = extract_pdf(data, max_chars)
+    else:
+        raise Unsupported(f'不支持的文件类型: {ext or "(无扩展名)"}')
+    return normalize(text, max_chars)
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout()
+
+
+def run(source, ext, max_chars, max_bytes, timeout):
+    """
+    子进程入口。source 为本地文件路径或文件内容 (bytes)；
+    返回 (状态, 文本或失败原因)
+    """
+    if ext.lower() not in SUPPORTED_EXTENSIONS:
+        return SKIPPED, f'不支持的文件类型: {ext or "(无扩展名)"}'
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.alarm(max(int(timeout), 1))
+    try:
+        if isinstance(source, bytes):
+            data = source
+        else:
+            if os.path.getsize(source) > max_bytes:
+                return SKIPPED, f'文件超过 {max_bytes // (1024 * 1024)} MB'
+            with open(source, 'rb') as f:
+                data = f.read()
+        return DONE, extract(data, ext, max_chars)
+    except ExtractionTimeout:
+        return FAILED, f'超过 {timeout} 秒未完成'
+    except MemoryError:
+        return FAILED, '超出内存限制'
+    except Unsupported as e:
+        return SKIPPED, str(e)
+    except Exception as e:
+        return FAILED, f'{type(e).__name__}: {e}'[:200]
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
@@ -0,0 +1,126 @@
+"""
+RSS / Atom 订阅：全站、单个分类 (含子分类)、单个标签
+
+生成结果按内容版本号缓存，并带 Last-Modified，订阅器轮询时大多直接命中缓存或返回 304。
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe
+from taggit.models import Tag
+
+from .cache import cached_response, get_content_version
+from .models import Article, Category
+
+SITE_TITLE = 'APMemory 知识库'
+
+
+class ArticleFeed(Feed):
+    description = 'APMemory 知识库最新文档'
+
+    def title(self, obj=None):
+        return SITE_TITLE
+
+    def link(self, obj=None):
+        return reverse('index')
+
+    def get_queryset(self, obj=None):
+        return Article.objects.filter(is_public=True)
+
+    def items(self, obj=None):
+        # 只取订阅需要的字段，不加载正文和渲染结果
+        return (self.get_queryset(obj).select_related('category').order_by('-updated_at')
+                .only('id', 'title', 'summary', 'plain_text', 'created_at', 'updated_at', 'category__name')
+                [:getattr(settings, 'FEED_ITEMS', 20)])
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.get_summary()
+
+    def item_pubdate(self, item):
+        return item.created_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+    def item_categories(self, item):
+        return [item.category.name]
+
+
+class CategoryFeed(ArticleFeed):
+    def get_object(self, request, pk):
+        return get_object_or_404(Category, pk=pk)
+
+    def title(self, obj=None):
+        return f'{obj.name} - {SITE_TITLE}'
+
+    def link(self, obj=None):
+        return obj.get_absolute_url()
+
+    def description(self, obj=None):
+        return f'分类「{obj.name}」下的最新文档'
+
+    def get_queryset(self, obj=None):
+        return super().get_queryset().filter(category__in=obj.get_descendants(include_self=True))
+
+
+class TagFeed(ArticleFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Tag, slug=slug)
+
+    def title(self, obj=None):
+        return f'#{obj.name} - {SITE_TITLE}'
+
+    def link(self, obj=None):
+        return reverse('tag_detail', args=[obj.slug])
+
+    def description(self, obj=None):
+        return f'标签「{obj.name}」下的最新文档'
+
+    def get_queryset(self, obj=None):
+        return super().get_queryset().filter(tags=obj)
+
+
+class AtomMixin:
+    feed_type = Atom1Feed
+    subtitle = ArticleFeed.description
+
+
+class ArticleAtomFeed(AtomMixin, ArticleFeed):
+    pass
+
+
+class CategoryAtomFeed(AtomMixin, CategoryFeed):
+    subtitle = CategoryFeed.description
+
+
+class TagAtomFeed(AtomMixin, TagFeed):
+    subtitle = TagFeed.description
+
+
+def cached_feed(feed_class):
+    """包装为按 (地址, 内容版本号) 缓存的视图"""
+    feed = feed_class()
+
+    def view(request, *args, **kwargs):
+        key = f'feed:{feed_class.__name__}:{request.get_host()}:{request.path}:{get_content_version()}'
+
+        def build():
+            response = feed(request, *args, **kwargs)
+            return response.content, response['Content-Type'], parse_http_date_safe(response.get('Last-Modified', ''))
+
+        return cached_response(request, key, build)
+
+    return view
+
+
+site_rss = cached_feed(ArticleFeed)
+site_atom = cached_feed(ArticleAtomFeed)
+category_rss = cached_feed(CategoryFeed)
+category_atom = cached_feed(CategoryAtomFeed)
+tag_rss = cached_feed(TagFeed)
+tag_atom = cached_feed(TagAtomFeed)
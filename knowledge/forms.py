@@ -1,10 +1,11 @@
 from django import forms
-from captcha.fields import CaptchaField
+from feedback.captcha_pool import PooledCaptchaField
 from .models import Comment
 
 
 class CommentForm(forms.ModelForm):
-    captcha = CaptchaField(label="验证码")
+    # 文章页每次浏览都会渲染评论表单，开始填写时才领取验证码
+    captcha = PooledCaptchaField(label="验证码", lazy=True)
 
     class Meta:
         model = Comment
@@ -0,0 +1,93 @@
+"""
+SQLite FTS5 全文索引 (trigram 分词，中英文都可以按子串匹配)，供后台搜索使用
+
+knowledge_article_fts 是 knowledge_article 的外部内容表，只索引 title / summary / plain_text，
+由触发器随文章的增删改同步 (bulk_create、update() 同样生效)。表和触发器在 migrate 后创建，
+首次创建时从现有数据重建索引。非 SQLite 数据库或 SQLite 不支持 trigram 时自动退回 LIKE 搜索。
+"""
+import logging
+
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'knowledge_article_fts'
+ARTICLE_TABLE = 'knowledge_article'
+FTS_COLUMNS = ('title', 'summary', 'plain_text')
+# trigram 分词要求每个词至少 3 个字符
+MIN_TERM_LENGTH = 3
+
+_available = {}
+
+
+def _statements():
+    cols = ', '.join(FTS_COLUMNS)
+    new = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+    old = ', '.join(f'old.{c}' for c in FTS_COLUMNS)
+    delete_old = (f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) "
+                  f"VALUES ('delete', old.id, {old});")
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {ARTICLE_TABLE} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {ARTICLE_TABLE} BEGIN {delete_old} END",
+        # 只在被索引的列变化时更新，浏览量等字段的 UPDATE 不受影响
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {cols} ON {ARTICLE_TABLE} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def ensure_fts(using='default'):
+    """创建全文索引表和触发器；返回是否可用"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        exists = cursor.fetchone() is not None
+        if not exists:
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(FTS_COLUMNS)}, "
+                    f"content='{ARTICLE_TABLE}', content_rowid='id', tokenize='trigram')")
+            except DatabaseError:
+                logger.warning('当前 SQLite 不支持 FTS5 trigram，后台搜索使用 LIKE')
+                return False
+        for statement in _statements():
+            cursor.execute(statement)
+        if not exists:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _available[connection.alias] = True
+    return True
+
+
+def rebuild_fts(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_available(using='default'):
+    connection = connections[using]
+    if connection.alias not in _available:
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                available = cursor.fetchone() is not None
+        _available[connection.alias] = available
+    return _available[connection.alias]
+
+
+def match_expression(terms):
+    """把搜索词转换为 FTS5 MATCH 表达式 (每个词作为短语，AND 连接)；有词过短时返回 None"""
+    terms = [t for t in terms if t]
+    if not terms or any(len(t) < MIN_TERM_LENGTH for t in terms):
+        return None
+    return ' AND '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def setup_fts(sender, using='default', **kwargs):
+    """post_migrate 回调"""
+    from django.db import router
+    from .models import Article
+    if router.allow_migrate_model(using, Article):
+        ensure_fts(using)
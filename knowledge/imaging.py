@@ -0,0 +1,219 @@
+"""
+图片处理 (水印、封面缩放)
+
+只依赖 PIL / pilkit，不导入 Django 模型，批量导入时可在子进程 (ProcessPoolExecutor) 中调用。
+PIL 在函数内按需导入，导入本模块本身不加载图像库。
+"""
+import math
+import os
+from io import BytesIO
+
+# 与 Article.cover 字段的处理器保持一致
+COVER_SIZE = (1200, 800)
+COVER_QUALITY = 85
+
+
+class TextWatermark:
+    def __init__(self, text="Apmemory", opacity=100):
+        self.text = text
+        self.opacity = opacity
+
+    def process(self, img):
+        from PIL import Image, ImageDraw, ImageFont
+        img = img.convert('RGBA')
+        watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(watermark)
+        try:
+            font = ImageFont.truetype("arial.ttf", 40)
+        except IOError:
+            font = ImageFont.load_default()
+        text = self.text
+        text_bbox = draw.textbbox((0, 0), text, font=font)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+        
+        # 计算旋转后的对角线长度，确保足够容纳文字
+        diagonal = int(math.sqrt(text_width ** 2 + text_height ** 2))
+        
+        # 创建一个小的文本图像，用于旋转
+        text_img = Image.new('RGBA', (text_width, text_height), (0, 0, 0, 0))
+        text_draw = ImageDraw.Draw(text_img)
+        text_draw.text((0, 0), text, font=font, fill=(255, 255, 255, self.opacity))  # 白色半透明文字
+        
+        # 旋转文本图像 (约-45度倾斜)
+        rotated_text = text_img.rotate(-45, expand=1, fillcolor=(0, 0, 0, 0))
+        
+        # 确定水印位置 (多个重复的水印，覆盖整个图像)
+        pos_x_step = diagonal * 2  # 水平间距
+        pos_y_step = diagonal * 2  # 垂直间距
+        
+        # 在原图上多次放置水印
+        for offset_x in range(0, img.size[0], pos_x_step):
+            for offset_y in range(0, img.size[1], pos_y_step):
+                # 计算每个水印的位置
+                watermark.paste(rotated_text, (offset_x, offset_y), rotated_text)
+                
+        return Image.alpha_composite(img, watermark).convert('RGB')
+
+
+def add_watermark(img):
+    """添加右下角水印到图片"""
+    from PIL import Image, ImageDraw, ImageFont
+    img = img.convert('RGBA')
+    
+    # 创建与原图同样大小的透明图层用于绘制水印
+    watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(watermark)
+    
+    # 设置水印文字
+    text = "Apmemory"
+    try:
+        # 在 Windows 上使用系统字体路径
+        font_path = "C:\\Windows\\Fonts\\arial.ttf"
+        font = ImageFont.truetype(font_path, 20)
+    except (IOError, OSError):
+        try:
+            # 尝试其他常见字体
+            font_path = "C:\\Windows\\Fonts\\simsun.ttc"  # 中文字体
+            font = ImageFont.truetype(font_path, 20)
+        except (IOError, OSError):
+            font = ImageFont.load_default()
+    
+    # 获取文字尺寸
+    text_bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = text_bbox[2] - text_bbox[0]
+    text_height = text_bbox[3] - text_bbox[1]
+    
+    # 计算水印位置 (右下角)
+    margin = 30  # 边距
+    x = img.width - text_width - margin
+    y = img.height - text_height - margin
+    
+    # 在指定位置绘制水印文字
+    draw.text((x, y), text, font=font, fill=(255, 255, 255, 150))  # 设置适当的透明度
+    
+    # 将水印合成到原图上
+    combined = Image.alpha_composite(img, watermark)
+    return combined.convert('RGB')
+
+
+def watermark_file(path, kind='content'):
+    """
+    读取本地图片并加水印，返回 (图片数据, 扩展名, 宽, 高)
+    kind='content' 与编辑器上传一致 (右下角水印，保持原格式)；kind='cover' 与封面字段一致 (缩放 + 平铺水印，JPEG)
+    """
+    from PIL import Image
+    from pilkit.processors import ResizeToFit
+    with Image.open(path) as img:
+        if kind == 'cover':
+            result = TextWatermark().process(ResizeToFit(*COVER_SIZE).process(img))
+            fmt, ext, options = 'JPEG', 'jpg', {'quality': COVER_QUALITY}
+        else:
+            result = add_watermark(img)
+            fmt, ext, options = img.format, os.path.splitext(path)[1].lstrip('.').lower(), {}
+    output = BytesIO()
+    result.save(output, format=fmt, **options)
+    return output.getvalue(), ext, result.width, result.height
+
+
+# --- 压缩优化 (manage.py optimize_media 与编辑器上传，参数见 knowledge/media_optimizer.py) ---
+
+# 编辑器生成的图片格式与扩展名
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp', 'BMP': 'bmp'}
+EXIF_ORIENTATION = 0x0112
+
+
+def _encode(img, fmt, **options):
+    output = BytesIO()
+    img.save(output, format=fmt, **options)
+    return output.getvalue()
+
+
+def _opaque(img):
+    """去掉完全不透明的 alpha 通道；确有透明像素时返回 None"""
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        rgba = img.convert('RGBA')
+        if rgba.getextrema()[3][0] < 255:
+            return None
+        return rgba.convert('RGB')
+    return img.convert('RGB') if img.mode != 'L' else img
+
+
+def _mean_error(a, b):
+    from PIL import ImageChops, ImageStat
+    diff = ImageChops.difference(a, b)
+    return max(ImageStat.Stat(diff).mean)
+
+
+def encode_candidates(img, jpeg_quality=85, quantize=True, screenshot_max_colors=32768,
+                      max_quantize_error=2.0, convert=True):
+    """
+    无损或近无损的候选编码 [(数据, 扩展名)]，不含元数据：
+    - PNG 优化压缩；颜色不超过 256 种时转为调色板 (校验像素完全一致)
+    - 颜色较少的截图、图表量化为 256 色 (不抖动，平均误差超过 max_quantize_error 时放弃)
+    - 不透明且颜色丰富的照片类图片转为 JPEG
+    """
+    from PIL import Image
+    opaque = _opaque(img)
+    base = opaque if opaque is not None else img.convert('RGBA')
+    candidates = [(_encode(base, 'PNG', optimize=True), 'png')]
+
+    colors = base.getcolors(screenshot_max_colors)
+    if colors is not None:
+        method = Image.Quantize.MEDIANCUT if base.mode != 'RGBA' else Image.Quantize.FASTOCTREE
+        palette = base.quantize(colors=256, method=method, dither=Image.Dither.NONE)
+        error = _mean_error(palette.convert(base.mode), base)
+        if error == 0 or (quantize and error <= max_quantize_error):
+            candidates.append((_encode(palette, 'PNG', optimize=True), 'png'))
+    elif convert and opaque is not None:
+        candidates.append((_encode(opaque, 'JPEG', quality=jpeg_quality, optimize=True,
+                                   progressive=True), 'jpg'))
+    return candidates
+
+
+def encode_optimized(img, fmt, jpeg_quality=85, **options):
+    """编辑器上传：按压缩优化参数编码加过水印的图片，返回 (数据, 扩展名)"""
+    if fmt == 'JPEG':
+        return _encode(img.convert('RGB'), 'JPEG', quality=jpeg_quality, optimize=True, progressive=True), 'jpg'
+    if fmt in ('PNG', 'GIF', 'BMP'):
+        return min(encode_candidates(img, jpeg_quality=jpeg_quality, **options), key=lambda c: len(c[0]))
+    return _encode(img, fmt), FORMAT_EXTENSIONS.get(fmt, fmt.lower())
+
+
+def optimize_image(data, jpeg_quality=85, min_saving=0.05, **options):
+    """
+    重新压缩一张已存储的图片 (可在子进程中调用)，返回 (数据, 扩展名, 宽, 高, 说明)；
+    数据为 None 表示保持原文件 (动图、不支持的格式，或体积减少不到 min_saving)
+    - JPEG：沿用原量化表和采样方式 (quality='keep'，画质不变)，改为渐进式并优化哈夫曼表，
+      去掉 EXIF/XMP/缩略图，只保留方向标记和 ICC 色彩配置
+    - PNG / GIF / BMP：见 encode_candidates，取最小的结果
+    """
+    from PIL import Image
+    with Image.open(BytesIO(data)) as img:
+        width, height = img.size
+        if getattr(img, 'n_frames', 1) > 1:
+            return None, None, width, height, '动图'
+        if img.format == 'JPEG':
+            exif = Image.Exif()
+            orientation = img.getexif().get(EXIF_ORIENTATION)
+            if orientation and orientation != 1:
+                exif[EXIF_ORIENTATION] = orientation
+            icc = img.info.get('icc_profile')
+            candidates = [(_encode(img, 'JPEG', quality='keep', subsampling='keep', optimize=True, progressive=True,
+                                   exif=exif.tobytes(), **({'icc_profile': icc} if icc else {})), 'jpg')]
+        elif img.format in ('PNG', 'GIF', 'BMP'):
+            img.load()
+            if img.mode not in ('1', 'L', 'LA', 'P', 'PA', 'RGB', 'RGBA'):
+                return None, None, width, height, f'不处理 {img.mode} 模式 (高位深等)'
+            icc = img.info.get('icc_profile')
+            if icc:
+                # 带色彩配置的图片转换后可能偏色，只做无损的 PNG 重新压缩
+                candidates = [(_encode(img, 'PNG', optimize=True, icc_profile=icc), 'png')]
+            else:
+                candidates = encode_candidates(img, jpeg_quality=jpeg_quality, **options)
+        else:
+            return None, None, width, height, f'不处理 {img.format} 格式'
+    best, ext = min(candidates, key=lambda c: len(c[0]))
+    if len(best) > len(data) * (1 - min_saving):
+        return None, None, width, height, '无法明显变小'
+    return best, ext, width, height, ''
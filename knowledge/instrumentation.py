@@ -0,0 +1,73 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 当前请求的计时记录，由 PerformanceMiddleware 设置；不在请求中时为 None
+_current = ContextVar('knowledge_request_timings', default=None)
+
+
+class RequestTimings:
+    """单个请求内各阶段的累计耗时 (毫秒) 与次数"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}
+
+    def add(self, name, duration_ms, count=1):
+        total, n = self.spans.get(name, (0.0, 0))
+        self.spans[name] = (total + duration_ms, n + count)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def as_dict(self):
+        return {name: {'ms': round(total, 2), 'count': n} for name, (total, n) in self.spans.items()}
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """记录代码块耗时到当前请求，例如 with timed('storage'): ..."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+def sql_timer(execute, sql, params, many, context):
+    """数据库 execute 钩子：统计 SQL 次数与耗时 (不在请求中时直接执行)"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', (time.perf_counter() - start) * 1000)
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    """connection_created 信号处理：给每个新建的数据库连接挂上 SQL 计时钩子
+
+    异步视图的 ORM 调用运行在 sync_to_async 的线程中，按连接安装比在
+    中间件里按线程包装更可靠；计时结果通过 contextvars 归属到当前请求。
+    """
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
@@ -0,0 +1,226 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from taggit.models import Tag
+from knowledge.models import Article, Category
+from io import BytesIO
+from http.cookiejar import CookieJar
+import json
+import platform
+import random
+import re
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+SCENARIOS = ('doc_index', 'category_detail', 'tag_detail', 'doc_detail', 'search_view', 'ckeditor_upload_view')
+
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = '对主要视图进行基准测试，输出 p50/p95/p99 延迟、SQL 次数和峰值内存 (JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='每个场景的请求次数')
+        parser.add_argument('--warmup', type=int, default=5, help='预热请求次数 (不计入统计)')
+        parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS), help='逗号分隔的场景列表')
+        parser.add_argument('--base-url', type=str, default='',
+                            help='对运行中的服务压测 (如 http://127.0.0.1:8000)，默认在进程内调用')
+        parser.add_argument('--output', type=str, default='', help='结果写入 JSON 文件，默认输出到标准输出')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子，保证每次请求序列一致')
+
+    def handle(self, *args, **options):
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'未知场景: {", ".join(sorted(unknown))}')
+
+        self.rng = random.Random(options['seed'])
+        self.base_url = options['base_url'].rstrip('/')
+        self.uploaded = []
+        if self.base_url:
+            self.setup_http_client()
+        else:
+            from django.test import Client
+            self.client = Client()
+
+        targets = self.collect_targets()
+        results = {}
+        try:
+            for name in scenarios:
+                if not targets.get(name):
+                    self.stderr.write(f'跳过 {name}: 没有可用数据，请先运行 generate_corpus')
+                    continue
+                self.stderr.write(f'正在测试 {name}...')
+                results[name] = self.run_scenario(name, targets[name], options['iterations'], options['warmup'])
+        finally:
+            self.cleanup_uploads()
+
+        report = {
+            'meta': {
+                'mode': 'http' if self.base_url else 'in-process',
+                'base_url': self.base_url or None,
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'seed': options['seed'],
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'articles': Article.objects.count(),
+                'categories': Category.objects.count(),
+            },
+            'results': results,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+            self.stderr.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+        else:
+            self.stdout.write(data)
+
+    def collect_targets(self):
+        """从数据库中抽样每个场景要访问的 URL"""
+        public = Article.objects.filter(is_public=True)
+        article_ids = list(public.values_list('id', flat=True)[:500])
+        category_ids = list(Category.objects.values_list('id', flat=True)[:200])
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True)[:200])
+        words = set()
+        for title in public.values_list('title', flat=True)[:200]:
+            words.update(w for w in re.split(r'\s+', title) if len(w) >= 2)
+        words = sorted(words)[:100]
+
+        return {
+            'doc_index': ['/'] + [f'/?page={n}' for n in range(2, 6)],
+            'category_detail': [f'/category/{pk}/' for pk in category_ids],
+            'tag_detail': [f'/tag/{slug}/' for slug in tag_slugs],
+            'doc_detail': [f'/doc/{pk}/' for pk in article_ids],
+            'search_view': [f'/search/?q={urllib.parse.quote(w)}' for w in words],
+            'ckeditor_upload_view': ['/ckeditor5/image_upload/'] if article_ids else [],
+        }
+
+    def run_scenario(self, name, urls, iterations, warmup):
+        for _ in range(warmup):
+            self.request(name, self.rng.choice(urls))
+
+        latencies = []
+        queries = []
+        statuses = {}
+        for _ in range(iterations):
+            url = self.rng.choice(urls)
+            start = time.perf_counter()
+            status, query_count = self.request(name, url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            if query_count is not None:
+                queries.append(query_count)
+
+        result = {
+            'requests': iterations,
+            'status': {str(k): v for k, v in statuses.items()},
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'max_ms': round(max(latencies), 2),
+            'queries_avg': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'peak_memory_kb': None,
+        }
+        if not self.base_url:
+            # tracemalloc 会拖慢执行，单独跑一次测峰值内存，不影响延迟统计
+            tracemalloc.start()
+            self.request(name, self.rng.choice(urls))
+            result['peak_memory_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+        return result
+
+    # --- 请求 ---
+    def request(self, name, url):
+        if self.base_url:
+            return self.http_request(name, url)
+        with CaptureQueriesContext(connection) as ctx:
+            if name == 'ckeditor_upload_view':
+                response = self.client.post(url, {'upload': self.sample_image()})
+                self.remember_upload(response.content)
+            else:
+                response = self.client.get(url)
+        return response.status_code, len(ctx.captured_queries)
+
+    def sample_image(self):
+        from PIL import Image
+
+        img = Image.new('RGB', (1280, 720), tuple(self.rng.randrange(256) for _ in range(3)))
+        output = BytesIO()
+        img.save(output, format='PNG')
+        output.seek(0)
+        output.name = f'bench-{uuid.uuid4().hex[:8]}.png'
+        return output
+
+    def remember_upload(self, content):
+        try:
+            url = json.loads(content).get('url')
+        except ValueError:
+            return
+        if url:
+            self.uploaded.append(url)
+
+    def cleanup_uploads(self):
+        """删除压测过程中上传的图片 (仅进程内模式可直接访问存储)"""
+        if self.base_url or not self.uploaded:
+            return
+        from django.conf import settings
+        from django.core.files.storage import default_storage
+        for url in self.uploaded:
+            if url.startswith(settings.MEDIA_URL):
+                default_storage.delete(url[len(settings.MEDIA_URL):])
+
+    # --- HTTP 模式 ---
+    def setup_http_client(self):
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.csrf_token = None
+
+    def fetch_csrf_token(self):
+        # 文章详情页包含评论表单，访问后会下发 csrftoken cookie
+        pk = Article.objects.filter(is_public=True).values_list('id', flat=True).first()
+        self.opener.open(f'{self.base_url}/doc/{pk}/').read()
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        raise CommandError('无法获取 CSRF token，无法测试上传接口')
+
+    def http_request(self, name, url):
+        if name == 'ckeditor_upload_view':
+            if self.csrf_token is None:
+                self.csrf_token = self.fetch_csrf_token()
+            boundary = uuid.uuid4().hex
+            image = self.sample_image()
+            body = (f'--{boundary}\r\nContent-Disposition: form-data; name="upload"; filename="{image.name}"\r\n'
+                    f'Content-Type: image/png\r\n\r\n').encode() + image.getvalue() + f'\r\n--{boundary}--\r\n'.encode()
+            req = urllib.request.Request(self.base_url + url, data=body, headers={
+                'Content-Type': f'multipart/form-data; boundary={boundary}',
+                'X-CSRFToken': self.csrf_token,
+                'Referer': self.base_url + '/',
+            })
+        else:
+            req = urllib.request.Request(self.base_url + url)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                status, timing = response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as e:
+            status, timing = e.code, e.headers.get('Server-Timing', '')
+        # 服务端开启 PERF_SERVER_TIMING 时可从响应头得到 SQL 次数
+        match = re.search(r'db;[^,]*desc="(\d+) queries"', timing or '')
+        return status, int(match.group(1)) if match else None
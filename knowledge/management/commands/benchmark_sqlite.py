@@ -0,0 +1,120 @@
+from django.core.management.base import BaseCommand
+from AP_knowledge.database import sqlite_init_command
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class Command(BaseCommand):
+    help = '对比默认 SQLite 配置与调优配置 (WAL + PRAGMA) 下的并发读写吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='并发读线程数')
+        parser.add_argument('--writers', type=int, default=2, help='并发写线程数')
+        parser.add_argument('--duration', type=float, default=5.0, help='每种配置的测试时长 (秒)')
+        parser.add_argument('--rows', type=int, default=5000, help='初始数据行数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in ('default', 'tuned'):
+            self.stderr.write(f'正在测试 {mode} 配置...')
+            results[mode] = self.run(mode, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f'{"配置":<10}{"读/秒":>12}{"写/秒":>12}{"锁错误":>10}{"读 p99(ms)":>14}')
+        for mode, r in results.items():
+            self.stdout.write(f'{mode:<10}{r["reads_per_sec"]:>12}{r["writes_per_sec"]:>12}'
+                              f'{r["lock_errors"]:>10}{r["read_p99_ms"]:>14}')
+
+    def connect(self, path, mode):
+        # 与 Django 一样使用 Python 默认的 5 秒超时
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        if mode == 'tuned':
+            for command in sqlite_init_command().split(';'):
+                conn.execute(command)
+        return conn
+
+    def run(self, mode, options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.sqlite3')
+            conn = self.connect(path, mode)
+            # 模拟文章表：正文较大，列表页按时间倒序读取
+            conn.execute('CREATE TABLE article (id INTEGER PRIMARY KEY, title TEXT, content TEXT, '
+                         'views INTEGER, created_at REAL)')
+            conn.execute('CREATE INDEX article_created ON article (created_at)')
+            conn.execute('BEGIN')
+            conn.executemany('INSERT INTO article (title, content, views, created_at) VALUES (?, ?, 0, ?)',
+                             ((f'title {i}', 'x' * 2000, i) for i in range(options['rows'])))
+            conn.execute('COMMIT')
+            conn.close()
+
+            stop = threading.Event()
+            stats = {'reads': 0, 'writes': 0, 'lock_errors': 0, 'read_latencies': []}
+            lock = threading.Lock()
+
+            def reader(seed):
+                c = self.connect(path, mode)
+                offset = seed * 10
+                reads, latencies, errors = 0, [], 0
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        c.execute('SELECT id, title, views FROM article ORDER BY created_at DESC '
+                                  'LIMIT 10 OFFSET ?', (offset % options['rows'],)).fetchall()
+                        c.execute('SELECT content FROM article WHERE id = ?',
+                                  (offset % options['rows'] + 1,)).fetchone()
+                        reads += 1
+                        latencies.append((time.perf_counter() - start) * 1000)
+                    except sqlite3.OperationalError:
+                        errors += 1
+                    offset += 7
+                c.close()
+                with lock:
+                    stats['reads'] += reads
+                    stats['lock_errors'] += errors
+                    stats['read_latencies'].extend(latencies)
+
+            def writer(seed):
+                c = self.connect(path, mode)
+                writes, errors, n = 0, 0, seed
+                while not stop.is_set():
+                    try:
+                        # 模拟浏览量自增和评论写入
+                        c.execute('BEGIN IMMEDIATE' if mode == 'tuned' else 'BEGIN')
+                        c.execute('UPDATE article SET views = views + 1 WHERE id = ?', (n % options['rows'] + 1,))
+                        c.execute('COMMIT')
+                        writes += 1
+                    except sqlite3.OperationalError:
+                        errors += 1
+                        if c.in_transaction:
+                            c.execute('ROLLBACK')
+                    n += 13
+                c.close()
+                with lock:
+                    stats['writes'] += writes
+                    stats['lock_errors'] += errors
+
+            threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+            threads += [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+            for t in threads:
+                t.start()
+            time.sleep(options['duration'])
+            stop.set()
+            for t in threads:
+                t.join()
+
+        latencies = sorted(stats['read_latencies'])
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        return {
+            'reads_per_sec': round(stats['reads'] / options['duration']),
+            'writes_per_sec': round(stats['writes'] / options['duration']),
+            'lock_errors': stats['lock_errors'],
+            'read_p99_ms': round(p99, 2),
+        }
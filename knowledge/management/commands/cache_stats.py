@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.core.cache import caches
+from AP_knowledge.cache_backends import STAT_NAMES, TwoTierCache, collect_stats
+import time
+
+
+class Command(BaseCommand):
+    help = '汇总各进程两级缓存的命中率、淘汰和作废次数 (各进程每 STATS_INTERVAL 秒上报一次)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help='缓存别名')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not isinstance(cache, TwoTierCache):
+            self.stdout.write(self.style.WARNING(f"缓存 {options['alias']} 不是两级缓存 ({type(cache).__name__})"))
+            return
+        self.stdout.write(f'当前内容版本号: {cache.current_version()}')
+        totals = dict.fromkeys(STAT_NAMES, 0)
+        header = f"{'进程':<28}{'进程内命中':>10}{'共享命中':>10}{'未命中':>8}{'淘汰':>8}{'作废':>8}{'命中率':>8}{'更新于':>8}"
+        self.stdout.write(header)
+        for worker, stats in collect_stats(options['alias']):
+            for name in STAT_NAMES:
+                totals[name] += stats.get(name, 0)
+            age = int(time.time() - stats.get('updated', time.time()))
+            self.stdout.write(
+                f"{worker:<28}{stats['local_hits']:>10}{stats['shared_hits']:>10}{stats['misses']:>8}"
+                f"{stats['evictions']:>8}{stats['invalidations']:>8}{stats['hit_rate']:>8.1%}{age:>6}秒前")
+        lookups = totals['local_hits'] + totals['shared_hits'] + totals['misses']
+        if lookups:
+            self.stdout.write(self.style.SUCCESS(
+                f"合计: 命中率 {(totals['local_hits'] + totals['shared_hits']) / lookups:.1%}，"
+                f"其中进程内命中 {totals['local_hits'] / lookups:.1%}，淘汰 {totals['evictions']} 次，"
+                f"版本变化作废 {totals['invalidations']} 次"))
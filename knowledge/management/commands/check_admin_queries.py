@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from knowledge.models import Article
+
+# 各后台页面允许的最大查询数，与数据量无关；超出说明出现了 N+1 查询
+QUERY_BUDGETS = {
+    'article_changelist': 8,
+    'article_search': 8,
+    'article_change': 15,
+    'comment_changelist': 8,
+}
+
+
+class Command(BaseCommand):
+    help = '检查后台列表/编辑页的查询次数是否超出预算 (防止 N+1 查询回归)，需要库中已有数据，可先运行 generate_corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--search', type=str, default='控制器', help='文章搜索使用的关键词')
+
+    def handle(self, *args, **options):
+        article = Article.objects.order_by('-pk').first()
+        if article is None:
+            raise CommandError('没有文章数据，请先运行 generate_corpus')
+
+        pages = {
+            'article_changelist': '/admin/knowledge/article/',
+            'article_search': f"/admin/knowledge/article/?q={options['search']}",
+            'article_change': f'/admin/knowledge/article/{article.pk}/change/',
+            'comment_changelist': '/admin/knowledge/comment/',
+        }
+        failures = []
+        # 临时管理员和会话在事务中创建，检查结束后回滚
+        with transaction.atomic():
+            user = get_user_model().objects.create_superuser(
+                'query-budget-check', 'query-budget-check@example.com', None)
+            client = Client()
+            client.force_login(user)
+            for name, url in pages.items():
+                client.get(url)  # 预热 (ContentType 等进程内缓存)
+                with CaptureQueriesContext(connections['default']) as queries:
+                    response = client.get(url)
+                count, budget = len(queries), QUERY_BUDGETS[name]
+                ok = response.status_code == 200 and count <= budget
+                line = f'{name:<20} {response.status_code} {count:>3} 次查询 (预算 {budget})'
+                self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+                if not ok:
+                    failures.append(name)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"查询次数超出预算: {', '.join(failures)}")
@@ -0,0 +1,57 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import AsyncClient
+from knowledge.models import Article
+
+
+class Command(BaseCommand):
+    help = ('以匿名和登录用户分别请求异步版本的前台页面 (包括提交评论)，检查没有在事件循环中执行同步查询 '
+            '(SynchronousOnlyOperation 会返回 500)；需要 KNOWLEDGE_ASYNC_VIEWS=1')
+
+    def handle(self, *args, **options):
+        if not settings.KNOWLEDGE_ASYNC_VIEWS:
+            raise CommandError('请以 KNOWLEDGE_ASYNC_VIEWS=1 运行，例如 KNOWLEDGE_ASYNC_VIEWS=1 python manage.py check_async_views')
+        article = Article.objects.filter(is_public=True).order_by('-pk').first()
+        if article is None:
+            raise CommandError('没有公开的文章，请先运行 generate_corpus')
+
+        # 临时用户、会话和评论在事务中创建，检查结束后回滚
+        with transaction.atomic():
+            user = get_user_model().objects.create_user('async-view-check', 'async-view-check@example.com', None)
+            failures = async_to_sync(self.run)(article, user)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"异步视图请求失败: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('异步视图检查通过'))
+
+    async def run(self, article, user):
+        detail = f'/doc/{article.pk}/'
+        requests = [
+            ('GET', '/'),
+            ('GET', detail),
+            ('GET', '/search/?q=test'),
+            ('GET', '/archive/'),
+            ('POST', detail),
+        ]
+        failures = []
+        for label in ('匿名', '登录'):
+            # 视图中的异常按 500 统计，不直接抛出
+            client = AsyncClient(raise_request_exception=False)
+            if label == '登录':
+                await client.aforce_login(user)
+            for method, url in requests:
+                if method == 'POST':
+                    # 验证码不正确，视图应返回带错误信息的页面 (或 429)，而不是 500
+                    response = await client.post(url, {'name': 'check', 'content': 'check'})
+                else:
+                    response = await client.get(url)
+                ok = response.status_code < 500
+                line = f'{label} {method:<4} {url:<24} {response.status_code}'
+                self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+                if not ok:
+                    failures.append(f'{label} {method} {url}')
+        return failures
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import os
+import re
+import subprocess
+import sys
+import time
+
+# 模拟 Web 进程启动：初始化 Django 并加载 URLconf (会导入全部视图模块)
+WORKER_BOOT = (
+    "import os, time\n"
+    "start = time.perf_counter()\n"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AP_knowledge.settings')\n"
+    "import django\n"
+    "django.setup()\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+    "print((time.perf_counter() - start) * 1000)\n"
+)
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = '测量冷启动导入耗时 (-X importtime) 和 manage.py check 耗时，超出 STARTUP_BUDGETS 或提前加载了懒加载模块时失败'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='每项测量次数，取最小值以减少噪声')
+        parser.add_argument('--top', type=int, default=15, help='列出累计耗时最多的顶层导入模块数')
+
+    def handle(self, *args, **options):
+        budgets = getattr(settings, 'STARTUP_BUDGETS', {})
+        lazy_modules = getattr(settings, 'STARTUP_LAZY_MODULES', ())
+        repeat = max(options['repeat'], 1)
+        failures = []
+
+        # 1. Web 进程冷启动
+        runs = [self.measure_boot() for _ in range(repeat)]
+        boot_ms, imports = min(runs, key=lambda run: run[0])
+        import_ms = sum(self_us for self_us, _, _ in imports.values()) / 1000
+        self.report('worker_boot', boot_ms, budgets.get('worker_boot'), failures)
+        self.report('imports', import_ms, budgets.get('imports'), failures)
+
+        eager = [name for name in lazy_modules if name in imports]
+        if eager:
+            failures.append('lazy_modules')
+            self.stdout.write(self.style.ERROR(f"启动时被提前导入的懒加载模块: {', '.join(eager)}"))
+
+        top = sorted(((cumulative, name) for name, (_, cumulative, level) in imports.items() if level == 0),
+                     reverse=True)[:options['top']]
+        self.stdout.write('累计导入耗时最多的顶层模块:')
+        for cumulative, name in top:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+        # 2. manage.py check (cron 等命令的固定开销)
+        check_ms = min(self.measure_check() for _ in range(repeat))
+        self.report('manage_check', check_ms, budgets.get('manage_check'), failures)
+
+        if failures:
+            raise CommandError(f"启动耗时超出预算: {', '.join(failures)}")
+
+    def report(self, name, value, budget, failures):
+        ok = budget is None or value <= budget
+        line = f"{name:<14} {value:8.1f} ms" + (f' (预算 {budget} ms)' if budget is not None else '')
+        self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+        if not ok:
+            failures.append(name)
+
+    def run(self, args):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'AP_knowledge.settings'))
+        result = subprocess.run([sys.executable, *args], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"执行失败: {' '.join(args)}\n{result.stderr[-2000:]}")
+        return result
+
+    def measure_boot(self):
+        """返回 (启动耗时 ms, {模块: (自身耗时 us, 累计耗时 us, 缩进层级)})"""
+        result = self.run(['-X', 'importtime', '-c', WORKER_BOOT])
+        imports = {}
+        for line in result.stderr.splitlines():
+            match = _IMPORT_LINE.match(line)
+            if match:
+                imports[match.group(4)] = (int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2)
+        return float(result.stdout.strip().splitlines()[-1]), imports
+
+    def measure_check(self):
+        start = time.perf_counter()
+        self.run(['manage.py', 'check'])
+        return (time.perf_counter() - start) * 1000
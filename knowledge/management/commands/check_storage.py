@@ -0,0 +1,155 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+import os
+import tempfile
+import time
+import uuid
+
+try:
+    from moto import mock_aws  # 可选依赖：pip install "moto[s3]"，只用于 --moto
+except ImportError:
+    mock_aws = None
+
+# --moto 使用的本地 S3 替身配置；分片阈值取 S3 允许的最小分片 5 MB，测试文件超过它以走分片上传
+MOTO_SETTINGS = {
+    'STORAGES': {**settings.STORAGES, 'default': {'BACKEND': 'knowledge.s3storage.S3Storage'}},
+    'S3_BUCKET': 'storage-check', 'S3_REGION': 'us-east-1', 'S3_ENDPOINT_URL': None,
+    'S3_ACCESS_KEY': 'testing', 'S3_SECRET_KEY': 'testing', 'S3_PREFIX': 'media',
+    'S3_MULTIPART_THRESHOLD': 5 * 1024 * 1024, 'S3_MULTIPART_CHUNKSIZE': 5 * 1024 * 1024,
+    'ATTACHMENT_SENDFILE_BACKEND': None,
+}
+
+
+class Command(BaseCommand):
+    help = ('对当前配置的媒体存储 (本地目录或 S3 兼容对象存储) 做一次读写自检：保存、查询、分段读取、列目录、删除；'
+            '--moto 在进程内的 S3 替身上检查 S3Storage 以及依赖它的下载、媒体转发和导出')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1024 * 1024, help='测试文件大小 (字节)，超过分片阈值时会走分片上传')
+        parser.add_argument('--moto', action='store_true', help='使用 moto 模拟的 S3 (需要 boto3 和 moto)')
+
+    def handle(self, *args, **options):
+        if not options['moto']:
+            self.check_basic(default_storage, options['size'])
+            return
+        if mock_aws is None:
+            raise CommandError('--moto 需要安装 moto: pip install "moto[s3]"')
+        with mock_aws(), override_settings(**MOTO_SETTINGS):
+            import boto3
+            boto3.client('s3', region_name=MOTO_SETTINGS['S3_REGION']).create_bucket(Bucket=MOTO_SETTINGS['S3_BUCKET'])
+            self.check_basic(default_storage, max(options['size'], 6 * 1024 * 1024))
+            self.check_s3(default_storage)
+
+    def check_basic(self, storage, size):
+        self.stdout.write(f"存储后端: {settings.STORAGES['default']['BACKEND']}")
+        data = os.urandom(max(size, 16))
+        directory = f'storage-check/{uuid.uuid4().hex}'
+        name = f'{directory}/probe.bin'
+
+        start = time.perf_counter()
+        saved = storage.save(name, ContentFile(data))
+        self.step('保存', start)
+        try:
+            start = time.perf_counter()
+            if not storage.exists(saved):
+                raise CommandError('保存后 exists() 返回 False')
+            if storage.size(saved) != len(data):
+                raise CommandError(f'size() 返回 {storage.size(saved)}，应为 {len(data)}')
+            self.step('查询', start)
+
+            start = time.perf_counter()
+            with storage.open(saved, 'rb') as f:
+                if f.read() != data:
+                    raise CommandError('读取内容与写入不一致')
+                # 断点续传依赖 seek 后从中间读取
+                middle = len(data) // 2
+                f.seek(middle)
+                if f.read(8) != data[middle:middle + 8]:
+                    raise CommandError('seek 后读取内容不一致')
+            self.step('读取', start)
+
+            start = time.perf_counter()
+            dirs, files = storage.listdir(directory)
+            if os.path.basename(saved) not in files:
+                raise CommandError(f'listdir() 未列出 {saved}')
+            self.step('列目录', start)
+            self.stdout.write(f'  访问地址: {storage.url(saved)}')
+        finally:
+            start = time.perf_counter()
+            storage.delete(saved)
+            self.step('删除', start)
+
+        if storage.exists(saved):
+            raise CommandError('删除后 exists() 仍返回 True')
+        self.stdout.write(self.style.SUCCESS('存储自检通过'))
+
+    def check_s3(self, storage):
+        """S3Storage 特有的行为：文件对象状态、签名地址、serve_media 两种模式、附件断点续传、导出复制"""
+        from knowledge import views
+        from knowledge.archive import copy_storage_files
+        from knowledge.models import Article, Attachment, Category
+
+        data = os.urandom(256 * 1024)
+        name = storage.save(f'storage-check/{uuid.uuid4().hex}/file.bin', ContentFile(data))
+        factory = RequestFactory()
+        try:
+            f = storage.open(name)
+            if f.closed:
+                raise CommandError('打开后、读取前 closed 应为 False')
+            f.close()
+            if not f.closed:
+                raise CommandError('close() 后 closed 应为 True')
+            self.ok('文件对象 open/close 状态')
+
+            url = storage.presigned_url(name, filename='下载.bin')
+            if 'Signature' not in url or 'response-content-disposition' not in url:
+                raise CommandError(f'签名地址缺少签名或下载文件名: {url}')
+            self.ok('临时签名地址')
+
+            storage.url_mode = 'redirect'
+            response = views.serve_media(factory.get('/media/' + name), name)
+            if response.status_code != 302 or storage.key(name) not in response['Location']:
+                raise CommandError(f'serve_media (redirect) 返回 {response.status_code}')
+            storage.url_mode = 'proxy'
+            response = views.serve_media(factory.get('/media/' + name), name)
+            if response.status_code != 200 or b''.join(response.streaming_content) != data:
+                raise CommandError(f'serve_media (proxy) 返回 {response.status_code} 或内容不一致')
+            self.ok('serve_media 跳转 / 转发')
+
+            # 下载视图走只读连接，看不到未提交的事务，临时数据提交后再删除
+            category = Category.objects.create(name='storage-check')
+            try:
+                article = Article.objects.create(category=category, title='storage-check',
+                                                 content='<p>storage-check</p>')
+                attachment = Attachment.objects.create(article=article, file=name, name='file.bin')
+                response = views.attachment_download(factory.get('/', HTTP_RANGE='bytes=100-199'), attachment.pk)
+                if response.status_code != 206 or b''.join(response.streaming_content) != data[100:200]:
+                    raise CommandError(f'附件分段下载 (proxy) 返回 {response.status_code} 或内容不一致')
+                storage.url_mode = 'redirect'
+                response = views.attachment_download(factory.get('/'), attachment.pk)
+                if response.status_code != 302:
+                    raise CommandError(f'附件下载 (redirect) 返回 {response.status_code}')
+            finally:
+                category.delete()
+            self.ok('附件下载 (分段读取 / 跳转)')
+
+            with tempfile.TemporaryDirectory() as temp_dir:
+                copied = copy_storage_files(temp_dir, 'storage-check', workers=4)
+                relative = name[len('storage-check/'):]
+                with open(os.path.join(temp_dir, *relative.split('/')), 'rb') as f:
+                    if copied < 1 or f.read() != data:
+                        raise CommandError('copy_storage_files 复制的文件与原文件不一致')
+            self.ok('导出时复制存储文件')
+        finally:
+            storage.delete(name)
+        self.stdout.write(self.style.SUCCESS('S3 存储检查通过'))
+
+    def ok(self, label):
+        self.stdout.write(f'  {label}: OK')
+
+    def step(self, label, start):
+        self.stdout.write(f'  {label}: {(time.perf_counter() - start) * 1000:.1f} ms')
@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-import os
+from django.core.files.storage import default_storage
 import re
 from knowledge.models import Article, Attachment, Comment
+from knowledge.metrics import track_command
 
 
 class Command(BaseCommand):
@@ -15,6 +16,7 @@ class Command(BaseCommand):
             help='仅显示要删除的文件，不实际删除',
         )
 
+    @track_command
     def handle(self, *args, **options):
         dry_run = options['dry_run']
 
@@ -60,21 +62,13 @@ class Command(BaseCommand):
         # 检查其他可能的引用方式，比如直接的文件名等
         # 这里可以扩展来检查其他模型或字段
 
-        # 扫描media/attachments目录
-        media_root = settings.MEDIA_ROOT
-        attachments_dir = os.path.join(media_root, 'attachments')
-
-        if not os.path.exists(attachments_dir):
-            self.stdout.write('attachments目录不存在')
+        # 扫描存储中的 attachments 目录 (通过 Storage API，媒体文件在对象存储中时同样适用)
+        from knowledge.archive import iter_storage_files
+        all_files = set(iter_storage_files('attachments'))
+        if not all_files:
+            self.stdout.write('attachments目录不存在或为空')
             return
 
-        all_files = set()
-        for root, dirs, files in os.walk(attachments_dir):
-            for file in files:
-                # 获取相对于media目录的路径
-                rel_path = os.path.relpath(os.path.join(root, file), media_root)
-                all_files.add(rel_path)
-
         # 找出无引用的文件
         unreferenced_files = all_files - referenced_files
 
@@ -93,12 +87,12 @@ class Command(BaseCommand):
         # 删除文件
         deleted_count = 0
         for file in unreferenced_files:
-            full_path = os.path.join(media_root, file)
             try:
-                os.remove(full_path)
+                default_storage.delete(file)
                 deleted_count += 1
                 self.stdout.write(f'已删除: {file}')
-            except OSError as e:
-                self.stdout.write(f'删除失败 {file}: {e}')
+            except Exception as e:
+                # 本地存储抛出 OSError，对象存储抛出 botocore 的 ClientError；单个文件失败不中断清理
+                self.stderr.write(f'删除失败 {file}: {e}')
 
         self.stdout.write(f'成功删除 {deleted_count} 个文件')
\ No newline at end of file
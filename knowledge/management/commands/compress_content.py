@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+import os
+import time
+from knowledge import content_storage
+from knowledge.models import Article
+from knowledge.metrics import track_command
+
+
+def format_size(size):
+    return f'{size / 1024 / 1024:.2f} MB'
+
+
+class Command(BaseCommand):
+    help = ('按 ARTICLE_CONTENT_COMPRESSION 分批压缩已有文章的正文 (或用 --decompress 全部还原为明文)，'
+            '开启或切换压缩算法后运行一次；已是目标格式的文章跳过')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批处理的文章数 (一个事务)')
+        parser.add_argument('--codec', choices=('zlib', 'zstd'),
+                            help='覆盖 ARTICLE_CONTENT_COMPRESSION (之后保存的文章仍按设置处理)')
+        parser.add_argument('--decompress', action='store_true', help='全部还原为明文存储 (关闭压缩前运行)')
+        parser.add_argument('--vacuum', action='store_true', help='完成后执行 VACUUM 回收空间 (仅 SQLite，会锁库)')
+
+    @track_command
+    def handle(self, *args, **options):
+        codec = None if options['decompress'] else options['codec'] or settings.ARTICLE_CONTENT_COMPRESSION
+        if not codec and not options['decompress']:
+            raise CommandError('未开启 ARTICLE_CONTENT_COMPRESSION，请指定 --codec，或使用 --decompress 还原')
+        marker = content_storage.CODEC_MARKERS.get(codec)
+
+        start = time.perf_counter()
+        counts = {'changed': 0, 'skipped': 0}
+        raw_total = stored_before = stored_after = 0
+        last_pk = 0
+        queryset = Article.objects.order_by('pk').only('pk', 'content', 'content_compressed')
+        while True:
+            # 按主键分页而不是 iterator()：SQLite 同一连接上边读边写不安全
+            batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            with transaction.atomic():
+                for article in batch:
+                    old_blob = article.content_compressed
+                    text = article.content
+                    raw = len(text.encode('utf-8'))
+                    stored = len(old_blob) if old_blob is not None else raw
+                    raw_total += raw
+                    stored_before += stored
+                    if old_blob is not None and bytes(old_blob[:1]) == marker:
+                        counts['skipped'] += 1
+                        stored_after += stored
+                        continue
+                    blob = content_storage.compress(text, codec) if codec else None
+                    if blob is None and old_blob is None:
+                        counts['skipped'] += 1
+                        stored_after += stored
+                        continue
+                    # update() 不触发信号和 auto_now：正文没有变化，缓存和修改时间保持不变
+                    Article.objects.filter(pk=article.pk).update(
+                        content='' if blob is not None else text, content_compressed=blob)
+                    counts['changed'] += 1
+                    stored_after += len(blob) if blob is not None else raw
+            self.stdout.write(f"  已处理至 #{last_pk}，转换 {counts['changed']} 篇")
+
+        ratio = stored_after / raw_total * 100 if raw_total else 100
+        self.stdout.write(self.style.SUCCESS(
+            f"完成: 转换 {counts['changed']} 篇，跳过 {counts['skipped']} 篇，耗时 {time.perf_counter() - start:.1f} 秒"))
+        self.stdout.write(f'正文原始大小 {format_size(raw_total)}，存储 {format_size(stored_before)} -> '
+                          f'{format_size(stored_after)} ({ratio:.0f}%)')
+        if options['vacuum']:
+            self.vacuum()
+
+    def vacuum(self):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('非 SQLite 数据库，跳过 VACUUM')
+            return
+        path = str(connection.settings_dict['NAME'])
+        before = os.path.getsize(path)
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+        self.stdout.write(f'VACUUM: 数据库文件 {format_size(before)} -> {format_size(os.path.getsize(path))}')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from knowledge.archive import stream_jsonl, stream_zip
+import os
+import sys
+from knowledge.metrics import track_command
+
+
+class Command(BaseCommand):
+    help = '全量导出知识库 (JSON Lines 数据 + 媒体文件 zip)，流式写出，用于备份和迁移'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, default='knowledge_archive.zip',
+                            help='输出文件，"-" 表示写到标准输出')
+        parser.add_argument('--format', choices=('zip', 'jsonl'), default='zip',
+                            help='zip: 每张表一个 .jsonl 并包含媒体文件；jsonl: 单个 JSON Lines 流，不含媒体')
+        parser.add_argument('--no-media', action='store_true', help='zip 中不包含媒体文件')
+
+    @track_command
+    def handle(self, *args, **options):
+        if options['format'] == 'zip':
+            chunks = stream_zip(include_media=not options['no_media'])
+        else:
+            chunks = stream_jsonl()
+
+        output = options['output']
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        # 先写临时文件，完成后再替换，导出失败时旧的备份仍然可用
+        temp_path = f'{output}.part'
+        written = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+            os.replace(temp_path, output)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.stdout.write(self.style.SUCCESS(f'导出完成: {os.path.abspath(output)} ({written / 1024 / 1024:.2f} MB)'))
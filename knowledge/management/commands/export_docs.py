@@ -1,11 +1,13 @@
 from django.core.management.base import BaseCommand
 from django.template.loader import render_to_string
 from django.conf import settings
-from django.test import RequestFactory
-from knowledge.views import doc_index, doc_detail
+from knowledge.compression import write_compressed_variants
+from knowledge.search_index import build_index, write_index
 from knowledge.models import Article
+from concurrent.futures import ThreadPoolExecutor
 import os
 import shutil
+from knowledge.metrics import track_command
 
 
 class Command(BaseCommand):
@@ -13,8 +15,14 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--output', type=str, default='dist', help='输出目录')
+        parser.add_argument('--search-shards', type=int, default=16, help='搜索索引分片数')
+        parser.add_argument('--no-compress', action='store_true', help='不生成 .gz / .br 预压缩文件')
 
+    @track_command
     def handle(self, *args, **options):
+        # 测试工具和视图模块只在真正导出时才需要，不拖慢 manage.py 的其他命令
+        from django.test import RequestFactory
+        from knowledge.views import doc_index, doc_detail
         output_dir = options['output']
 
         # 1. 清理旧数据
@@ -27,17 +35,19 @@ class Command(BaseCommand):
         self.stdout.write("正在复制静态资源...")
 
         # 复制 static (CSS/JS/Fonts)
-        # 注意：这里假设你使用的是开发环境的 static 目录。
-        # 如果是生产环境，应该复制 STATIC_ROOT。这里我们遍历 STATICFILES_DIRS。
+        # 执行过 collectstatic 时复制 STATIC_ROOT (页面中引用的是带哈希的文件名)，否则复制 STATICFILES_DIRS
         static_dest = os.path.join(output_dir, 'static')
-        for static_dir in settings.STATICFILES_DIRS:
-            if os.path.exists(static_dir):
-                shutil.copytree(static_dir, static_dest, dirs_exist_ok=True)
+        if settings.STATIC_ROOT and os.path.exists(os.path.join(settings.STATIC_ROOT, 'staticfiles.json')):
+            shutil.copytree(settings.STATIC_ROOT, static_dest, dirs_exist_ok=True)
+        else:
+            for static_dir in settings.STATICFILES_DIRS:
+                if os.path.exists(static_dir):
+                    shutil.copytree(static_dir, static_dest, dirs_exist_ok=True)
 
         # 复制 media (上传的图片/附件)
-        media_dest = os.path.join(output_dir, 'media')
-        if os.path.exists(settings.MEDIA_ROOT):
-            shutil.copytree(settings.MEDIA_ROOT, media_dest, dirs_exist_ok=True)
+        # 通过 Storage API 读取，媒体文件在对象存储中时同样适用
+        from knowledge.archive import copy_storage_files
+        copy_storage_files(os.path.join(output_dir, 'media'))
 
         # 3. 模拟请求并生成页面
         factory = RequestFactory()
@@ -73,6 +83,45 @@ class Command(BaseCommand):
             with open(os.path.join(doc_dir, 'index.html'), 'w', encoding='utf-8') as f:
                 f.write(response.content.decode('utf-8'))
 
+        # --- 搜索页与客户端搜索索引 ---
+        self.export_search(factory, output_dir, options['search_shards'])
+
+        # --- 预压缩 ---
+        if not options['no_compress']:
+            self.compress_output(output_dir)
+
         self.stdout.write(self.style.SUCCESS(f'\n导出完成！文件位于: {os.path.abspath(output_dir)}'))
-        self.stdout.write(self.style.WARNING('注意：静态导出后，评论、搜索、验证码功能将不可用。'))
-        self.stdout.write('提示：你可以进入 dist 目录运行 "python -m http.server" 来预览。')
\ No newline at end of file
+        self.stdout.write(self.style.WARNING('注意：静态导出后，评论、验证码功能将不可用，搜索改为浏览器端查询预生成的索引。'))
+        self.stdout.write('提示：你可以进入 dist 目录运行 "python -m http.server" 来预览。')
+
+    def export_search(self, factory, output_dir, shards):
+        self.stdout.write("正在生成搜索索引...")
+        articles = (Article.objects.filter(is_public=True).order_by('-views')
+                    .only('id', 'title', 'summary', 'plain_text').prefetch_related('tags'))
+        docs, shard_list = build_index(articles.iterator(chunk_size=500), lambda art: art.get_absolute_url(),
+                                       shards=max(shards, 1))
+        write_index(output_dir, docs, shard_list)
+
+        # /search/?q=xxx 在静态服务器上对应 search/index.html
+        request = factory.get('/search/')
+        from knowledge.views import get_common_context
+        context = dict(get_common_context(), index_url='/search/')
+        html = render_to_string('knowledge/static_search.html', context, request=request)
+        with open(os.path.join(output_dir, 'search', 'index.html'), 'w', encoding='utf-8') as f:
+            f.write(html)
+        self.stdout.write(f"搜索索引: {len(docs)} 篇文档, {len(shard_list)} 个分片")
+
+    def compress_output(self, output_dir):
+        """为 HTML / CSS / JS / 索引文件生成 .gz / .br，媒体文件不处理"""
+        self.stdout.write("正在生成预压缩文件...")
+        media_dir = os.path.join(output_dir, 'media')
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(output_dir):
+            if dirpath == media_dir or dirpath.startswith(media_dir + os.sep):
+                continue
+            paths.extend(os.path.join(dirpath, name) for name in filenames
+                         if name.endswith(('.html', '.css', '.js', '.json', '.svg')))
+        # zlib / brotli 压缩时会释放 GIL，用线程池即可并行
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            written = sum(len(files) for files in pool.map(write_compressed_variants, paths))
+        self.stdout.write(f"预压缩: {len(paths)} 个文件, 生成 {written} 个压缩版本")
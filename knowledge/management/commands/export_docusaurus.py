@@ -1,11 +1,11 @@
 from django.core.management.base import BaseCommand
-from django.conf import settings
 from django.utils.text import slugify
 from knowledge.models import Article, Category
 import os
 import shutil
 import json
 import re
+from knowledge.metrics import track_command
 
 
 class Command(BaseCommand):
@@ -14,6 +14,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--output', type=str, default='docusaurus_export', help='导出目录')
 
+    @track_command
     def handle(self, *args, **options):
         base_dir = options['output']
         docs_dir = os.path.join(base_dir, 'docs')
@@ -28,15 +29,10 @@ class Command(BaseCommand):
         os.makedirs(static_media_dir)
 
         # 2. 复制 Media (图片/附件)
-        if os.path.exists(settings.MEDIA_ROOT):
-            self.stdout.write("正在搬运静态资源 (Media)...")
-            for item in os.listdir(settings.MEDIA_ROOT):
-                s = os.path.join(settings.MEDIA_ROOT, item)
-                d = os.path.join(static_media_dir, item)
-                if os.path.isdir(s):
-                    shutil.copytree(s, d, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(s, d)
+        # 通过 Storage API 读取，媒体文件在对象存储中时同样适用
+        self.stdout.write("正在搬运静态资源 (Media)...")
+        from knowledge.archive import copy_storage_files
+        copy_storage_files(static_media_dir)
 
         # 3. 递归导出分类和文章
         self.stdout.write("开始导出文档结构...")
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import time
+from knowledge import attachment_text, extraction
+from knowledge.cache import bump_content_version
+from knowledge.models import Attachment
+from knowledge.metrics import track_command
+
+# 每个子进程最多排队的任务数：非本地存储的文件读出后才提交，在途任务的内容都在内存中
+IN_FLIGHT_PER_WORKER = 2
+
+
+class Command(BaseCommand):
+    help = '批量提取附件正文 (多进程并行)，默认只处理待提取和提取失败的附件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='重新提取全部附件')
+        parser.add_argument('--workers', type=int, default=None, help='子进程数，默认 ATTACHMENT_EXTRACT_WORKERS')
+        parser.add_argument('--batch-size', type=int, default=200, help='每批查询的附件数')
+
+    @track_command
+    def handle(self, *args, **options):
+        queryset = Attachment.objects.only('pk', 'file').order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(extraction_status__in=('pending', 'failed'))
+        ids = list(queryset.values_list('pk', flat=True))
+        self.stdout.write(f'待处理附件 {len(ids)} 个')
+        if not ids:
+            return
+
+        self.workers = options['workers'] or attachment_text.option('ATTACHMENT_EXTRACT_WORKERS', 2)
+        limit = self.workers * IN_FLIGHT_PER_WORKER
+        counts = {}
+        pending = {}
+        start = time.perf_counter()
+        self.pool = attachment_text.create_pool(self.workers)
+        try:
+            for offset in range(0, len(ids), options['batch_size']):
+                batch = queryset.filter(pk__in=ids[offset:offset + options['batch_size']])
+                for attachment in batch:
+                    while len(pending) >= limit:
+                        self.collect(pending, counts)
+                    result = attachment_text.submit(self.pool, attachment)
+                    if isinstance(result, tuple):
+                        self.store(attachment.pk, result, counts)
+                    else:
+                        pending[result] = attachment.pk
+                self.stdout.write(f'  已提交 {min(offset + options["batch_size"], len(ids))}/{len(ids)}')
+            while pending:
+                self.collect(pending, counts)
+        finally:
+            self.pool.shutdown()
+
+        if counts.get(extraction.DONE):
+            bump_content_version()
+        summary = '，'.join(f'{status} {count}' for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(f'完成 ({summary})，耗时 {time.perf_counter() - start:.1f} 秒'))
+
+    def collect(self, pending, counts):
+        """等待至少一个任务完成；超时或子进程异常退出时在途任务记为失败 (下次运行时重试)，换新的进程池"""
+        timeout = attachment_text.wait_timeout()
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # 子进程没有按时自行中断，结束整个进程池
+            self.recycle(pending, attachment_text.timeout_result(timeout), counts)
+            return
+        for future in done:
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # 子进程异常退出后同一进程池中的任务都会失败
+                self.recycle(pending, (extraction.FAILED, '提取进程异常退出'), counts)
+                return
+            self.store(pending.pop(future), result, counts)
+
+    def recycle(self, pending, result, counts):
+        for attachment_id in pending.values():
+            self.store(attachment_id, result, counts)
+        pending.clear()
+        attachment_text.terminate_pool(self.pool)
+        self.pool = attachment_text.create_pool(self.workers)
+
+    def store(self, attachment_id, result, counts):
+        attachment_text.store_result(attachment_id, result)
+        counts[result[0]] = counts.get(result[0], 0) + 1
@@ -0,0 +1,219 @@
+from django.core.management.base import BaseCommand
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.text import slugify
+from taggit.models import Tag, TaggedItem
+from knowledge.cache import bump_content_version
+from knowledge.content_storage import compress as compress_content
+from knowledge.models import Article, ArchiveMonth, Category, Comment, Attachment
+from io import BytesIO
+import random
+import uuid
+
+WORDS_ZH = ('存储 芯片 封装 测试 良率 时序 功耗 接口 协议 带宽 延迟 缓存 控制器 固件 驱动 '
+            '电压 温度 可靠性 寿命 校准 信号 完整性 布局 布线 仿真 验证 量产 客户 方案 规格').split()
+WORDS_EN = ('PSRAM DRAM SoC SPI QSPI DDR latency bandwidth refresh burst timing controller '
+            'firmware driver voltage thermal package yield signal layout').split()
+LANGUAGES = ('python', 'c', 'bash', 'javascript')
+
+
+class Command(BaseCommand):
+    help = '生成用于压测/基准测试的合成数据 (分类、文章、图片、标签、评论、附件)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=30, help='分类数量')
+        parser.add_argument('--depth', type=int, default=3, help='分类树最大深度')
+        parser.add_argument('--articles', type=int, default=1000, help='文章数量')
+        parser.add_argument('--tags', type=int, default=50, help='标签数量')
+        parser.add_argument('--tags-per-article', type=int, default=3, help='每篇文章的标签数')
+        parser.add_argument('--comments', type=int, default=3, help='每篇文章的平均评论数')
+        parser.add_argument('--attachments', type=int, default=1, help='每篇文章的平均附件数')
+        parser.add_argument('--images', type=int, default=20, help='生成的图片数量 (文章中随机引用)')
+        parser.add_argument('--paragraphs', type=int, default=12, help='每篇文章的平均段落数')
+        parser.add_argument('--batch-size', type=int, default=500, help='bulk_create 每批数量')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子，保证多次生成结果一致')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.run_id = uuid.uuid4().hex[:8]
+
+        with transaction.atomic():
+            categories = self.create_categories(options['categories'], max(options['depth'], 1))
+            images = self.create_images(options['images'])
+            articles = self.create_articles(options['articles'], categories, images, options['paragraphs'])
+            self.create_tags(articles, options['tags'], options['tags_per_article'])
+            self.create_comments(articles, options['comments'])
+            self.create_attachments(articles, options['attachments'])
+
+        # bulk_create 不触发信号，手动让依赖内容的缓存失效、重建月份归档
+        ArchiveMonth.rebuild()
+        bump_content_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'生成完成: {len(categories)} 个分类, {len(articles)} 篇文章, {len(images)} 张图片'))
+
+    # --- 分类 ---
+    def create_categories(self, count, depth):
+        """按层批量插入分类，最后统一 rebuild MPTT 树结构"""
+        levels = [[] for _ in range(depth)]
+        for i in range(count):
+            levels[min(i * depth // max(count, 1), depth - 1)].append(i)
+
+        created = []
+        parents = []
+        for level, indexes in enumerate(levels):
+            nodes = [
+                Category(
+                    name=f'分类 {self.run_id}-{i}',
+                    parent=self.rng.choice(parents) if parents else None,
+                    order=i,
+                    # MPTT 字段先占位，插入完成后统一 rebuild
+                    lft=0, rght=0, tree_id=0, level=level,
+                )
+                for i in indexes
+            ]
+            nodes = Category.objects.bulk_create(nodes, batch_size=self.batch_size)
+            created.extend(nodes)
+            parents = nodes or parents
+        Category.objects.rebuild()
+        self.stdout.write(f'已创建 {len(created)} 个分类')
+        return created
+
+    # --- 图片 ---
+    def create_images(self, count):
+        from PIL import Image, ImageDraw
+
+        urls = []
+        for i in range(count):
+            width, height = self.rng.choice([(1280, 720), (800, 600), (1920, 1080), (640, 480)])
+            img = Image.new('RGB', (width, height), self.random_color())
+            draw = ImageDraw.Draw(img)
+            for _ in range(12):
+                x0, y0 = self.rng.randrange(width), self.rng.randrange(height)
+                box = (x0, y0, x0 + self.rng.randrange(40, 400), y0 + self.rng.randrange(40, 300))
+                draw.rectangle(box, fill=self.random_color())
+            output = BytesIO()
+            fmt = 'PNG' if i % 3 == 0 else 'JPEG'
+            img.save(output, format=fmt)
+            ext = 'png' if fmt == 'PNG' else 'jpg'
+            path = default_storage.save(f'attachments/corpus/{self.run_id}-{i}.{ext}', ContentFile(output.getvalue()))
+            urls.append(default_storage.url(path))
+        self.stdout.write(f'已生成 {len(urls)} 张图片')
+        return urls
+
+    def random_color(self):
+        return tuple(self.rng.randrange(256) for _ in range(3))
+
+    # --- 文章 ---
+    def sentence(self, words=20):
+        parts = []
+        for _ in range(words):
+            parts.append(self.rng.choice(WORDS_EN) + ' ' if self.rng.random() < 0.25 else self.rng.choice(WORDS_ZH))
+        return ''.join(parts).strip() + '。'
+
+    def build_content(self, images, paragraphs):
+        """生成接近 CKEditor 5 输出的 HTML (标题、段落、列表、表格、代码块、图片)"""
+        blocks = []
+        for i in range(max(1, int(self.rng.gauss(paragraphs, paragraphs / 3)))):
+            kind = self.rng.random()
+            if i % 5 == 0:
+                level = self.rng.choice([2, 3])
+                blocks.append(f'<h{level}>{self.sentence(4)[:-1]}</h{level}>')
+            if kind < 0.5:
+                blocks.append(f'<p><span style="color:hsl(0,0%,20%);">{self.sentence(40)}</span>'
+                              f'<strong>{self.sentence(6)}</strong>{self.sentence(30)}</p>')
+            elif kind < 0.65 and images:
+                blocks.append(f'<figure class="image image-style-align-center">'
+                              f'<img src="{self.rng.choice(images)}" alt="{self.sentence(3)[:-1]}"></figure>')
+            elif kind < 0.8:
+                items = ''.join(f'<li>{self.sentence(8)}</li>' for _ in range(self.rng.randint(3, 7)))
+                blocks.append(f'<ul>{items}</ul>')
+            elif kind < 0.9:
+                rows = ''.join(
+                    '<tr>' + ''.join(f'<td style="border:1px solid hsl(0,0%,60%);">{self.sentence(3)}</td>'
+                                     for _ in range(4)) + '</tr>'
+                    for _ in range(self.rng.randint(3, 10)))
+                blocks.append(f'<figure class="table"><table><tbody>{rows}</tbody></table></figure>')
+            else:
+                lang = self.rng.choice(LANGUAGES)
+                code = '\n'.join(f'value_{n} = read_register(0x{n:04x})' for n in range(self.rng.randint(5, 20)))
+                blocks.append(f'<pre><code class="language-{lang}">{code}</code></pre>')
+        return ''.join(blocks)
+
+    def create_articles(self, count, categories, images, paragraphs):
+        articles = []
+        for i in range(count):
+            article = Article(
+                category=self.rng.choice(categories),
+                title=f'{self.sentence(5)[:-1]} {self.run_id}-{i}',
+                summary=self.sentence(30) if self.rng.random() < 0.3 else '',
+                content=self.build_content(images, paragraphs),
+                views=int(self.rng.paretovariate(1.2) * 10),
+                is_public=self.rng.random() < 0.95,
+                cover_style='none',
+            )
+            # bulk_create 不会调用 save()，需手动生成派生字段和压缩正文 (ARTICLE_CONTENT_COMPRESSION)
+            article.refresh_derived_fields()
+            article.content_compressed = compress_content(article.content)
+            articles.append(article)
+        articles = Article.objects.bulk_create(articles, batch_size=self.batch_size)
+        self.stdout.write(f'已创建 {len(articles)} 篇文章')
+        return articles
+
+    # --- 标签 ---
+    def create_tags(self, articles, count, per_article):
+        if not count or not per_article:
+            return
+        names = [f'{self.rng.choice(WORDS_ZH)}-{self.run_id}-{i}' for i in range(count)]
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slugify(name, allow_unicode=True)) for name in names],
+            batch_size=self.batch_size, ignore_conflicts=True)
+        tags = list(Tag.objects.filter(name__in=names))
+
+        content_type = ContentType.objects.get_for_model(Article)
+        items = []
+        for article in articles:
+            for tag in self.rng.sample(tags, min(per_article, len(tags))):
+                items.append(TaggedItem(content_type=content_type, object_id=article.pk, tag=tag))
+        TaggedItem.objects.bulk_create(items, batch_size=self.batch_size)
+        self.stdout.write(f'已创建 {len(tags)} 个标签, {len(items)} 个标签关联')
+
+    # --- 评论 ---
+    def create_comments(self, articles, average):
+        comments = []
+        for article in articles:
+            for _ in range(self.rng.randint(0, average * 2)):
+                comments.append(Comment(
+                    article=article,
+                    name=f'用户{self.rng.randrange(10000)}',
+                    email=f'user{self.rng.randrange(10000)}@example.com',
+                    content=self.sentence(25),
+                    ip_address=f'10.0.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}',
+                    is_public=self.rng.random() < 0.9,
+                ))
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+        self.stdout.write(f'已创建 {len(comments)} 条评论')
+
+    # --- 附件 ---
+    def create_attachments(self, articles, average):
+        if not average:
+            return
+        # 附件文件内容复用少量样本，避免生成过多磁盘文件
+        samples = []
+        for i in range(min(10, len(articles))):
+            body = '\n'.join(self.sentence(30) for _ in range(self.rng.randint(20, 200)))
+            path = default_storage.save(f'attachments/corpus/{self.run_id}-doc-{i}.txt',
+                                        ContentFile(body.encode('utf-8')))
+            samples.append(path)
+        if not samples:
+            return
+
+        attachments = []
+        for article in articles:
+            for _ in range(self.rng.randint(0, average * 2)):
+                path = self.rng.choice(samples)
+                attachments.append(Attachment(article=article, file=path, name=f'{self.sentence(3)[:-1]}.txt'))
+        Attachment.objects.bulk_create(attachments, batch_size=self.batch_size)
+        self.stdout.write(f'已创建 {len(attachments)} 个附件')
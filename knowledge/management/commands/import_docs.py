@@ -0,0 +1,387 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.text import slugify
+from django.utils.timezone import now
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from taggit.models import Tag, TaggedItem
+from urllib.parse import unquote, urlsplit
+from knowledge.cache import bump_content_version
+from knowledge.content_storage import compress as compress_content
+from knowledge.imaging import watermark_file
+from knowledge.models import Article, ArchiveMonth, Category, MediaFile, upload_to_uuid
+import html
+import json
+import os
+import re
+import uuid
+from knowledge.metrics import track_command
+
+try:
+    import yaml  # 可选依赖：pip install pyyaml，未安装时使用简单的 key: value 解析
+except ImportError:
+    yaml = None
+
+DOC_EXTENSIONS = ('.md', '.markdown', '.mdx', '.html', '.htm')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+MARKDOWN_EXTENSIONS = ['markdown.extensions.extra', 'markdown.extensions.sane_lists']
+
+_FRONT_MATTER = re.compile(r'\A---\s*\n(.*?)\n---\s*(?:\n|\Z)', re.S)
+# export_docusaurus 生成的 <RawHtml>{`...`}</RawHtml> 包裹
+_RAW_HTML = re.compile(r'<RawHtml>\{\s*`((?:\\.|[^`\\])*)`\s*\}</RawHtml>', re.S)
+_MDX_STATEMENT = re.compile(r'^(?:import|export)\s.*$', re.M)
+_IMG_SRC = re.compile(r'(<img\b[^>]*?\bsrc=)(["\'])(.*?)\2', re.I | re.S)
+_LEADING_H1 = re.compile(r'\A\s*<h1[^>]*>(.*?)</h1>\s*', re.I | re.S)
+_HTML_BODY = re.compile(r'<body[^>]*>(.*)</body>', re.I | re.S)
+_HTML_TITLE = re.compile(r'<title[^>]*>(.*?)</title>', re.I | re.S)
+
+
+def parse_front_matter(text):
+    """拆分 front matter 与正文，返回 (meta, body)"""
+    match = _FRONT_MATTER.match(text)
+    if not match:
+        return {}, text
+    raw, body = match.group(1), text[match.end():]
+    if yaml is not None:
+        try:
+            meta = yaml.safe_load(raw)
+            if isinstance(meta, dict):
+                return meta, body
+        except yaml.YAMLError:
+            pass  # export_docusaurus 写出的标题未加引号，可能不是合法 YAML，退回简单解析
+    return parse_simple_front_matter(raw), body
+
+
+def parse_simple_front_matter(raw):
+    """支持 key: value、key: [a, b] 和 "- item" 形式的列表"""
+    meta, current = {}, None
+    for line in raw.splitlines():
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if line.lstrip().startswith('- ') and current is not None:
+            meta.setdefault(current, [])
+            if isinstance(meta[current], list):
+                meta[current].append(_scalar(line.lstrip()[2:]))
+            continue
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        current, value = key.strip(), value.strip()
+        if value.startswith('['):
+            try:
+                meta[current] = json.loads(value)
+            except ValueError:
+                meta[current] = [_scalar(v) for v in value.strip('[]').split(',') if v.strip()]
+        else:
+            meta[current] = _scalar(value) if value else []
+    return meta
+
+
+def _scalar(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    return value
+
+
+def as_list(value, separators=r'[,，]'):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in re.split(separators, value) if v.strip()]
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+class Command(BaseCommand):
+    help = '从 Markdown/HTML 目录或 Docusaurus 目录批量导入文章 (export_docusaurus 的逆操作)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', type=str, help='文档目录 (或 export_docusaurus 的导出目录)')
+        parser.add_argument('--category', type=str, default='导入文档', help='没有分类信息的文档归入此根分类')
+        parser.add_argument('--static-dir', type=str, help='以 / 开头的图片地址在此目录中查找，默认 <source>/static')
+        parser.add_argument('--batch-size', type=int, default=200, help='bulk_create 每批数量')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='处理图片的进程数，0 表示在当前进程中处理')
+        parser.add_argument('--private', action='store_true', help='导入为不公开文章')
+        parser.add_argument('--dry-run', action='store_true', help='只解析并输出统计，不写入数据库和存储')
+
+    @track_command
+    def handle(self, *args, **options):
+        source = os.path.abspath(options['source'])
+        if not os.path.isdir(source):
+            raise CommandError(f'目录不存在: {source}')
+
+        # Docusaurus 导出目录: docs/ 下是文档，static/ 下是图片等资源
+        docs_root = os.path.join(source, 'docs') if os.path.isdir(os.path.join(source, 'docs')) else source
+        self.static_dir = options['static_dir'] or os.path.join(source, 'static')
+        self.source = source
+        self.default_category = options['category']
+        self.is_public = not options['private']
+        self.batch_size = options['batch_size']
+
+        docs, category_orders = self.collect_documents(docs_root)
+        if not docs:
+            self.stdout.write(self.style.WARNING('没有找到可导入的文档'))
+            return
+        images = {ref for doc in docs for ref in doc['images'].values()}
+        images |= {(doc['cover'], 'cover') for doc in docs if doc['cover']}
+        self.stdout.write(f'解析完成: {len(docs)} 篇文档, {len(images)} 张本地图片')
+        if options['dry_run']:
+            return
+
+        categories = self.ensure_categories({doc['category'] for doc in docs}, category_orders)
+        # 先去掉已导入的文档，只为要新建的文章处理图片，重复导入时不会再存一份无人引用的图片
+        docs = self.new_documents(docs, categories)
+        images = {ref for doc in docs for ref in doc['images'].values()}
+        images |= {(doc['cover'], 'cover') for doc in docs if doc['cover']}
+        processed = self.ingest_images(images, options['workers'])
+        created = self.create_articles(docs, categories, processed)
+
+        # bulk_create 不触发信号，手动让依赖内容的缓存失效、重建月份归档
+        ArchiveMonth.rebuild()
+        bump_content_version()
+        self.stdout.write(self.style.SUCCESS(f'导入完成: 新增 {created} 篇文章'))
+
+    # --- 解析 ---
+    def collect_documents(self, docs_root):
+        """遍历目录，返回 (文档列表, {分类路径: 排序})；目录名 / _category_.json 的 label 作为分类"""
+        docs, category_orders, dir_paths = [], {}, {docs_root: ()}
+        for dirpath, dirnames, filenames in os.walk(docs_root):
+            dirnames.sort()
+            path = dir_paths[dirpath]
+            for name in dirnames:
+                child = os.path.join(dirpath, name)
+                label, order = self.read_category_meta(child, name)
+                dir_paths[child] = path + (label,)
+                if order is not None:
+                    category_orders[dir_paths[child]] = order
+
+            for filename in sorted(filenames):
+                if filename.startswith('_') or not filename.lower().endswith(DOC_EXTENSIONS):
+                    continue
+                try:
+                    docs.append(self.parse_document(os.path.join(dirpath, filename), path))
+                except (OSError, UnicodeDecodeError) as e:
+                    self.stderr.write(f'跳过 {filename}: {e}')
+        return docs, category_orders
+
+    def read_category_meta(self, directory, default_label):
+        try:
+            with open(os.path.join(directory, '_category_.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return default_label, None
+        order = meta.get('position')
+        return meta.get('label') or default_label, int(order) if isinstance(order, (int, float)) else None
+
+    def parse_document(self, filepath, dir_category):
+        with open(filepath, encoding='utf-8-sig') as f:
+            text = f.read()
+        meta, body = parse_front_matter(text)
+        is_html = filepath.lower().endswith(('.html', '.htm'))
+
+        title = meta.get('title') or meta.get('sidebar_label')
+        raw_html = _RAW_HTML.search(body)
+        if raw_html:
+            content = raw_html.group(1).replace('\\`', '`').replace('\\${', '${')
+        elif is_html:
+            if not title and _HTML_TITLE.search(body):
+                title = html.unescape(_HTML_TITLE.search(body).group(1)).strip()
+            body_match = _HTML_BODY.search(body)
+            content = body_match.group(1) if body_match else body
+        else:
+            import markdown
+            content = markdown.markdown(_MDX_STATEMENT.sub('', body), extensions=MARKDOWN_EXTENSIONS)
+
+        # 开头的 h1 作为标题，避免详情页标题重复
+        heading = _LEADING_H1.match(content)
+        if heading:
+            heading_text = html.unescape(re.sub(r'<[^>]+>', '', heading.group(1))).strip()
+            if not title or heading_text == str(title).strip():
+                title = title or heading_text
+                content = content[heading.end():]
+        title = str(title or os.path.splitext(os.path.basename(filepath))[0]).strip()[:200]
+
+        category = tuple(as_list(meta.get('category'), r'/')) or dir_category or (self.default_category,)
+        base_dir = os.path.dirname(filepath)
+        images = {}
+        for _, _, src in _IMG_SRC.findall(content):
+            local = self.resolve_local_image(html.unescape(src), base_dir)
+            if local:
+                images[src] = (local, 'content')
+        cover = meta.get('cover') or meta.get('image')
+
+        is_public = self.is_public and not meta.get('draft', False)
+        if 'is_public' in meta:
+            is_public = bool(meta['is_public'])
+        return {
+            'path': filepath,
+            'title': title,
+            'category': category,
+            'tags': [name[:100] for name in as_list(meta.get('tags'))][:20],
+            'summary': str(meta.get('summary') or meta.get('description') or ''),
+            'is_public': is_public,
+            'content': content.strip(),
+            'images': images,
+            'cover': self.resolve_local_image(str(cover), base_dir) if cover else None,
+        }
+
+    def resolve_local_image(self, src, base_dir):
+        """把图片地址解析为本地文件路径，远程地址或找不到的文件返回 None"""
+        parts = urlsplit(src)
+        if parts.scheme or parts.netloc or not parts.path.lower().endswith(IMAGE_EXTENSIONS):
+            return None
+        path = unquote(parts.path)
+        if path.startswith('/'):
+            candidates = [os.path.join(self.static_dir, path.lstrip('/')), os.path.join(self.source, path.lstrip('/'))]
+        else:
+            candidates = [os.path.join(base_dir, path)]
+        for candidate in candidates:
+            candidate = os.path.normpath(candidate)
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    # --- 分类 ---
+    def ensure_categories(self, paths, orders):
+        """按路径查找或创建分类，返回 {分类路径: Category}"""
+        existing = {(c.parent_id, c.name): c for c in Category.objects.all()}
+        max_length = Category._meta.get_field('name').max_length
+        result, created = {}, 0
+        with transaction.atomic(), Category.objects.delay_mptt_updates():
+            for path in sorted(paths, key=len):
+                parent = None
+                for depth in range(1, len(path) + 1):
+                    prefix = path[:depth]
+                    if prefix not in result:
+                        # 按截断后的名称查找，与保存的名称一致，重复导入时不会新建同名分类
+                        name = prefix[-1][:max_length]
+                        key = (parent.pk if parent else None, name)
+                        if key not in existing:
+                            node = Category(name=name, parent=parent, order=orders.get(prefix, 0))
+                            node.save()
+                            existing[key] = node
+                            created += 1
+                        result[prefix] = existing[key]
+                    parent = result[prefix]
+        # 退出 delay_mptt_updates 时统一重建受影响的树，不必每插入一个节点就移动 lft/rght
+        self.stdout.write(f'分类: 新建 {created} 个')
+        return result
+
+    # --- 图片 ---
+    def ingest_images(self, images, workers):
+        """并行加水印后写入存储，返回 {(本地路径, 类型): (存储路径, 地址)}"""
+        processed = {}
+        if not images:
+            return processed
+
+        def store(key, result):
+            data, ext, width, height = result
+            local, kind = key
+            if kind == 'cover':
+                name = upload_to_uuid(None, f'cover.{ext}')
+            else:
+                name = os.path.join('attachments', now().strftime('%Y/%m'), f'{uuid.uuid4().hex}.{ext}')
+            saved = default_storage.save(name, ContentFile(data))
+            if kind == 'content':
+                MediaFile.record(saved, width, height, size=len(data))
+            processed[key] = (saved, default_storage.url(saved))
+
+        failed = 0
+        if workers <= 0:
+            for key in images:
+                try:
+                    store(key, watermark_file(*key))
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'图片处理失败 {key[0]}: {e}')
+        else:
+            # 水印是 CPU 密集操作，放到子进程；写存储和数据库留在主进程
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(watermark_file, *key): key for key in images}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        store(key, future.result())
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'图片处理失败 {key[0]}: {e}')
+        self.stdout.write(f'图片: 处理 {len(processed)} 张, 失败 {failed} 张')
+        return processed
+
+    # --- 文章 ---
+    def new_documents(self, docs, categories):
+        """去掉同一分类下已存在同名文章的文档 (包括本次导入中重复的)"""
+        existing = set(Article.objects.values_list('category_id', 'title'))
+        result = []
+        for doc in docs:
+            key = (categories[doc['category']].pk, doc['title'])
+            if key not in existing:
+                existing.add(key)
+                result.append(doc)
+        if len(result) < len(docs):
+            self.stdout.write(f'跳过 {len(docs) - len(result)} 篇 (同一分类下已存在同名文章)')
+        return result
+
+    def create_articles(self, docs, categories, processed):
+        content_type = ContentType.objects.get_for_model(Article)
+        tags = self.ensure_tags({name for doc in docs for name in doc['tags']})
+
+        created = 0
+        for start in range(0, len(docs), self.batch_size):
+            chunk, chunk_tags = [], []
+            for doc in docs[start:start + self.batch_size]:
+                category = categories[doc['category']]
+                article = Article(
+                    category=category,
+                    title=doc['title'],
+                    summary=doc['summary'],
+                    content=self.rewrite_images(doc, processed),
+                    is_public=doc['is_public'],
+                    cover_style='show' if doc['cover'] else 'none',
+                )
+                cover = processed.get((doc['cover'], 'cover'))
+                if cover:
+                    article.cover = cover[0]
+                # bulk_create 不会调用 save()，需手动生成派生字段和压缩正文 (ARTICLE_CONTENT_COMPRESSION)
+                article.refresh_derived_fields()
+                article.content_compressed = compress_content(article.content)
+                chunk.append(article)
+                chunk_tags.append(doc['tags'])
+
+            with transaction.atomic():
+                chunk = Article.objects.bulk_create(chunk)
+                TaggedItem.objects.bulk_create([
+                    TaggedItem(content_type=content_type, object_id=article.pk, tag=tags[name])
+                    for article, names in zip(chunk, chunk_tags) for name in dict.fromkeys(names)
+                ])
+            created += len(chunk)
+            self.stdout.write(f'  - 已导入 {created} 篇')
+        return created
+
+    def rewrite_images(self, doc, processed):
+        def replace(match):
+            ref = doc['images'].get(match.group(3))
+            stored = processed.get(ref) if ref else None
+            if not stored:
+                return match.group(0)
+            return f'{match.group(1)}{match.group(2)}{stored[1]}{match.group(2)}'
+        return _IMG_SRC.sub(replace, doc['content'])
+
+    def ensure_tags(self, names):
+        """批量创建缺少的标签，返回 {名称: Tag}"""
+        tags = {t.name: t for t in Tag.objects.filter(name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            Tag.objects.bulk_create([Tag(name=name, slug=slugify(name, allow_unicode=True)) for name in missing],
+                                    ignore_conflicts=True)
+            tags.update({t.name: t for t in Tag.objects.filter(name__in=missing)})
+            # slug 冲突的标签逐个创建，由 taggit 生成不重复的 slug
+            for name in missing:
+                if name not in tags:
+                    tags[name] = Tag.objects.create(name=name)
+        return tags
@@ -0,0 +1,118 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+from knowledge import media_optimizer
+from knowledge.imaging import optimize_image
+from knowledge.metrics import track_command
+
+
+def format_size(size):
+    return f'{size / 1024 / 1024:.2f} MB'
+
+
+class Command(BaseCommand):
+    help = ('重新压缩编辑器上传的图片 (去除元数据、渐进式 JPEG、截图量化、照片类 PNG 转 JPEG)，'
+            '替换文章中的引用；已处理的文件再次运行时跳过')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='并行处理的子进程数，0 表示在当前进程处理')
+        parser.add_argument('--batch-size', type=int, default=50, help='每批读入内存的图片数')
+        parser.add_argument('--limit', type=int, default=0, help='最多处理的图片数')
+        parser.add_argument('--dry-run', action='store_true', help='只计算可节省的空间，不写入')
+        parser.add_argument('--keep-originals', action='store_true',
+                            help='保留原文件 (之后可用 cleanup_media 删除不再引用的文件)')
+
+    @track_command
+    def handle(self, *args, **options):
+        self.options = options
+        self.counts = {}
+        files = media_optimizer.pending_files()
+        if options['limit']:
+            files = files[:options['limit']]
+        self.stdout.write(f'待处理图片 {len(files)} 张')
+        if not files:
+            self.report(0, 0)
+            return
+
+        saved = 0
+        start = time.perf_counter()
+        pool = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 0 else None
+        try:
+            for offset in range(0, len(files), options['batch_size']):
+                batch = files[offset:offset + options['batch_size']]
+                saved += self.process_batch(batch, pool)
+                self.stdout.write(f'  已处理 {offset + len(batch)}/{len(files)}，节省 {format_size(saved)}')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.report(saved, time.perf_counter() - start)
+
+    def process_batch(self, batch, pool):
+        # 读存储和写数据库留在主进程，编码 (CPU 密集) 交给子进程
+        sources = {}
+        for media in batch:
+            try:
+                with default_storage.open(media.path, 'rb') as f:
+                    sources[media.pk] = (media, f.read())
+            except OSError as e:
+                self.count('missing')
+                self.stderr.write(f'读取失败 {media.path}: {e}')
+        optimize_options = media_optimizer.optimize_options()
+        if pool is None:
+            results = ((pk, self.call(optimize_image, data, **optimize_options)) for pk, (_, data) in sources.items())
+        else:
+            futures = {pool.submit(optimize_image, data, **optimize_options): pk for pk, (_, data) in sources.items()}
+            results = ((futures[future], self.call(future.result)) for future in as_completed(futures))
+
+        saved = 0
+        for pk, result in results:
+            media, data = sources[pk]
+            saved += self.store(media, data, result)
+        return saved
+
+    def call(self, func, *args, **kwargs):
+        """返回结果，出错时返回异常对象"""
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            return e
+
+    def store(self, media, original, result):
+        if isinstance(result, Exception):
+            # 无法解码的文件也记为已处理，避免每次重试
+            self.count('failed')
+            self.stderr.write(f'处理失败 {media.path}: {result}')
+            if not self.options['dry_run']:
+                media_optimizer.mark_unchanged(media, len(original), str(result)[:200])
+            return 0
+        data, ext, width, height, note = result
+        if data is None:
+            self.count('unchanged')
+            if not self.options['dry_run']:
+                media_optimizer.mark_unchanged(media, len(original), note)
+            return 0
+        if self.options['dry_run']:
+            self.count('optimized')
+            return len(original) - len(data)
+        try:
+            saved = media_optimizer.apply_result(media, len(original), data, ext, width, height,
+                                                 keep_original=self.options['keep_originals'])
+        except Exception as e:
+            # 事务已回滚、新文件已删除，原文件和引用保持不变，下次运行时重试
+            self.count('failed')
+            self.stderr.write(f'替换失败 {media.path}: {e}')
+            return 0
+        self.count('optimized')
+        return saved
+
+    def count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def report(self, saved, elapsed):
+        labels = {'optimized': '已压缩', 'unchanged': '保持不变', 'failed': '失败', 'missing': '文件缺失'}
+        if self.counts:
+            summary = '，'.join(f'{labels[name]} {count}' for name, count in self.counts.items())
+            prefix = '预计可节省' if self.options['dry_run'] else '本次节省'
+            self.stdout.write(self.style.SUCCESS(f'完成 ({summary})，{prefix} {format_size(saved)}，耗时 {elapsed:.1f} 秒'))
+        self.stdout.write(f'累计节省 {format_size(media_optimizer.total_saved())}')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db.models import Count
+from knowledge.models import ArticleRevision
+from knowledge import revisions
+from knowledge.metrics import track_command
+
+
+class Command(BaseCommand):
+    help = '清理旧的文章修订版本 (每篇保留最新 N 个)，并报告增量存储相比完整副本节省的空间'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=None, help='每篇文章保留的版本数，默认 REVISION_KEEP')
+        parser.add_argument('--article', type=int, help='只处理指定 ID 的文章')
+        parser.add_argument('--stats', action='store_true', help='只输出存储统计，不删除')
+
+    @track_command
+    def handle(self, *args, **options):
+        keep = options['keep'] if options['keep'] is not None else getattr(settings, 'REVISION_KEEP', 50)
+        if keep < 1:
+            raise CommandError('--keep 至少为 1')
+        queryset = ArticleRevision.objects.all()
+        if options['article']:
+            queryset = queryset.filter(article_id=options['article'])
+
+        self.report('清理前' if not options['stats'] else '当前', revisions.storage_stats(queryset))
+        if options['stats']:
+            return
+
+        article_ids = (queryset.values('article_id').annotate(total=Count('pk'))
+                       .filter(total__gt=keep).values_list('article_id', flat=True))
+        deleted = 0
+        for article_id in list(article_ids):
+            deleted += revisions.prune(article_id, keep)
+        self.stdout.write(self.style.SUCCESS(f'删除 {deleted} 个旧版本 (每篇保留最新 {keep} 个)'))
+        self.report('清理后', revisions.storage_stats(queryset))
+
+    def report(self, label, stats):
+        self.stdout.write(
+            f"{label}: {stats['revisions']} 个版本 (快照 {stats['snapshots']} 个)，"
+            f"完整副本 {stats['full'] / 1024:.1f} KB，实际存储 {stats['stored'] / 1024:.1f} KB，"
+            f"节省 {stats['saved_ratio']:.1%}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from knowledge.cache import bump_content_version
+from knowledge.models import Article
+from knowledge.metrics import track_command
+
+
+class Command(BaseCommand):
+    help = '重新生成文章的派生字段 (纯文本、渲染后内容、目录)，用于升级后回填历史数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批处理的文章数')
+
+    @track_command
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = list(Article.DERIVED_FIELDS)
+
+        batch = []
+        total = 0
+        for article in Article.objects.all().iterator(chunk_size=batch_size):
+            article.refresh_derived_fields()
+            batch.append(article)
+            if len(batch) >= batch_size:
+                Article.objects.bulk_update(batch, fields)
+                total += len(batch)
+                batch = []
+        if batch:
+            Article.objects.bulk_update(batch, fields)
+            total += len(batch)
+
+        # bulk_update 不触发信号，手动让搜索缓存失效
+        bump_content_version()
+        self.stdout.write(self.style.SUCCESS(f'已更新 {total} 篇文章'))
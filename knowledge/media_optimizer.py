@@ -0,0 +1,109 @@
+"""
+编辑器图片的压缩优化 (manage.py optimize_media，以及 MEDIA_OPTIMIZE_ON_UPLOAD 开启时的上传处理)
+
+- 图片编码在子进程中完成 (imaging.optimize_image，不依赖 Django)，这里负责读写存储和数据库
+- 优化结果保存为新文件名 (格式可能变化，如照片类 PNG 转 JPEG)，再在一个事务中替换文章、评论中的引用
+  和 MediaFile 记录；事务提交后才删除原文件，失败时删除新文件，页面始终引用存在的文件
+- MediaFile.optimized_at 记录处理过的文件 (包括无法变小的)，再次运行时跳过
+- 附件 (Attachment) 是供下载的原始文件，不做处理
+"""
+import logging
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils.timezone import now
+
+from . import metrics
+from .models import Article, Attachment, Comment, MediaFile
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+def encode_options():
+    """imaging.encode_candidates / encode_optimized 的参数"""
+    return {
+        'jpeg_quality': option('MEDIA_OPTIMIZE_JPEG_QUALITY', 85),
+        'quantize': option('MEDIA_OPTIMIZE_QUANTIZE', True),
+        'convert': option('MEDIA_OPTIMIZE_CONVERT', True),
+    }
+
+
+def optimize_options():
+    """imaging.optimize_image 的参数"""
+    return {**encode_options(), 'min_saving': option('MEDIA_OPTIMIZE_MIN_SAVING', 0.05)}
+
+
+def pending_files():
+    """待处理的图片记录 (未处理过、是图片、不是附件)"""
+    attachment_files = Attachment.objects.values('file')
+    queryset = MediaFile.objects.filter(optimized_at__isnull=True).exclude(path__in=attachment_files)
+    return [media for media in queryset.order_by('pk') if media.path.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def media_urls(path):
+    """正文中可能出现的引用地址"""
+    return {settings.MEDIA_URL + path, default_storage.url(path)}
+
+
+def mark_unchanged(media, original_size, note=''):
+    if note:
+        logger.info('媒体文件 %s 未优化: %s', media.path, note)
+    MediaFile.objects.filter(pk=media.pk).update(size=original_size, original_size=original_size, optimized_at=now())
+
+
+def replace_references(old_path, new_path):
+    """替换文章正文和评论中的图片地址，返回修改的文章数"""
+    old_urls = media_urls(old_path)
+    new_url = default_storage.url(new_path)
+    changed = 0
+    for url in old_urls:
+        # 逐篇 save()，同时重新生成派生字段 (rendered_content 中的图片地址)；
+        # 压缩存储的正文无法在数据库中匹配，改查渲染后的正文
+        matched = Q(content__contains=url) | Q(content_compressed__isnull=False, rendered_content__contains=url)
+        for article in Article.objects.filter(matched).only('pk', 'content', 'content_compressed'):
+            if url not in article.content:
+                continue
+            article.content = article.content.replace(url, new_url)
+            article.save(update_fields=['content'])
+            changed += 1
+        for comment in Comment.objects.filter(content__contains=url).only('pk', 'content'):
+            comment.content = comment.content.replace(url, new_url)
+            comment.save(update_fields=['content'])
+    return changed
+
+
+def apply_result(media, original_size, data, ext, width, height, keep_original=False):
+    """保存优化后的文件并切换引用 (文章保存时会递增内容版本号)，返回节省的字节数"""
+    name = posixpath.join(posixpath.dirname(media.path), f'{uuid.uuid4().hex}.{ext}')
+    new_path = default_storage.save(name, ContentFile(data))
+    try:
+        with transaction.atomic():
+            # 先改记录再改正文：文章保存时会按新地址查询图片尺寸
+            MediaFile.objects.filter(pk=media.pk).update(
+                path=new_path, width=width, height=height, size=len(data),
+                original_size=original_size, optimized_at=now())
+            replace_references(media.path, new_path)
+            if not keep_original:
+                transaction.on_commit(lambda: default_storage.delete(media.path))
+    except Exception:
+        default_storage.delete(new_path)
+        raise
+    metrics.media_bytes_saved.inc(original_size - len(data))
+    return original_size - len(data)
+
+
+def total_saved():
+    """所有已优化文件累计节省的字节数"""
+    return MediaFile.objects.filter(optimized_at__isnull=False, original_size__gt=F('size')).aggregate(
+        saved=Sum(F('original_size') - F('size')))['saved'] or 0
@@ -0,0 +1,460 @@
+"""
+应用内部指标，以 Prometheus 文本格式从 /metrics 导出
+
+- Counter / Histogram 在热路径上只写当前线程的分片 (threading.local 中的 dict)，不加锁；
+  导出时把所有线程的分片相加
+- Gauge 直接覆盖当前值，或注册为回调函数：scope='process' 的回调在每个进程写快照时计算
+  (如本进程未写回的计数)，scope='scrape' 的回调只在响应 /metrics 时计算一次 (如文章总数)
+- 多进程部署时每个进程每隔 METRICS_FLUSH_INTERVAL 秒把本进程的汇总写入 METRICS_DIR/<主机>-<pid>-<启动时间>.json，
+  /metrics 合并目录中的所有文件：计数器和直方图相加 (已退出进程的文件保留，总数不回退，
+  超过 METRICS_COMPACT_AFTER 秒未更新的文件合并进 archived.json)；仪表只合并仍在更新的进程
+- 管理命令 (track_command) 在退出时写一次快照，运行次数和耗时同样出现在 /metrics 中
+"""
+import atexit
+import bisect
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import request_started
+
+try:
+    import fcntl  # Windows 上没有，导出时不加文件锁
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ARCHIVE_FILE = 'archived.json'
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None, scope='process'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # function 返回数值 (无标签) 或 {标签值元组: 数值}
+        self.function = function
+        self.scope = scope
+        self.reset()
+        REGISTRY.register(self)
+
+    def reset(self):
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            # 每个线程只在第一次写入时加锁登记分片
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            REGISTRY.ensure_flusher()
+            return shard
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _call_function(self):
+        try:
+            result = self.function()
+        except Exception:
+            logger.exception('指标 %s 计算失败', self.name)
+            return {}
+        return result if isinstance(result, dict) else {(): result}
+
+    def meta(self):
+        return {'kind': self.kind, 'help': self.documentation, 'labels': list(self.labelnames)}
+
+    def collect(self):
+        """本进程的当前值 {标签值元组: 数值}"""
+        if self.function is not None:
+            return self._call_function()
+        with self._shards_lock:
+            shards = list(self._shards)
+        values = {}
+        for shard in shards:
+            for key, value in shard.copy().items():
+                values[key] = self.merge(values.get(key), value)
+        return values
+
+    def merge(self, a, b):
+        return b if a is None else a + b
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def reset(self):
+        super().reset()
+        self._values = {}
+
+    def set(self, value, **labels):
+        # 单次字典赋值在 GIL 下是原子的
+        self._values[self._key(labels)] = value
+        REGISTRY.ensure_flusher()
+
+    def collect(self):
+        if self.function is not None:
+            return self._call_function()
+        return self._values.copy()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # 各区间 (非累计) 的次数 + 溢出区间，最后两项为总和与次数
+            entry = shard[key] = [0] * (len(self.buckets) + 3)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, func):
+        """视图装饰器，同步和异步视图都适用"""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with self.time():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.time():
+                return func(*args, **kwargs)
+        return wrapper
+
+    def meta(self):
+        return {**super().meta(), 'buckets': list(self.buckets)}
+
+    def merge(self, a, b):
+        return list(b) if a is None else [x + y for x, y in zip(a, b)]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'指标 {metric.name} 重复定义')
+        self.metrics[metric.name] = metric
+
+    @property
+    def directory(self):
+        return option('METRICS_DIR', None)
+
+    def process_file(self):
+        return os.path.join(self.directory, f'{socket.gethostname()}-{os.getpid()}-{int(self.started)}.json')
+
+    # --- 快照 ---
+
+    def snapshot(self):
+        """本进程的指标快照 (scope='scrape' 的回调不计算)"""
+        metrics = {}
+        for name, metric in list(self.metrics.items()):
+            if metric.function is not None and metric.scope == 'scrape':
+                continue
+            samples = [[list(key), value] for key, value in metric.collect().items()]
+            if samples:
+                metrics[name] = {**metric.meta(), 'samples': samples}
+        return {'time': time.time(), 'metrics': metrics}
+
+    def write_snapshot(self):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_json(self.process_file(), self.snapshot())
+        except Exception:
+            logger.exception('写入指标快照失败')
+
+    def write_at_exit(self):
+        # 只有记录过指标的进程 (已启动写快照线程) 才需要写，避免 manage.py check 等命令也生成文件
+        if self._flusher is not None:
+            self.write_snapshot()
+
+    def ensure_flusher(self):
+        """第一次写入指标时启动后台线程，定期写快照 (未配置 METRICS_DIR 时不启动)"""
+        if self._flusher is not None or not self.directory:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(option('METRICS_FLUSH_INTERVAL', 10))
+            self.write_snapshot()
+
+    def after_fork(self):
+        """fork 出的子进程 (如 gunicorn preload) 从零开始，不重复计入父进程的数值"""
+        self.started = time.time()
+        self._flusher = None
+        self._lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric.reset()
+
+    # --- 合并导出 ---
+
+    def collect_all(self):
+        """合并所有进程的快照，返回 {名称: (meta, {标签值元组: 数值})}"""
+        if self.directory:
+            self.write_snapshot()
+            with self.directory_lock():
+                self.compact()
+                snapshots = [data for _, data in read_snapshots(self.directory)]
+        else:
+            snapshots = [self.snapshot()]
+
+        live_after = time.time() - 3 * option('METRICS_FLUSH_INTERVAL', 10)
+        merged = {}
+        for data in snapshots:
+            for name, entry in data['metrics'].items():
+                # 已退出 (不再更新) 的进程只保留计数器和直方图
+                if entry['kind'] == 'gauge' and data['time'] < live_after:
+                    continue
+                merge_samples(merged, name, entry)
+        for name, metric in list(self.metrics.items()):
+            if metric.function is not None and metric.scope == 'scrape':
+                merge_samples(merged, name, {**metric.meta(), 'samples': [
+                    [list(key), value] for key, value in metric.collect().items()]})
+        return merged
+
+    @contextmanager
+    def directory_lock(self):
+        """合并与读取期间互斥，避免同时导出时重复计入刚合并的文件"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def compact(self):
+        """把长时间未更新 (进程已退出) 的快照合并进 archived.json，避免文件越来越多"""
+        compact_before = time.time() - option('METRICS_COMPACT_AFTER', 3600)
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        stale = [(path, data) for path, data in read_snapshots(self.directory)
+                 if path != archive_path and data['time'] < compact_before]
+        if not stale:
+            return
+        archive = read_json(archive_path) or {'time': 0, 'metrics': {}}
+        merged = {}
+        for data in [archive] + [data for _, data in stale]:
+            for name, entry in data['metrics'].items():
+                if entry['kind'] != 'gauge':
+                    merge_samples(merged, name, entry)
+        write_json(archive_path, {'time': 0, 'metrics': {
+            name: {**meta, 'samples': [[list(key), value] for key, value in values.items()]}
+            for name, (meta, values) in merged.items()}})
+        for path, _ in stale:
+            os.remove(path)
+
+    def render(self):
+        """Prometheus 文本格式 (0.0.4)"""
+        lines = []
+        for name, (meta, values) in sorted(self.collect_all().items()):
+            lines.append(f'# HELP {name} {meta["help"]}')
+            lines.append(f'# TYPE {name} {meta["kind"]}')
+            labelnames = meta['labels']
+            for key, value in sorted(values.items()):
+                if meta['kind'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(list(meta['buckets']) + [math.inf], value[:-2]):
+                        cumulative += count
+                        le = '+Inf' if bound == math.inf else format_value(bound)
+                        lines.append(f'{name}_bucket{format_labels(labelnames, key, le=le)} {cumulative}')
+                    lines.append(f'{name}_sum{format_labels(labelnames, key)} {format_value(value[-2])}')
+                    lines.append(f'{name}_count{format_labels(labelnames, key)} {value[-1]}')
+                else:
+                    lines.append(f'{name}{format_labels(labelnames, key)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def merge_samples(merged, name, entry):
+    meta = {k: v for k, v in entry.items() if k != 'samples'}
+    _, values = merged.setdefault(name, (meta, {}))
+    for key, value in entry['samples']:
+        key = tuple(key)
+        current = values.get(key)
+        if entry['kind'] == 'histogram':
+            values[key] = list(value) if current is None else [x + y for x, y in zip(current, value)]
+        else:
+            values[key] = value if current is None else current + value
+
+
+def read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def read_snapshots(directory):
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.json'):
+            data = read_json(entry.path)
+            if data is not None:
+                yield entry.path, data
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labelnames, key, **extra):
+    pairs = list(zip(labelnames, key)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.write_at_exit)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=REGISTRY.after_fork)
+
+
+# Web 进程收到第一个请求时启动写快照线程，进程级仪表 (未写回的计数等) 随之导出
+request_started.connect(lambda **kwargs: REGISTRY.ensure_flusher(), weak=False,
+                        dispatch_uid='knowledge_metrics_flusher')
+
+
+def track_command(handle):
+    """管理命令 handle() 的装饰器：按命令名 (模块名) 记录运行次数、结果与耗时"""
+    name = handle.__module__.rsplit('.', 1)[-1]
+
+    @functools.wraps(handle)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            result = handle(*args, **kwargs)
+            status = 'success'
+            return result
+        finally:
+            command_runs.inc(command=name, status=status)
+            command_duration.observe(time.perf_counter() - start, command=name)
+    return wrapper
+
+
+# === 指标定义 ===
+
+article_views = Counter('knowledge_article_views_total', '文章详情页访问次数')
+doc_detail_duration = Histogram('knowledge_doc_detail_duration_seconds', '文章详情页处理耗时')
+search_duration = Histogram('knowledge_search_duration_seconds', '站内搜索处理耗时')
+search_requests = Counter('knowledge_search_requests_total', '站内搜索次数 (按是否有结果)', ['result'])
+upload_duration = Histogram('knowledge_upload_duration_seconds', '编辑器图片上传处理耗时 (水印、压缩、写存储)')
+uploads = Counter('knowledge_uploads_total', '编辑器图片上传次数', ['status'])
+upload_bytes = Counter('knowledge_upload_bytes_total', '编辑器图片上传写入存储的字节数')
+feedback_submissions = Counter('knowledge_feedback_submissions_total', '意见反馈提交次数', ['status'])
+attachment_extractions = Counter('knowledge_attachment_extractions_total', '附件正文提取次数', ['status'])
+media_bytes_saved = Counter('knowledge_media_optimize_saved_bytes_total', 'optimize_media 节省的字节数')
+captcha_generated = Counter('knowledge_captcha_pool_generated_total', 'refill_captcha_pool 生成的验证码数')
+command_runs = Counter('knowledge_command_runs_total', '管理命令运行次数', ['command', 'status'])
+command_duration = Histogram('knowledge_command_duration_seconds', '管理命令运行耗时', ['command'],
+                             buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600))
+
+
+def _counter_backlog():
+    from .counters import BatchedCounter
+    return {(counter.name,): counter.backlog() for counter in BatchedCounter.instances}
+
+
+def _cache_stats():
+    from django.core.cache import caches
+    from AP_knowledge.cache_backends import TwoTierCache
+    cache = caches['default']
+    if not isinstance(cache, TwoTierCache):
+        return {}
+    # 在 metrics-flush 线程中调用：各线程的缓存实例共用进程级的计数 (只增不减，进程重启后由新快照文件接续)
+    stats = cache.stats()
+    return {(name,): stats[name] for name in ('local_hits', 'shared_hits', 'misses', 'evictions', 'invalidations')}
+
+
+def _content_counts():
+    from .models import Article, Comment
+    return {
+        ('article', 'public'): Article.objects.filter(is_public=True).count(),
+        ('article', 'private'): Article.objects.filter(is_public=False).count(),
+        ('comment', 'public'): Comment.objects.filter(is_public=True).count(),
+        ('comment', 'private'): Comment.objects.filter(is_public=False).count(),
+    }
+
+
+def _captcha_available():
+    from feedback.captcha_pool import available_count
+    return available_count()
+
+
+Gauge('knowledge_counter_backlog', '进程内尚未写回数据库的计数 (如附件下载次数)', ['counter'], function=_counter_backlog)
+Counter('knowledge_cache_lookups_total', '两级缓存的命中、回源、淘汰和作废次数', ['result'], function=_cache_stats)
+Gauge('knowledge_content_objects', '文章和评论数量', ['type', 'visibility'], function=_content_counts, scope='scrape')
+Gauge('knowledge_captcha_pool_available', '验证码池中可领取的验证码数', function=_captcha_available, scope='scrape')
@@ -0,0 +1,149 @@
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import start_request, finish_request
+
+logger = logging.getLogger('knowledge.performance')
+
+# Server-Timing 中各阶段的描述 (响应头只能使用 ASCII)
+SPAN_LABELS = {
+    'template': 'Template render',
+    'storage': 'Storage I/O',
+    'image': 'Image processing',
+}
+
+
+class StackSampler(threading.Thread):
+    """定时采样目标线程的调用栈，输出 flamegraph 可用的折叠栈格式"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class PerformanceMiddleware:
+    """
+    记录每个请求的 SQL、模板渲染、存储 I/O、图片处理耗时：
+    - 通过 Server-Timing 响应头输出 (PERF_SERVER_TIMING)
+    - 超过 PERF_SLOW_REQUEST_MS 的请求写入结构化慢请求日志
+    - 匹配 PERF_PROFILE_URLS 的请求按 PERF_PROFILE_MODE 导出 cProfile 或栈采样
+    同时支持 WSGI 和 ASGI，ASGI 下不会强制视图回退到线程执行。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', settings.DEBUG)
+        self.slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        self.profile_dir = getattr(settings, 'PERF_PROFILE_DIR', None)
+        self.profile_mode = getattr(settings, 'PERF_PROFILE_MODE', 'cprofile')
+        self.profile_urls = [re.compile(p) for p in getattr(settings, 'PERF_PROFILE_URLS', [])]
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = start_request()
+        try:
+            with self._maybe_profile(request):
+                response = self.get_response(request)
+        finally:
+            finish_request(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = start_request()
+        try:
+            with self._maybe_profile(request):
+                response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        total_ms = timings.total_ms()
+        if self.server_timing:
+            response['Server-Timing'] = self._server_timing_header(timings, total_ms)
+        if total_ms >= self.slow_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'spans': timings.as_dict(),
+            }, ensure_ascii=False))
+        return response
+
+    def _server_timing_header(self, timings, total_ms):
+        entries = []
+        for name, (duration, count) in timings.spans.items():
+            label = f'{count} queries' if name == 'db' else SPAN_LABELS.get(name, name)
+            entries.append(f'{name};dur={duration:.1f};desc="{label}"')
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(entries)
+
+    @contextmanager
+    def _maybe_profile(self, request):
+        if not self.profile_dir or not any(p.search(request.path) for p in self.profile_urls):
+            yield
+            return
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = re.sub(r'[^\w]+', '_', request.path).strip('_') or 'root'
+        filename = os.path.join(self.profile_dir, f'{name}-{int(time.time() * 1000)}')
+
+        if self.profile_mode == 'sample':
+            interval = getattr(settings, 'PERF_SAMPLE_INTERVAL', 0.005)
+            sampler = StackSampler(threading.get_ident(), interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                sampler.dump(f'{filename}.folded')
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f'{filename}.prof')
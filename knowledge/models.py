@@ -1,66 +1,26 @@
+from django.conf import settings
 from django.db import models
+from django.urls import reverse
 from taggit.managers import TaggableManager
 from mptt.models import MPTTModel, TreeForeignKey
-# 替换 MartorField 为 CKEditor 5
-from django_ckeditor_5.fields import CKEditor5Field
+# 替换 MartorField 为 CKEditor 5 (正文字段支持压缩存储)
+from .content_storage import CompressibleContentField, compress as compress_content
 from imagekit.models import ProcessedImageField
 from imagekit.processors import ResizeToFit
-from PIL import Image, ImageDraw, ImageFont
 import os
+import re
 import uuid
 from django.utils.timezone import now
-import math
+from .imaging import TextWatermark
 
 
-# ... (保留 upload_to_uuid 和 TextWatermark 工具类，代码与上次一致) ...
+# ... (保留 upload_to_uuid，TextWatermark 已移至 imaging.py) ...
 def upload_to_uuid(instance, filename):
     ext = filename.split('.')[-1]
     filename = f"{uuid.uuid4().hex}.{ext}"
     return os.path.join('covers', now().strftime('%Y/%m'), filename)
 
 
-class TextWatermark:
-    def __init__(self, text="Apmemory", opacity=100):
-        self.text = text
-        self.opacity = opacity
-
-    def process(self, img):
-        img = img.convert('RGBA')
-        watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(watermark)
-        try:
-            font = ImageFont.truetype("arial.ttf", 40)
-        except IOError:
-            font = ImageFont.load_default()
-        text = self.text
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-        
-        # 计算旋转后的对角线长度，确保足够容纳文字
-        diagonal = int(math.sqrt(text_width ** 2 + text_height ** 2))
-        
-        # 创建一个小的文本图像，用于旋转
-        text_img = Image.new('RGBA', (text_width, text_height), (0, 0, 0, 0))
-        text_draw = ImageDraw.Draw(text_img)
-        text_draw.text((0, 0), text, font=font, fill=(255, 255, 255, self.opacity))  # 白色半透明文字
-        
-        # 旋转文本图像 (约-45度倾斜)
-        rotated_text = text_img.rotate(-45, expand=1, fillcolor=(0, 0, 0, 0))
-        
-        # 确定水印位置 (多个重复的水印，覆盖整个图像)
-        pos_x_step = diagonal * 2  # 水平间距
-        pos_y_step = diagonal * 2  # 垂直间距
-        
-        # 在原图上多次放置水印
-        for offset_x in range(0, img.size[0], pos_x_step):
-            for offset_y in range(0, img.size[1], pos_y_step):
-                # 计算每个水印的位置
-                watermark.paste(rotated_text, (offset_x, offset_y), rotated_text)
-                
-        return Image.alpha_composite(img, watermark).convert('RGB')
-
-
 # === 1. 分类 ===
 class Category(MPTTModel):
     name = models.CharField("分类名称", max_length=50)
@@ -78,6 +38,9 @@ class Category(MPTTModel):
     def __str__(self):
         return self.name
 
+    def get_absolute_url(self):
+        return reverse('category_detail', args=[self.pk])
+
 
 # === 2. 文章 ===
 # ... (上面的代码保持不变)
@@ -95,7 +58,14 @@ class Article(models.Model):
     # 添加摘要字段
     summary = models.TextField("摘要", blank=True, help_text="文章摘要，如果为空则自动从内容前200个字符生成")
 
-    content = CKEditor5Field("文档内容", config_name='extends')
+    content = CompressibleContentField("文档内容", config_name='extends')
+    # 开启 ARTICLE_CONTENT_COMPRESSION 时的压缩正文 (此时 content 列为空)，读取 content 时才解压，见 content_storage.py
+    content_compressed = models.BinaryField("压缩正文", null=True, blank=True, editable=False)
+    # 去除 HTML 后的纯文本，保存时自动生成，供搜索匹配与摘要高亮使用
+    plain_text = models.TextField("纯文本内容", blank=True, editable=False)
+    # 保存时预处理好的正文 HTML (标题锚点、图片懒加载和尺寸) 与目录，详情页直接输出
+    rendered_content = models.TextField("渲染后内容", blank=True, editable=False)
+    toc = models.JSONField("目录", default=list, blank=True, editable=False)
 
     tags = TaggableManager(blank=True)
     views = models.PositiveIntegerField("浏览量", default=0)
@@ -119,33 +89,121 @@ class Article(models.Model):
         verbose_name = "知识文档"
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        # 首页、归档页按时间倒序列出公开文章
+        indexes = [models.Index(fields=['is_public', 'created_at'], name='article_public_created_idx')]
 
     def __str__(self):
         return self.title
 
+    def get_absolute_url(self):
+        return reverse('doc_detail', args=[self.pk])
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.refresh_derived_fields()
+            self.content_compressed = compress_content(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.DERIVED_FIELDS) | {'content_compressed'}
+        super().save(*args, **kwargs)
+
+    # 由正文生成的字段，见 refresh_derived_fields
+    DERIVED_FIELDS = ('plain_text', 'rendered_content', 'toc')
+
+    def refresh_derived_fields(self):
+        """根据正文重新生成派生字段 (bulk_create 等绕过 save 的场景需手动调用)"""
+        from django.utils.html import strip_tags
+        from .rendering import render_article
+        import html
+        text = html.unescape(strip_tags(self.content or ''))
+        self.plain_text = re.sub(r'\s+', ' ', text).strip()
+        self.rendered_content, self.toc = render_article(self.content)
+
     def get_summary(self):
         """获取文章摘要，如果有手动输入的摘要则使用它，否则自动生成"""
         if self.summary:
             return self.summary
         # 如果没有手动输入摘要，则从内容中提取前200个字符作为摘要
-        # 去除HTML标签
-        from django.utils.html import strip_tags
-        clean_content = strip_tags(self.content)
+        # 优先使用保存时生成的纯文本 (列表/订阅查询可以不加载 content)，没有时再去除HTML标签
+        if self.plain_text:
+            clean_content = self.plain_text
+        else:
+            from django.utils.html import strip_tags
+            clean_content = strip_tags(self.content)
         return clean_content[:200] + "..." if len(clean_content) > 200 else clean_content
 
 
 # ... (下面的 Attachment 和 Comment 保持不变)
 
+# === 媒体文件信息 (图片尺寸等，渲染正文时用于补全 <img> 的 width/height) ===
+class MediaFile(models.Model):
+    path = models.CharField("存储路径", max_length=255, unique=True)
+    width = models.PositiveIntegerField("宽度", default=0)
+    height = models.PositiveIntegerField("高度", default=0)
+    size = models.PositiveIntegerField("文件大小", default=0)
+    # optimize_media 的处理记录：已处理的文件再次运行时跳过
+    original_size = models.PositiveIntegerField("优化前大小", default=0)
+    optimized_at = models.DateTimeField("优化时间", null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "媒体文件"
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return self.path
+
+    @classmethod
+    def record(cls, path, width=None, height=None, size=None, original_size=None):
+        """
+        记录 (或更新) 媒体文件信息；未提供尺寸时读取图片文件头，文件不存在或不是图片返回 None。
+        original_size 表示上传时已压缩优化过 (optimize_media 不再处理)
+        """
+        from django.core.files.storage import default_storage
+        if width is None or height is None:
+            from PIL import Image
+            try:
+                with default_storage.open(path, 'rb') as f:
+                    width, height = Image.open(f).size  # 只解析文件头，不解码像素
+                size = default_storage.size(path)
+            except Exception:
+                return None
+        defaults = {'width': width, 'height': height, 'size': size or 0}
+        if original_size is not None:
+            defaults.update(original_size=original_size, optimized_at=now())
+        media, _ = cls.objects.update_or_create(path=path, defaults=defaults)
+        return media
+
+
 # === 3. 附件 ===
 class Attachment(models.Model):
+    EXTRACTION_CHOICES = (
+        ('pending', '待提取'),
+        ('done', '已提取'),
+        ('failed', '提取失败'),
+        ('skipped', '不支持'),
+    )
     article = models.ForeignKey(Article, related_name='attachments', on_delete=models.CASCADE)
     file = models.FileField("文件", upload_to='attachments/%Y/%m/')
     name = models.CharField("显示名称", max_length=100, blank=True)
+    downloads = models.PositiveIntegerField("下载次数", default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 后台提取的附件正文 (截断到 ATTACHMENT_TEXT_MAX_CHARS)，参与前台搜索，见 attachment_text.py
+    extracted_text = models.TextField("提取的正文", blank=True, editable=False)
+    extraction_status = models.CharField("提取状态", max_length=10, choices=EXTRACTION_CHOICES, default='pending',
+                                         editable=False, db_index=True)
+    extraction_note = models.CharField("提取说明", max_length=200, blank=True, editable=False)
+    extracted_at = models.DateTimeField("提取时间", null=True, blank=True, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.name and self.file:
             self.name = os.path.basename(self.file.name)
+        # 更换了文件时重新提取
+        if self.pk and kwargs.get('update_fields') is None:
+            old_file = Attachment.objects.filter(pk=self.pk).values_list('file', flat=True).first()
+            if old_file != self.file.name:
+                self.extraction_status = 'pending'
+                self.extracted_text = ''
         super().save(*args, **kwargs)
 
 
@@ -164,4 +222,89 @@ class Comment(models.Model):
         ordering = ['-created_at']
 
     def display_name(self):
-        return self.name if self.name else self.email.split('@')[0]
\ No newline at end of file
+        return self.name if self.name else self.email.split('@')[0]
+
+
+# === 日期归档 (每月公开文章数，文章保存/删除时由 signals 更新，见 ArchiveMonth.refresh) ===
+class ArchiveMonth(models.Model):
+    year = models.PositiveSmallIntegerField("年")
+    month = models.PositiveSmallIntegerField("月")
+    count = models.PositiveIntegerField("公开文章数", default=0)
+
+    class Meta:
+        verbose_name = "月份归档"
+        verbose_name_plural = verbose_name
+        ordering = ['-year', '-month']
+        constraints = [models.UniqueConstraint(fields=['year', 'month'], name='unique_archive_month')]
+
+    def __str__(self):
+        return f'{self.year}年{self.month}月'
+
+    def get_absolute_url(self):
+        return reverse('archive_month', args=[self.year, self.month])
+
+    @staticmethod
+    def month_range(year, month):
+        """当地时区下某月的起止时间 [start, end)"""
+        from datetime import datetime
+        from django.utils.timezone import make_aware
+        start = make_aware(datetime(year, month, 1))
+        end = make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+        return start, end
+
+    @classmethod
+    def refresh(cls, created_at):
+        """重新统计 created_at 所在月份的公开文章数 (走 (is_public, created_at) 索引的范围计数)"""
+        from django.utils.timezone import localtime
+        local = localtime(created_at)
+        start, end = cls.month_range(local.year, local.month)
+        count = Article.objects.filter(is_public=True, created_at__gte=start, created_at__lt=end).count()
+        if count:
+            cls.objects.update_or_create(year=local.year, month=local.month, defaults={'count': count})
+        else:
+            cls.objects.filter(year=local.year, month=local.month).delete()
+
+    @classmethod
+    def rebuild(cls):
+        """全量重建 (bulk_create 等绕过 save 的场景需手动调用)"""
+        from django.db import transaction
+        from django.db.models import Count
+        from django.db.models.functions import TruncMonth
+        rows = (Article.objects.filter(is_public=True).annotate(m=TruncMonth('created_at'))
+                .values('m').annotate(n=Count('pk')).order_by())
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([cls(year=row['m'].year, month=row['m'].month, count=row['n']) for row in rows])
+
+
+# === 5. 修订历史 (压缩增量存储，读写逻辑见 revisions.py) ===
+class ArticleRevision(models.Model):
+    SNAPSHOT = 'snapshot'
+    DELTA = 'delta'
+    KIND_CHOICES = ((SNAPSHOT, '完整快照'), (DELTA, '增量'))
+
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='revisions', verbose_name="文章")
+    number = models.PositiveIntegerField("版本号")
+    kind = models.CharField("存储方式", max_length=10, choices=KIND_CHOICES)
+    # 快照为 zlib 压缩的正文；增量为 zlib 压缩的 JSON 指令 (相对上一版本)
+    data = models.BinaryField("数据")
+    title = models.CharField("标题", max_length=200, blank=True)
+    # 正文原始长度 (UTF-8 字节) 与 SHA-1，用于统计节省的空间和校验还原结果
+    size = models.PositiveIntegerField("原始大小", default=0)
+    checksum = models.CharField("校验和", max_length=40)
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                               verbose_name="修改人")
+    created_at = models.DateTimeField("保存时间", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "修订历史"
+        verbose_name_plural = verbose_name
+        ordering = ['article', '-number']
+        constraints = [models.UniqueConstraint(fields=['article', 'number'], name='unique_article_revision')]
+
+    def __str__(self):
+        return f"{self.article_id} v{self.number}"
+
+    @property
+    def stored_size(self):
+        return len(self.data)
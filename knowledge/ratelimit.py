@@ -0,0 +1,188 @@
+"""
+限流与背压：评论、留言、图片上传等写入接口
+
+- 令牌桶按 (接口, 客户端 IP) 计数 (只有 TRUSTED_PROXIES 转发的请求才参考 X-Forwarded-For)，状态保存在 RATE_LIMIT_CACHE 指定的缓存中 (多进程共享)，
+  缓存不可用时退回进程内的令牌桶
+- 超出频率返回 429 并带 Retry-After
+- concurrency_limit 限制 CPU 密集接口 (图片处理) 的同时执行数，排队超时返回 503
+"""
+import ipaddress
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+_RATE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=8)
+def _proxy_networks(proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def parse_ip(address):
+    try:
+        return ipaddress.ip_address(address.strip())
+    except ValueError:
+        return None
+
+
+def is_trusted_proxy(ip):
+    return any(ip in network for network in _proxy_networks(tuple(getattr(settings, 'TRUSTED_PROXIES', ()))))
+
+
+def get_client_ip(request):
+    """
+    客户端地址：默认取 REMOTE_ADDR；REMOTE_ADDR 是 TRUSTED_PROXIES 中的代理时，
+    从 X-Forwarded-For 右侧往左跳过受信任的代理，取第一个其他地址
+    (左侧的条目由客户端任意填写，不能直接使用第一个)
+    """
+    address = request.META.get('REMOTE_ADDR')
+    ip = parse_ip(address or '')
+    if ip is None or not is_trusted_proxy(ip):
+        return address
+    for hop in reversed(request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')):
+        ip = parse_ip(hop)
+        if ip is None:
+            # 格式不对的条目不是受信任的代理写入的，停在上一跳
+            break
+        address = str(ip)
+        if not is_trusted_proxy(ip):
+            break
+    return address
+
+
+def parse_rate(rate):
+    """'5/m' -> (容量 5, 每秒补充 5/60 个令牌)；也支持 '10/5m' 这样的写法"""
+    match = _RATE.match(rate)
+    if not match:
+        raise ValueError(f'无效的限流配置: {rate!r}')
+    count, multiplier, unit = int(match.group(1)), int(match.group(2) or 1), match.group(3)
+    return count, count / (multiplier * _PERIODS[unit])
+
+
+def _take(state, capacity, refill, now):
+    """令牌桶计算；state 为 (剩余令牌, 上次时间) 或 None，返回 (新状态, 是否放行, 需等待秒数)"""
+    tokens, last = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - last) * refill)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0
+    return (tokens, now), False, (1 - tokens) / refill
+
+
+class LocalBuckets:
+    """进程内令牌桶 (缓存不可用时使用)，只保留最近使用的 max_keys 个桶"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill):
+        with self._lock:
+            state, allowed, wait = _take(self._buckets.get(key), capacity, refill, time.time())
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+
+class RateLimiter:
+    def __init__(self):
+        self.local = LocalBuckets()
+
+    def take(self, key, rate):
+        """消耗一个令牌，返回 (是否放行, 需等待秒数)"""
+        capacity, refill = parse_rate(rate)
+        try:
+            cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+            # 读-改-写不是原子操作，并发时可能多放行少量请求，对限流来说可以接受
+            state, allowed, wait = _take(cache.get(key), capacity, refill, time.time())
+            cache.set(key, state, timeout=math.ceil(capacity / refill) + 1)
+            return allowed, wait
+        except Exception:
+            return self.local.take(key, capacity, refill)
+
+
+limiter = RateLimiter()
+
+
+def _too_many_requests(wait, as_json):
+    retry_after = max(1, math.ceil(wait))
+    message = f'请求过于频繁，请 {retry_after} 秒后再试'
+    if as_json:
+        response = JsonResponse({'error': {'message': message}}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def check_rate(request, scope):
+    """返回 (是否放行, 需等待秒数)；未配置该接口或登录的管理员不限流"""
+    rate = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+    if not rate or not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+        return True, 0
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True, 0
+    return limiter.take(f'ratelimit:{scope}:{get_client_ip(request)}', rate)
+
+
+def ratelimit(scope, methods=('POST',), as_json=False):
+    """按 RATE_LIMITS[scope] 限制指定请求方法的频率，同步和异步视图都可使用"""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    # request.user 需要查询会话，缓存读写也是阻塞的，放到线程中执行
+                    allowed, wait = await sync_to_async(check_rate)(request, scope)
+                    if not allowed:
+                        return _too_many_requests(wait, as_json)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    allowed, wait = check_rate(request, scope)
+                    if not allowed:
+                        return _too_many_requests(wait, as_json)
+                return view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def concurrency_limit(limit, timeout, as_json=False):
+    """限制视图在本进程内的同时执行数，排队超过 timeout 秒返回 503"""
+    semaphore = threading.BoundedSemaphore(limit)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not semaphore.acquire(timeout=timeout):
+                message = '服务器繁忙，请稍后再试'
+                if as_json:
+                    response = JsonResponse({'error': {'message': message}}, status=503)
+                else:
+                    response = HttpResponse(message, status=503, content_type='text/plain; charset=utf-8')
+                response['Retry-After'] = str(max(1, math.ceil(timeout)))
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                semaphore.release()
+        return wrapper
+
+    return decorator
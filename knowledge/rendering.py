@@ -0,0 +1,148 @@
+"""
+文章保存时的正文后处理：生成目录 (TOC) 和可直接输出的 HTML
+
+- h1~h3 标题补充锚点 id，并收集为目录结构 [{'level', 'id', 'text'}]
+- <img> 补充 loading="lazy"、decoding="async"，并根据媒体文件信息补全 width/height，
+  浏览器在图片加载前即可预留位置，避免页面抖动
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.utils.text import slugify
+
+TOC_TAGS = ('h1', 'h2', 'h3')
+_IMG_SRC = re.compile(r'<img[^>]+src=["\']([^"\']+)["\']', re.I)
+
+
+def media_path_from_url(url):
+    """把 /media/xxx 形式的地址转换为存储中的相对路径，非本站媒体返回 None"""
+    media_url = settings.MEDIA_URL
+    if url.startswith(media_url):
+        return url[len(media_url):]
+    return None
+
+
+def load_image_sizes(content):
+    """查询正文中引用的本站图片尺寸，没有记录的图片读取文件头并补记录"""
+    from .models import MediaFile
+
+    paths = {media_path_from_url(src) for src in _IMG_SRC.findall(content or '')}
+    paths.discard(None)
+    if not paths:
+        return {}
+    sizes = {m.path: (m.width, m.height) for m in MediaFile.objects.filter(path__in=paths)}
+    for path in paths - sizes.keys():
+        media = MediaFile.record(path)
+        if media is not None:
+            sizes[path] = (media.width, media.height)
+    return sizes
+
+
+class _ArticleRenderer(HTMLParser):
+    def __init__(self, image_sizes):
+        super().__init__(convert_charrefs=False)
+        self.image_sizes = image_sizes
+        self.out = []
+        self.toc = []
+        self.used_ids = set()
+        self._heading = None  # (tag, 输出位置, 原有属性, 文本片段)
+
+    # --- 标签 ---
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, self.get_starttag_text(), closed=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, self.get_starttag_text(), closed=True)
+
+    def _start(self, tag, attrs, raw, closed):
+        if tag == 'img':
+            self.out.append(self._render_img(attrs, closed))
+        elif tag in TOC_TAGS and self._heading is None and not closed:
+            # 标题文本要等结束标签才能确定，先占位
+            self._heading = (tag, len(self.out), attrs, [])
+            self.out.append(raw)
+        else:
+            self.out.append(raw)
+
+    def handle_endtag(self, tag):
+        if self._heading is not None and tag == self._heading[0]:
+            self._finish_heading()
+        self.out.append(f'</{tag}>')
+
+    def _finish_heading(self):
+        tag, index, attrs, parts = self._heading
+        self._heading = None
+        text = re.sub(r'\s+', ' ', html.unescape(''.join(parts))).strip()
+        if not text:
+            return
+        attr_map = dict(attrs)
+        anchor = attr_map.get('id') or self._unique_id(text)
+        self.used_ids.add(anchor)
+        if 'id' not in attr_map:
+            self.out[index] = self._build_tag(tag, attrs + [('id', anchor)])
+        self.toc.append({'level': int(tag[1]), 'id': anchor, 'text': text})
+
+    def _unique_id(self, text):
+        base = slugify(text, allow_unicode=True) or 'heading'
+        anchor, n = base, 2
+        while anchor in self.used_ids:
+            anchor = f'{base}-{n}'
+            n += 1
+        return anchor
+
+    def _render_img(self, attrs, closed):
+        attr_map = dict(attrs)
+        extra = []
+        if 'loading' not in attr_map:
+            extra.append(('loading', 'lazy'))
+        if 'decoding' not in attr_map:
+            extra.append(('decoding', 'async'))
+        if 'width' not in attr_map and 'height' not in attr_map:
+            path = media_path_from_url(attr_map.get('src') or '')
+            size = self.image_sizes.get(path)
+            if size:
+                extra += [('width', str(size[0])), ('height', str(size[1]))]
+        return self._build_tag('img', attrs + extra, closed)
+
+    @staticmethod
+    def _build_tag(tag, attrs, closed=False):
+        parts = [tag]
+        for name, value in attrs:
+            parts.append(name if value is None else f'{name}="{html.escape(value, quote=True)}"')
+        return '<' + ' '.join(parts) + (' />' if closed else '>')
+
+    # --- 文本与其他节点原样输出 ---
+    def handle_data(self, data):
+        if self._heading is not None:
+            self._heading[3].append(data)
+        self.out.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_data(f'&{name};')
+
+    def handle_charref(self, name):
+        self.handle_data(f'&#{name};')
+
+    def handle_comment(self, data):
+        self.out.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self.out.append(f'<!{decl}>')
+
+    def handle_pi(self, data):
+        self.out.append(f'<?{data}>')
+
+    def unknown_decl(self, data):
+        self.out.append(f'<![{data}]>')
+
+
+def render_article(content, image_sizes=None):
+    """返回 (rendered_html, toc)"""
+    if image_sizes is None:
+        image_sizes = load_image_sizes(content)
+    renderer = _ArticleRenderer(image_sizes)
+    renderer.feed(content or '')
+    renderer.close()
+    return ''.join(renderer.out), renderer.toc
@@ -0,0 +1,256 @@
+"""
+S3 兼容对象存储 (AWS S3、MinIO、阿里云 OSS 等) 的 Django Storage
+
+- 每个进程一个 boto3 client (线程安全)，连接池大小 S3_MAX_POOL_CONNECTIONS
+- 上传超过 S3_MULTIPART_THRESHOLD 时自动分片，S3_MAX_CONCURRENCY 个分片并行上传
+- exists() / size() / get_modified_time() 的 HEAD 结果缓存在 S3_METADATA_CACHE 中；
+  只缓存"存在"的结果，保存和删除时同步失效，避免把新上传的文件误判为不存在
+- 访问地址 (S3_URL_MODE)：
+    'redirect' url() 仍为 MEDIA_URL/<name>，由 serve_media 视图 302 跳转到临时签名地址 (默认)
+    'proxy'    url() 为 MEDIA_URL/<name>，由 serve_media 视图从对象存储读取后返回 (私有桶、无外网访问时)
+    'public'   url() 直接返回 S3_PUBLIC_URL/<name> (公共读的桶或 CDN)
+  正文 HTML 中保存的图片地址因此保持为稳定的 /media/... 地址，签名过期也不影响
+
+可选依赖 boto3 (pip install "ap-knowledge[s3]")。启用方式：STORAGES['default']['BACKEND'] = 'knowledge.s3storage.S3Storage'
+检查：manage.py check_storage --moto (进程内的 S3 替身，需要 moto) 或配置好真实存储后运行 check_storage
+"""
+import io
+import mimetypes
+import posixpath
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+
+try:
+    import boto3  # 可选依赖：pip install boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+METADATA_KEY_PREFIX = 's3meta:'
+
+
+def option(name, default=None):
+    return getattr(settings, name, default)
+
+
+class S3File(File):
+    """按需发起 GET 的只读文件对象，seek() 后用 Range 请求从新位置读取 (附件断点续传)"""
+
+    def __init__(self, storage, name):
+        self._storage = storage
+        self._pos = 0
+        self._body = None
+        self._size = None
+        self._closed = False
+        self.mode = 'rb'
+        # 自身就是底层文件对象 (File 的 read/seek 等代理到 self.file)
+        super().__init__(self, name)
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self._storage.size(self.name)
+        return self._size
+
+    def _open_body(self):
+        kwargs = {'Bucket': self._storage.bucket, 'Key': self._storage.key(self.name)}
+        if self._pos:
+            kwargs['Range'] = f'bytes={self._pos}-'
+        self._body = self._storage.client.get_object(**kwargs)['Body']
+
+    def read(self, size=-1):
+        if self._closed:
+            raise ValueError('I/O operation on closed file.')
+        if self._size is not None and self._pos >= self._size:
+            return b''
+        if self._body is None:
+            self._open_body()
+        data = self._body.read() if size is None or size < 0 else self._body.read(size)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset != self._pos:
+            self._close_body()
+            self._pos = offset
+        return self._pos
+
+    def open(self, mode=None):
+        self._closed = False
+        self.seek(0)
+        return self
+
+    def tell(self):
+        return self._pos
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def _close_body(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def close(self):
+        self._close_body()
+        self._closed = True
+
+    @property
+    def closed(self):
+        # GET 请求在第一次 read() 时才发起，打开后、读取前也是未关闭状态
+        return self._closed
+
+
+@deconstructible
+class S3Storage(Storage):
+    def __init__(self, bucket=None, prefix=None, url_mode=None):
+        if boto3 is None:
+            raise ImproperlyConfigured('S3Storage 需要安装 boto3: pip install boto3')
+        self.bucket = bucket or option('S3_BUCKET')
+        if not self.bucket:
+            raise ImproperlyConfigured('请配置 S3_BUCKET')
+        self.prefix = (prefix if prefix is not None else option('S3_PREFIX', 'media')).strip('/')
+        self.url_mode = url_mode or option('S3_URL_MODE', 'redirect')
+        self._client = None
+
+    # --- 连接与配置 ---
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.session.Session().client(
+                's3',
+                endpoint_url=option('S3_ENDPOINT_URL'),
+                region_name=option('S3_REGION'),
+                aws_access_key_id=option('S3_ACCESS_KEY'),
+                aws_secret_access_key=option('S3_SECRET_KEY'),
+                config=Config(
+                    max_pool_connections=option('S3_MAX_POOL_CONNECTIONS', 20),
+                    retries={'max_attempts': 3, 'mode': 'standard'},
+                    # MinIO 等自建服务通常只支持路径形式的地址
+                    s3={'addressing_style': option('S3_ADDRESSING_STYLE', 'auto')},
+                    signature_version='s3v4',
+                ),
+            )
+        return self._client
+
+    @property
+    def transfer_config(self):
+        return TransferConfig(
+            multipart_threshold=option('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=option('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024),
+            max_concurrency=option('S3_MAX_CONCURRENCY', 4),
+            use_threads=True,
+        )
+
+    def key(self, name):
+        name = name.replace('\\', '/').lstrip('/')
+        return f'{self.prefix}/{name}' if self.prefix else name
+
+    @property
+    def metadata_cache(self):
+        return caches[option('S3_METADATA_CACHE', 'default')]
+
+    def _metadata_key(self, name):
+        return METADATA_KEY_PREFIX + self.key(name)
+
+    def metadata(self, name):
+        """返回 {'size', 'modified'}，对象不存在返回 None；存在时缓存 S3_METADATA_CACHE_TIMEOUT 秒"""
+        cache_key = self._metadata_key(name)
+        meta = self.metadata_cache.get(cache_key)
+        if meta is not None:
+            return meta
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        meta = {'size': head['ContentLength'], 'modified': head['LastModified']}
+        self.metadata_cache.set(cache_key, meta, option('S3_METADATA_CACHE_TIMEOUT', 3600))
+        return meta
+
+    # --- Storage API ---
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError('S3Storage 只支持以只读方式打开文件，写入请使用 save()')
+        if self.metadata(name) is None:
+            raise FileNotFoundError(name)
+        return S3File(self, name)
+
+    def _save(self, name, content):
+        content_type = getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0] \
+            or 'application/octet-stream'
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        # upload_fileobj 超过阈值时自动分片并行上传
+        self.client.upload_fileobj(content, self.bucket, self.key(name),
+                                   ExtraArgs={'ContentType': content_type}, Config=self.transfer_config)
+        self.metadata_cache.delete(self._metadata_key(name))
+        return name.replace('\\', '/')
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+        self.metadata_cache.delete(self._metadata_key(name))
+
+    def exists(self, name):
+        return self.metadata(name) is not None
+
+    def size(self, name):
+        meta = self.metadata(name)
+        if meta is None:
+            raise FileNotFoundError(name)
+        return meta['size']
+
+    def get_modified_time(self, name):
+        meta = self.metadata(name)
+        if meta is None:
+            raise FileNotFoundError(name)
+        return meta['modified']
+
+    def listdir(self, path):
+        prefix = self.key(path).rstrip('/') + '/' if path else (f'{self.prefix}/' if self.prefix else '')
+        dirs, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            for item in page.get('CommonPrefixes', []):
+                dirs.append(posixpath.basename(item['Prefix'].rstrip('/')))
+            for item in page.get('Contents', []):
+                if item['Key'] != prefix:
+                    files.append(posixpath.basename(item['Key']))
+        return dirs, files
+
+    def url(self, name):
+        if self.url_mode == 'public':
+            base = option('S3_PUBLIC_URL') or f"{option('S3_ENDPOINT_URL', '').rstrip('/')}/{self.bucket}"
+            return f"{base.rstrip('/')}/{filepath_to_uri(self.key(name))}"
+        return settings.MEDIA_URL + filepath_to_uri(name.replace('\\', '/'))
+
+    def presigned_url(self, name, filename=None, expires=None):
+        params = {'Bucket': self.bucket, 'Key': self.key(name)}
+        if filename:
+            from django.utils.http import content_disposition_header
+            params['ResponseContentDisposition'] = content_disposition_header(True, filename)
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expires or option('S3_PRESIGN_EXPIRES', 3600))
+
+    @property
+    def serves_via_django(self):
+        """url() 指向 MEDIA_URL，需要 serve_media 视图"""
+        return self.url_mode in ('redirect', 'proxy')
@@ -0,0 +1,107 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Case, Q, Value, When
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .cache import get_content_version
+from .models import Article
+
+
+def normalize_query(query):
+    """统一关键词格式 (去首尾空格、合并空白、小写)，作为缓存 key"""
+    return re.sub(r'\s+', ' ', query or '').strip().lower()
+
+
+class SearchResultCache:
+    """进程内 LRU 缓存：(内容版本号, 关键词) -> 结果 id 列表"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            ids = self._data.get(key)
+            if ids is not None:
+                self._data.move_to_end(key)
+            return ids
+
+    def set(self, key, ids):
+        with self._lock:
+            self._data[key] = ids
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+result_cache = SearchResultCache(getattr(settings, 'SEARCH_CACHE_SIZE', 256))
+
+
+def _query_article_ids(query):
+    # 正文匹配使用预先提取的纯文本，避免命中 HTML 标签和属性
+    matched = Q(title__icontains=query) | Q(plain_text__icontains=query) | \
+        Q(summary__icontains=query) | Q(tags__name__icontains=query) | \
+        Q(attachments__name__icontains=query) | Q(attachments__extracted_text__icontains=query)
+    # 排序：标题命中 > 正文/摘要命中 > 只有标签或附件 (文件名、提取的附件正文) 命中，同级按浏览量和时间
+    rank = Case(
+        When(title__icontains=query, then=Value(3)),
+        When(Q(plain_text__icontains=query) | Q(summary__icontains=query), then=Value(2)),
+        default=Value(1),
+    )
+    ids = Article.objects.filter(matched, is_public=True).annotate(rank=rank) \
+        .order_by('-rank', '-views', '-created_at').values_list('id', flat=True)
+    # 连接标签/附件会产生重复行，按出现顺序去重即可保持排序
+    return tuple(dict.fromkeys(ids))
+
+
+def search_article_ids(query):
+    """返回匹配文章的 id 列表 (已排序)，内容版本号不变时直接命中缓存"""
+    query = normalize_query(query)
+    if not query:
+        return ()
+    key = (get_content_version(), query)
+    ids = result_cache.get(key)
+    if ids is None:
+        ids = _query_article_ids(query)
+        result_cache.set(key, ids)
+    return ids
+
+
+def build_snippet(text, query, width=120, fallback=''):
+    """从纯文本中截取包含关键词的片段，并用 <mark> 高亮所有命中位置"""
+    text = text or ''
+    query = normalize_query(query)
+    pattern = re.compile(re.escape(query), re.IGNORECASE) if query else None
+    match = pattern.search(text) if pattern else None
+
+    if match is None:
+        # 标题/标签/附件命中时正文里可能没有关键词，退化为摘要或正文开头
+        text = fallback or text
+        suffix = '...' if len(text) > width else ''
+        return mark_safe(escape(text[:width]) + suffix)
+
+    start = max(match.start() - width // 3, 0)
+    end = min(start + width, len(text))
+    start = max(min(start, end - width), 0)
+    fragment = text[start:end]
+
+    parts = []
+    last = 0
+    for m in pattern.finditer(fragment):
+        parts.append(escape(fragment[last:m.start()]))
+        parts.append(f'<mark>{escape(m.group())}</mark>')
+        last = m.end()
+    parts.append(escape(fragment[last:]))
+
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if end < len(text) else ''
+    return mark_safe(prefix + ''.join(parts) + suffix)
@@ -0,0 +1,114 @@
+"""
+静态导出用的客户端搜索索引
+
+- 分词：英文/数字按单词，中日韩文字按相邻两字 (bigram)，单个汉字的片段保留单字
+- 倒排索引按词的 FNV-1a 哈希 (按 Unicode 码点计算，JS 端用 codePointAt 即可复现) 分片，
+  浏览器只下载查询词所在的分片
+- 输出：search/meta.json、search/docs.json (文档标题/地址/摘要)、search/index-<n>.json
+  分片格式 {词: [文档序号, 得分, 文档序号, 得分, ...]}
+
+哈希规则需与 static/js/static_search.js 保持一致；分词用的字符范围写入 meta.json，客户端按同一范围分词。
+检查：python -m doctest knowledge/search_index.py
+"""
+import json
+import os
+import re
+
+# 2: meta.json 中带上分词用的字符范围
+INDEX_VERSION = 2
+# 各字段的权重
+FIELD_WEIGHTS = (('title', 10), ('tags', 5), ('summary', 2))
+SUMMARY_LENGTH = 120
+
+# 中日韩文字：假名、扩展 A、基本汉字、韩文音节、兼容汉字；写入 meta.json，客户端按同一范围分词
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_TOKEN = re.compile(f'[a-z0-9]+|[{CJK_RANGES}]+')
+_CJK = re.compile(f'[{CJK_RANGES}]')
+
+
+def tokenize(text):
+    """
+    >>> tokenize('データベースの設計')[:3]
+    ['デー', 'ータ', 'タベ']
+    >>> tokenize('한국어 검색')
+    ['한국', '국어', '검색']
+    >>> tokenize('Django 缓存')
+    ['django', '缓存']
+    """
+    tokens = []
+    for run in _TOKEN.findall((text or '').lower()):
+        if _CJK.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def fnv1a(text):
+    h = 0x811c9dc5
+    for ch in text:
+        h = ((h ^ ord(ch)) * 0x01000193) & 0xffffffff
+    return h
+
+
+def shard_of(token, shards):
+    return fnv1a(token) % shards
+
+
+def build_index(articles, url_for, shards=16):
+    """
+    articles: 可迭代的 Article (需要 title / summary / plain_text 和预取的 tags)
+    返回 (docs, shard_list)；docs 为 [[标题, 地址, 摘要]]，shard_list[n] 为 {词: [序号, 得分, ...]}
+
+    查询分词得到的词都能在对应分片中找到 (假名、韩文同样适用)：
+    >>> from types import SimpleNamespace as Doc
+    >>> doc = Doc(title='データベースの設計', get_summary=lambda: '한국어 검색', tags=Doc(all=list))
+    >>> docs, shard_list = build_index([doc], lambda article: '/doc/1/', shards=4)
+    >>> all(token in shard_list[shard_of(token, 4)] for token in tokenize('データベース 검색'))
+    True
+    """
+    docs = []
+    postings = {}
+    for article in articles:
+        doc_id = len(docs)
+        summary = article.get_summary()
+        fields = {
+            'title': article.title,
+            'tags': ' '.join(tag.name for tag in article.tags.all()),
+            'summary': summary,
+        }
+        scores = {}
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields[field]):
+                scores[token] = scores.get(token, 0) + weight
+        for token, score in scores.items():
+            postings.setdefault(token, []).append((doc_id, score))
+        docs.append([article.title, url_for(article), summary[:SUMMARY_LENGTH]])
+
+    shard_list = [{} for _ in range(shards)]
+    for token, items in postings.items():
+        items.sort(key=lambda item: -item[1])
+        shard_list[shard_of(token, shards)][token] = [value for item in items for value in item]
+    return docs, shard_list
+
+
+def _dump(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_index(output_dir, docs, shard_list):
+    """写入 search/ 目录，返回写入的文件列表"""
+    search_dir = os.path.join(output_dir, 'search')
+    os.makedirs(search_dir, exist_ok=True)
+    written = []
+    meta = {'version': INDEX_VERSION, 'shards': len(shard_list), 'docs': len(docs), 'cjk': CJK_RANGES}
+    for name, data in [('meta.json', meta), ('docs.json', docs)] + [
+            (f'index-{n}.json', shard) for n, shard in enumerate(shard_list)]:
+        path = os.path.join(search_dir, name)
+        _dump(path, data)
+        written.append(path)
+    return written
@@ -0,0 +1,52 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+from taggit.models import Tag
+
+from .attachment_text import queue_extraction
+from .cache import bump_content_version
+from .models import Article, ArchiveMonth, Attachment, Category, Comment
+
+
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, update_fields=None, **kwargs):
+    # 浏览量自增不影响搜索结果，跳过以免每次访问都让缓存失效
+    if update_fields is not None and set(update_fields) <= {'views'}:
+        return
+    bump_content_version()
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def article_archive_changed(sender, instance, update_fields=None, **kwargs):
+    # 新建、删除、公开状态变化都会影响所在月份的文章数；重新计数只扫描该月的索引范围
+    if update_fields is not None and 'is_public' not in update_fields:
+        return
+    ArchiveMonth.refresh(instance.created_at)
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def content_changed(sender, **kwargs):
+    bump_content_version()
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def article_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_content_version()
+
+
+@receiver(post_save, sender=Attachment)
+def attachment_saved(sender, instance, update_fields=None, **kwargs):
+    # 新上传或更换了文件的附件，事务提交后在后台提取正文
+    if update_fields is None and instance.extraction_status == 'pending':
+        pk = instance.pk
+        transaction.on_commit(lambda: queue_extraction(pk))
@@ -0,0 +1,116 @@
+"""
+站点地图：sitemap.xml 为索引，文章按主键区间分片 (每片最多 SITEMAP_SHARD_SIZE 条)
+
+分片按主键划分而不是按偏移量，新增或删除文章只影响所在分片；每个分片以 (最后修改时间, 数量)
+作为签名缓存，签名不变的分片直接返回缓存内容。
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.html import escape
+from taggit.models import Tag
+
+from .cache import cached_response, get_content_version
+from .models import Article, Category
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+
+def shard_size():
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 50000)
+
+
+def public_articles():
+    return Article.objects.filter(is_public=True)
+
+
+def article_shards():
+    """一次分组查询得到所有非空分片的签名 {分片号: (最后修改时间, 数量)}"""
+    rows = (public_articles().order_by().annotate(shard=F('pk') / shard_size())
+            .values('shard').annotate(last=Max('updated_at'), total=Count('pk')))
+    return {row['shard']: (row['last'], row['total']) for row in rows}
+
+
+def _w3c(dt):
+    return dt.isoformat(timespec='seconds') if dt else None
+
+
+def _render(root, tag, entries):
+    """entries: [(loc, lastmod)]"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<{root} xmlns="{SITEMAP_NS}">']
+    for loc, lastmod in entries:
+        lines.append(f'<{tag}><loc>{escape(loc)}</loc>'
+                     + (f'<lastmod>{_w3c(lastmod)}</lastmod>' if lastmod else '') + f'</{tag}>')
+    lines.append(f'</{root}>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def _key(*parts):
+    """签名可能很长，缓存 key 使用其摘要"""
+    return 'sitemap:' + hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _timestamp(dt):
+    return dt.timestamp() if dt else None
+
+
+def sitemap_index(request):
+    shards = article_shards()
+    last = max((s[0] for s in shards.values()), default=None)
+    key = _key('index', request.get_host(), get_content_version(), sorted(shards.items()))
+
+    def build():
+        entries = [(request.build_absolute_uri(reverse('sitemap_pages')), last)]
+        for shard, (shard_last, _) in sorted(shards.items()):
+            entries.append((request.build_absolute_uri(reverse('sitemap_articles', args=[shard])), shard_last))
+        return _render('sitemapindex', 'sitemap', entries), CONTENT_TYPE, _timestamp(last)
+
+    return cached_response(request, key, build)
+
+
+def sitemap_pages(request):
+    """首页、分类页、标签页"""
+    key = _key('pages', request.get_host(), get_content_version(), Category.objects.count())
+
+    def build():
+        last_by_category = dict(public_articles().order_by().values_list('category_id').annotate(Max('updated_at')))
+        tags = (Tag.objects.filter(article__is_public=True)
+                .annotate(last=Max('article__updated_at')).only('slug').order_by('slug'))
+        last = max(last_by_category.values(), default=None)
+
+        entries = [(request.build_absolute_uri(reverse('index')), last)]
+        for category in Category.objects.only('id').order_by('tree_id', 'lft'):
+            entries.append((request.build_absolute_uri(category.get_absolute_url()),
+                            last_by_category.get(category.pk)))
+        for tag in tags:
+            entries.append((request.build_absolute_uri(reverse('tag_detail', args=[tag.slug])), tag.last))
+        return _render('urlset', 'url', entries), CONTENT_TYPE, _timestamp(last)
+
+    return cached_response(request, key, build)
+
+
+def sitemap_articles(request, shard):
+    size = shard_size()
+    queryset = public_articles().filter(pk__gte=shard * size, pk__lt=(shard + 1) * size)
+    signature = queryset.aggregate(last=Max('updated_at'), total=Count('pk'))
+    if not signature['total']:
+        raise Http404('分片不存在')
+    key = _key('articles', request.get_host(), shard, size, signature['last'], signature['total'])
+
+    def build():
+        entries = [
+            (request.build_absolute_uri(article.get_absolute_url()), article.updated_at)
+            for article in queryset.only('id', 'updated_at').order_by('pk').iterator(chunk_size=2000)
+        ]
+        return _render('urlset', 'url', entries), CONTENT_TYPE, _timestamp(signature['last'])
+
+    return cached_response(request, key, build)
+
+
+def robots_txt(request):
+    lines = ['User-agent: *', 'Disallow: /admin/', f"Sitemap: {request.build_absolute_uri(reverse('sitemap'))}"]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; charset=utf-8')
@@ -0,0 +1,77 @@
+import filecmp
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import write_compressed_variants
+
+# 字符串字面量原样保留，其余部分做压缩
+_CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+
+
+def minify_css(css):
+    """简单的 CSS 压缩：去注释 (保留 /*! */)、合并空白、去掉符号两侧空格和多余分号"""
+    parts = _CSS_STRING.split(_CSS_COMMENT.sub('', css))
+    for i in range(0, len(parts), 2):
+        code = re.sub(r'\s+', ' ', parts[i])
+        code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+        code = re.sub(r':\s+', ':', code)
+        code = code.replace(';}', '}')
+        parts[i] = code
+    return ''.join(parts).strip()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic 时：
+    1. 压缩 STATIC_MINIFY_PREFIXES 下的 CSS (在计算哈希之前，保证哈希对应压缩后内容)
+    2. 生成带内容哈希的文件名和 staticfiles.json 清单
+    3. 为所有文本文件生成 .gz / .br 预压缩版本：每个文件只压缩带哈希的版本一次，
+       内容相同的未带哈希副本直接复制压缩结果
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run=dry_run, **options)
+            return
+
+        prefixes = tuple(getattr(settings, 'STATIC_MINIFY_PREFIXES', ('css/',)))
+        for name in paths:
+            if name.endswith('.css') and name.startswith(prefixes):
+                with self.open(name) as f:
+                    css = f.read().decode('utf-8')
+                self.delete(name)
+                self._save(name, ContentFile(minify_css(css).encode('utf-8')))
+                # 让后续计算哈希时读取 STATIC_ROOT 中压缩后的文件，而不是源文件
+                paths[name] = (self, name)
+
+        # CSS 等文件会在多轮处理中重复出现，只记录最后一轮的结果，全部处理完再压缩
+        hashed_names = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names[name] = hashed_name
+            yield name, hashed_name, processed
+
+        # zlib / brotli 压缩时会释放 GIL，用线程池即可并行
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            list(pool.map(self.compress, hashed_names, hashed_names.values()))
+
+    def compress(self, name, hashed_name):
+        hashed_path, path = self.path(hashed_name), self.path(name)
+        written = write_compressed_variants(hashed_path)
+        # 引用了其他文件的 CSS 在带哈希的版本中替换了 URL，与未带哈希的副本内容不同，
+        # 这类副本不生成压缩版本 (页面引用的都是带哈希的文件名)
+        same = hashed_path != path and filecmp.cmp(hashed_path, path, shallow=False)
+        for ext in ('gz', 'br'):
+            variant, target = f'{hashed_path}.{ext}', f'{path}.{ext}'
+            if same and variant in written:
+                shutil.copyfile(variant, target)
+            elif hashed_path != path and os.path.exists(target):
+                # 删除上次生成的旧版本，避免返回与文件内容不一致的压缩数据
+                os.remove(target)
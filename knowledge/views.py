@@ -3,60 +3,39 @@ from django.db.models import Q, Count
 from django.core.paginator import Paginator
 from django.contrib import messages
 from taggit.models import Tag
-from .models import Article, Category
+from .models import Article, ArchiveMonth, Category, Attachment, MediaFile
+from AP_knowledge.database import use_readonly_db
 from .forms import CommentForm
+from .search import search_article_ids, build_snippet
 import hashlib
-from django.http import JsonResponse
+import hmac
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse, HttpResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from PIL import Image, ImageDraw, ImageFont
+import logging
+import mimetypes
 import os
 import uuid
 from django.utils.timezone import now
-import math
+from .counters import BatchedCounter
+from .instrumentation import timed
+from .imaging import add_watermark, encode_optimized
+from . import media_optimizer, metrics
+from .ratelimit import concurrency_limit, get_client_ip, ratelimit
 
+logger = logging.getLogger(__name__)
 
-def add_watermark(img):
-    """添加右下角水印到图片"""
-    img = img.convert('RGBA')
-    
-    # 创建与原图同样大小的透明图层用于绘制水印
-    watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(watermark)
-    
-    # 设置水印文字
-    text = "Apmemory"
-    try:
-        # 在 Windows 上使用系统字体路径
-        font_path = "C:\\Windows\\Fonts\\arial.ttf"
-        font = ImageFont.truetype(font_path, 20)
-    except (IOError, OSError):
-        try:
-            # 尝试其他常见字体
-            font_path = "C:\\Windows\\Fonts\\simsun.ttc"  # 中文字体
-            font = ImageFont.truetype(font_path, 20)
-        except (IOError, OSError):
-            font = ImageFont.load_default()
-    
-    # 获取文字尺寸
-    text_bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_height = text_bbox[3] - text_bbox[1]
-    
-    # 计算水印位置 (右下角)
-    margin = 30  # 边距
-    x = img.width - text_width - margin
-    y = img.height - text_height - margin
-    
-    # 在指定位置绘制水印文字
-    draw.text((x, y), text, font=font, fill=(255, 255, 255, 150))  # 设置适当的透明度
-    
-    # 将水印合成到原图上
-    combined = Image.alpha_composite(img, watermark)
-    return combined.convert('RGB')
+# 附件下载次数先在进程内累加，再批量写回
+download_counter = BatchedCounter(Attachment, 'downloads')
 
 
+@ratelimit('upload', as_json=True)
+# 图片解码和加水印是 CPU 密集操作，限制同时处理的数量，避免拖慢页面请求
+@concurrency_limit(settings.UPLOAD_MAX_CONCURRENCY, settings.UPLOAD_QUEUE_TIMEOUT, as_json=True)
+@metrics.upload_duration.timed
 def ckeditor_upload_view(request):
     """自定义CKEditor图片上传视图，添加水印"""
     if request.method == 'POST' and request.FILES.get('upload'):
@@ -64,43 +43,56 @@ def ckeditor_upload_view(request):
         
         # 检查是否是图片
         if not uploaded_file.content_type.startswith('image/'):
+            metrics.uploads.inc(status='rejected')
             return JsonResponse({'error': {'message': '只允许上传图片文件'}})
         
-        # 生成文件名
-        ext = os.path.splitext(uploaded_file.name)[1]
-        filename = f"{uuid.uuid4().hex}{ext}"
-        upload_path = os.path.join('attachments', now().strftime('%Y/%m'), filename)
-        
-        # 打开图片并添加水印
+        # 打开图片并添加水印 (PIL 只在上传时才加载)
+        from PIL import Image
+        from io import BytesIO
         try:
-            img = Image.open(uploaded_file)
-            print(f"Original image size: {img.size}, format: {img.format}")  # 调试输出
-            img_with_watermark = add_watermark(img)
-            print(f"Watermarked image size: {img_with_watermark.size}")  # 调试输出
-            
-            # 保存到临时文件
-            from io import BytesIO
-            output = BytesIO()
-            img_with_watermark.save(output, format=img.format)
-            output.seek(0)
-            
+            with timed('image'):
+                img = Image.open(uploaded_file)
+                logger.debug("Original image size: %s, format: %s", img.size, img.format)
+                img_with_watermark = add_watermark(img)
+
+                ext = os.path.splitext(uploaded_file.name)[1]
+                original_size = None
+                if getattr(settings, 'MEDIA_OPTIMIZE_ON_UPLOAD', False):
+                    # 上传时即压缩优化 (可能转换格式)，optimize_media 命令不再处理
+                    data, ext = encode_optimized(img_with_watermark, img.format, **media_optimizer.encode_options())
+                    ext, original_size = f'.{ext}', uploaded_file.size
+                else:
+                    # 保存到临时文件
+                    output = BytesIO()
+                    img_with_watermark.save(output, format=img.format)
+                    data = output.getvalue()
+
+            # 生成文件名
+            filename = f"{uuid.uuid4().hex}{ext}"
+            upload_path = os.path.join('attachments', now().strftime('%Y/%m'), filename)
+
             # 保存到存储
-            saved_path = default_storage.save(upload_path, ContentFile(output.getvalue()))
-            file_url = default_storage.url(saved_path)
+            with timed('storage'):
+                saved_path = default_storage.save(upload_path, ContentFile(data))
+                file_url = default_storage.url(saved_path)
+            # 记录图片尺寸，文章保存时据此补全 <img> 的 width/height
+            MediaFile.record(saved_path, *img_with_watermark.size, size=len(data), original_size=original_size)
+            metrics.uploads.inc(status='success')
+            metrics.upload_bytes.inc(len(data))
             
-            print(f"Image saved to: {saved_path}, URL: {file_url}")  # 调试输出
+            logger.debug("Image saved to: %s, URL: %s", saved_path, file_url)
             return JsonResponse({
                 'url': file_url
             })
         except Exception as e:
-            print(f"Error processing image: {str(e)}")  # 调试输出
+            logger.exception("Error processing image: %s", e)
+            metrics.uploads.inc(status='error')
             return JsonResponse({'error': {'message': str(e)}})
     
     return JsonResponse({'error': {'message': '无效请求'}})
 
 
-# 移除 markdown 引用，改用 BeautifulSoup 提取 TOC (可选，或者用前端 JS)
-# 这里我们采用前端 JS 生成 TOC，因为 CKEditor 的 HTML 结构比较复杂
+# 目录在文章保存时由 rendering.render_article 生成，见 Article.refresh_derived_fields
 
 def get_gravatar_url(email):
     if not email:
@@ -109,6 +101,16 @@ def get_gravatar_url(email):
     return f"https://gravatar.loli.net/avatar/{email_hash}?d=identicon&s=40"
 
 
+def get_attachment_size(attachment):
+    """附件文件存在时返回文件大小，不存在时返回 None"""
+    if not attachment.file or not attachment.file.storage.exists(attachment.file.name):
+        return None
+    try:
+        return attachment.file.size
+    except:
+        return 0  # 如果无法获取大小，则设置为0
+
+
 def get_common_context():
     # 标签云
     tags = Tag.objects.annotate(num_times=Count('taggit_taggeditem_items')).order_by('-num_times')[:20]
@@ -120,14 +122,18 @@ def get_common_context():
     random_articles = Article.objects.filter(is_public=True).order_by('?')[:5]
     # 热门文章
     hot_articles = Article.objects.filter(is_public=True).order_by('-views')[:5]
+    # 归档 (最近 12 个有文章的月份，读统计表)
+    archive_months = ArchiveMonth.objects.all()[:12]
 
     return {
         'tags': tags,
         'categories': root_categories,
         'random_articles': random_articles,
-        'hot_articles': hot_articles
+        'hot_articles': hot_articles,
+        'archive_months': archive_months,
     }
 
+@use_readonly_db
 def doc_index(request):
     # 首页展示所有文章
     articles_list = Article.objects.filter(is_public=True).order_by('-created_at')
@@ -151,9 +157,12 @@ def doc_index(request):
         'pagination_links': pagination_links,
         'title': '最新文档'
     })
-    return render(request, 'knowledge/index.html', context)
+    with timed('template'):
+        response = render(request, 'knowledge/index.html', context)
+    return response
 
 
+@use_readonly_db
 def category_detail(request, pk):
     """分类文章列表"""
     category = get_object_or_404(Category, pk=pk)
@@ -186,8 +195,11 @@ def category_detail(request, pk):
         'current_category': category,
         'expanded_ids': expanded_ids,  # 传给模板
     })
-    return render(request, 'knowledge/index.html', context)
+    with timed('template'):
+        response = render(request, 'knowledge/index.html', context)
+    return response
 
+@use_readonly_db
 def tag_detail(request, slug):
     tag = get_object_or_404(Tag, slug=slug)
     articles_list = Article.objects.filter(tags=tag, is_public=True).order_by('-created_at')
@@ -211,24 +223,91 @@ def tag_detail(request, slug):
         'pagination_links': pagination_links,
         'title': f'标签: {tag.name}'
     })
-    return render(request, 'knowledge/index.html', context)
+    with timed('template'):
+        response = render(request, 'knowledge/index.html', context)
+    return response
+
+
+def group_archive_months(months):
+    """把 ArchiveMonth 列表按年分组：[{'year', 'count', 'months'}]"""
+    years = []
+    for month in months:
+        if not years or years[-1]['year'] != month.year:
+            years.append({'year': month.year, 'count': 0, 'months': []})
+        years[-1]['count'] += month.count
+        years[-1]['months'].append(month)
+    return years
 
 
+def archive_period(year, month=None):
+    """归档页的时间范围和标题"""
+    if month is None:
+        return ArchiveMonth.month_range(year, 1)[0], ArchiveMonth.month_range(year, 12)[1], f'归档: {year}年'
+    return (*ArchiveMonth.month_range(year, month), f'归档: {year}年{month}月')
+
+
+def archive_list_queryset(start, end):
+    return Article.objects.filter(is_public=True, created_at__gte=start, created_at__lt=end) \
+        .select_related('category').prefetch_related('tags').order_by('-created_at')
+
+
+@use_readonly_db
+def archive_index(request):
+    """按年月列出归档 (只读统计表，不对文章表分组计数)"""
+    context = get_common_context()
+    context.update({'years': group_archive_months(ArchiveMonth.objects.all()), 'title': '文档归档'})
+    with timed('template'):
+        response = render(request, 'knowledge/archive.html', context)
+    return response
+
+
+@use_readonly_db
+def archive_detail(request, year, month=None):
+    """某年或某月的文章列表；总数取自 ArchiveMonth，不再对文章表 COUNT"""
+    months = ArchiveMonth.objects.filter(year=year)
+    if month is not None:
+        months = months.filter(month=month)
+    total = sum(months.values_list('count', flat=True))
+    if not total:
+        raise Http404
+    start, end, title = archive_period(year, month)
+
+    paginator = Paginator(archive_list_queryset(start, end), 10)
+    paginator.count = total  # count 是 cached_property，赋值后不再查询
+    page_obj = paginator.get_page(request.GET.get('page'))
+    pagination_links = [
+        {'number': i, 'url': f'?page={i}', 'is_active': i == page_obj.number}
+        for i in paginator.page_range
+    ]
+
+    context = get_common_context()
+    context.update({
+        'page_obj': page_obj,
+        'pagination_links': pagination_links,
+        'title': title,
+        'archive_year': year,
+        'archive_month': month,
+    })
+    with timed('template'):
+        response = render(request, 'knowledge/index.html', context)
+    return response
+
+
+@use_readonly_db
+@ratelimit('comment')
+@metrics.doc_detail_duration.timed
 def doc_detail(request, pk):
     article = get_object_or_404(Article, pk=pk)
     article.views += 1
     article.save(update_fields=['views'])
+    metrics.article_views.inc()
 
     if request.method == 'POST':
         comment_form = CommentForm(request.POST)
         if comment_form.is_valid():
             comment = comment_form.save(commit=False)
             comment.article = article
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                comment.ip_address = x_forwarded_for.split(',')[0]
-            else:
-                comment.ip_address = request.META.get('REMOTE_ADDR')
+            comment.ip_address = get_client_ip(request)
             comment.save()
             messages.success(request, '留言提交成功！')
             return redirect('doc_detail', pk=pk)
@@ -243,17 +322,17 @@ def doc_detail(request, pk):
 
     # 过滤出存在的附件
     existing_attachments = []
-    for attachment in article.attachments.all():
+    for attachment in article.attachments.defer('extracted_text'):
         # 检查附件是否已经在文章内容中作为图片出现
         # 如果附件路径出现在文章内容中，则不将其作为单独的附件显示
         attachment_path = attachment.file.name.replace('\\', '/')  # 统一路径分隔符
-        if attachment_path not in article.content:
-            if attachment.file and attachment.file.storage.exists(attachment.file.name):
+        # 用渲染后的正文判断，正文压缩存储时不需要解压
+        if attachment_path not in (article.rendered_content or article.content):
+            with timed('storage'):
+                file_size = get_attachment_size(attachment)
+            if file_size is not None:
                 # 添加文件大小信息
-                try:
-                    attachment.file_size = attachment.file.size
-                except:
-                    attachment.file_size = 0  # 如果无法获取大小，则设置为0
+                attachment.file_size = file_size
                 existing_attachments.append(attachment)
         # 如果文件不存在，则跳过
 
@@ -264,44 +343,36 @@ def doc_detail(request, pk):
         'comments': comments,
         'existing_attachments': existing_attachments
     })
-    return render(request, 'knowledge/detail.html', context)
+    with timed('template'):
+        response = render(request, 'knowledge/detail.html', context)
+    return response
 
 
+@use_readonly_db
+@metrics.search_duration.timed
 def search_view(request):
     query = request.GET.get('q', '').strip()  # 获取并去除首尾空格
 
     if not query:
         return redirect('index')
-    
-    results = []
-
-    if query:
-        # 搜索逻辑 (支持标题、内容、摘要、标签)
-        article_results = Article.objects.filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query) |
-            Q(summary__icontains=query) |
-            Q(tags__name__icontains=query),
-            is_public=True
-        ).distinct()
-
-        # 新增：搜索附件文件名
-        attachment_results = Article.objects.filter(
-            attachments__name__icontains=query,
-            is_public=True
-        ).distinct()
-
-        # 合并搜索结果，避免重复
-        results = (article_results | attachment_results).distinct().order_by('-views')
-    else:
-        # 如果没有关键词，返回空列表 (或者你可以选择返回所有)
-        results = Article.objects.none()
+
+    # 搜索逻辑 (支持标题、内容、摘要、标签、附件文件名)
+    # 结果 id 列表按关键词缓存，翻页和重复搜索只需按 id 取当前页
+    result_ids = search_article_ids(query)
+    metrics.search_requests.inc(result='hit' if result_ids else 'empty')
 
     # === 增加分页逻辑 ===
-    paginator = Paginator(results, 10)  # 每页显示 10 条
+    paginator = Paginator(result_ids, 10)  # 每页显示 10 条
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    articles = Article.objects.filter(pk__in=page_obj.object_list) \
+        .select_related('category').prefetch_related('tags').defer('content', 'content_compressed', 'rendered_content', 'toc')
+    articles_by_id = {art.id: art for art in articles}
+    page_obj.object_list = [articles_by_id[pk] for pk in page_obj.object_list if pk in articles_by_id]
+    for art in page_obj.object_list:
+        art.snippet = build_snippet(art.plain_text, query, fallback=art.summary)
+
     # 创建分页链接列表
     pagination_links = []
     for i in paginator.page_range:
@@ -311,8 +382,160 @@ def search_view(request):
             'is_active': i == page_obj.number
         })
 
-    return render(request, 'knowledge/search.html', {
-        'page_obj': page_obj,  # 传分页对象，不再传 raw list
-        'pagination_links': pagination_links,
-        'query': query
-    })
\ No newline at end of file
+    with timed('template'):
+        response = render(request, 'knowledge/search.html', {
+            'page_obj': page_obj,  # 传分页对象，不再传 raw list
+            'pagination_links': pagination_links,
+            'query': query
+        })
+    return response
+
+
+def parse_range_header(header, size):
+    """解析单段 Range 头，返回 (start, end)；格式不支持时返回 None，范围无效时抛出 ValueError"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    if not start:
+        # bytes=-500 表示最后 500 字节
+        length = int(end)
+        if length <= 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_file_range(file, start, end, chunk_size):
+    """按固定块大小读取文件的 [start, end] 区间"""
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+@use_readonly_db
+def attachment_download(request, pk):
+    """附件下载：校验文章可见性，支持断点续传 (Range) 与条件请求，可交给前端代理发送文件"""
+    attachment = get_object_or_404(Attachment.objects.select_related('article').defer('extracted_text'), pk=pk)
+    if not attachment.article.is_public and not request.user.is_staff:
+        raise Http404
+    storage = attachment.file.storage
+    with timed('storage'):
+        if not attachment.file or not storage.exists(attachment.file.name):
+            raise Http404
+        size = attachment.file.size
+        try:
+            modified = storage.get_modified_time(attachment.file.name)
+        except NotImplementedError:
+            modified = attachment.created_at
+    last_modified = int(modified.timestamp())
+    etag = f'"{attachment.pk}-{size:x}-{last_modified:x}"'
+
+    # If-None-Match / If-Modified-Since 命中时直接返回 304
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return conditional
+
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        # 文件已变化，忽略 Range 返回完整内容
+        range_header = None
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    # 只统计从头开始的下载，续传请求不重复计数
+    if request.method != 'HEAD' and (byte_range is None or byte_range[0] == 0):
+        download_counter.incr(attachment.pk)
+
+    filename = attachment.name or os.path.basename(attachment.file.name)
+    if os.path.splitext(filename)[1] == '':
+        filename += os.path.splitext(attachment.file.name)[1]
+
+    # 对象存储 (knowledge/s3storage.py) 直接跳转到带下载文件名的临时签名地址，由对象存储处理 Range
+    if getattr(storage, 'url_mode', None) in ('redirect', 'public'):
+        return redirect(storage.presigned_url(attachment.file.name, filename=filename))
+
+    sendfile = getattr(settings, 'ATTACHMENT_SENDFILE_BACKEND', None)
+    local_path = None
+    if sendfile:
+        try:
+            local_path = storage.path(attachment.file.name)
+        except NotImplementedError:
+            # 对象存储 (proxy 模式) 没有本地文件，代理无法直接发送，由 Django 读取后返回
+            sendfile = None
+    if sendfile:
+        # 由 Nginx (X-Accel-Redirect) 或 Apache/Lighttpd (X-Sendfile) 发送文件，Range 也由代理处理
+        response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if sendfile == 'nginx':
+            prefix = getattr(settings, 'ATTACHMENT_SENDFILE_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + attachment.file.name.replace('\\', '/')
+        else:
+            response['X-Sendfile'] = local_path
+    else:
+        chunk_size = getattr(settings, 'ATTACHMENT_CHUNK_SIZE', 64 * 1024)
+        file = attachment.file.open('rb')
+        if byte_range is None:
+            response = FileResponse(file)
+            response.block_size = chunk_size
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(iter_file_range(file, start, end, chunk_size), status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate' if not attachment.article.is_public \
+        else 'public, max-age=3600'
+    return response
+
+
+def serve_media(request, path):
+    """对象存储的 MEDIA_URL 入口：跳转到临时签名地址 (redirect 模式) 或从对象存储读取后返回 (proxy 模式)"""
+    storage = default_storage
+    with timed('storage'):
+        if not storage.exists(path):
+            raise Http404
+    if storage.url_mode == 'redirect':
+        response = redirect(storage.presigned_url(path))
+        # 签名地址有有效期，只允许浏览器短时间缓存这次跳转
+        response['Cache-Control'] = 'private, max-age=300'
+        return response
+    response = FileResponse(storage.open(path), content_type=mimetypes.guess_type(path)[0])
+    # 上传文件名带随机串，内容不会变化
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+def metrics_view(request):
+    """Prometheus 指标 (文本格式)；需携带 METRICS_TOKEN 或来自 METRICS_ALLOWED_IPS，否则按不存在处理"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    auth = request.headers.get('Authorization', '')
+    # 不信任 X-Forwarded-For (可伪造)；带有该头的是经反向代理转发的请求，REMOTE_ADDR 是代理地址，
+    # 不按地址放行，代理后部署请使用 METRICS_TOKEN
+    allowed = ('HTTP_X_FORWARDED_FOR' not in request.META
+               and request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+    if token and auth.startswith('Bearer ') and hmac.compare_digest(auth[len('Bearer '):], token):
+        allowed = True
+    if not allowed:
+        raise Http404
+    return HttpResponse(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,119 @@
+/*
+ * 静态导出站点的客户端搜索 (索引由 export_docs 生成，见 knowledge/search_index.py)
+ * 分片哈希规则需与 search_index.py 保持一致，分词的字符范围取自 meta.json；分片按需加载并缓存。
+ */
+(function () {
+  // 中日韩文字的字符范围由 meta.json 提供 (search_index.CJK_RANGES)，与建索引时一致
+  function tokenize(text, cjk) {
+    var token = new RegExp("[a-z0-9]+|[" + cjk + "]+", "g");
+    var isCjk = new RegExp("^[" + cjk + "]");
+    var tokens = [];
+    var runs = (text || "").toLowerCase().match(token) || [];
+    runs.forEach(function (run) {
+      if (isCjk.test(run)) {
+        var chars = Array.from(run);
+        if (chars.length === 1) {
+          tokens.push(run);
+        } else {
+          for (var i = 0; i < chars.length - 1; i++) tokens.push(chars[i] + chars[i + 1]);
+        }
+      } else {
+        tokens.push(run);
+      }
+    });
+    return tokens;
+  }
+
+  function fnv1a(text) {
+    var h = 0x811c9dc5;
+    for (var ch of text) {
+      h = Math.imul(h ^ ch.codePointAt(0), 0x01000193) >>> 0;
+    }
+    return h;
+  }
+
+  function StaticSearch(base) {
+    this.base = base.replace(/\/?$/, "/");
+    this.cache = {};
+  }
+
+  StaticSearch.prototype.load = function (name) {
+    if (!this.cache[name]) {
+      this.cache[name] = fetch(this.base + name).then(function (r) {
+        if (!r.ok) throw new Error(r.status);
+        return r.json();
+      });
+    }
+    return this.cache[name];
+  };
+
+  StaticSearch.prototype.search = function (query) {
+    var self = this;
+    var tokens = [];
+    return this.load("meta.json").then(function (meta) {
+      tokens = Array.from(new Set(tokenize(query, meta.cjk)));
+      if (!tokens.length) return [[]];
+      var shards = tokens.map(function (t) {
+        return self.load("index-" + (fnv1a(t) % meta.shards) + ".json");
+      });
+      return Promise.all([self.load("docs.json")].concat(shards));
+    }).then(function (loaded) {
+      var docs = loaded[0];
+      var scores = {};
+      var hits = {};
+      tokens.forEach(function (token, i) {
+        var postings = loaded[i + 1][token] || [];
+        for (var j = 0; j < postings.length; j += 2) {
+          scores[postings[j]] = (scores[postings[j]] || 0) + postings[j + 1];
+          hits[postings[j]] = (hits[postings[j]] || 0) + 1;
+        }
+      });
+      // 命中全部词的文档优先，其次按得分
+      return Object.keys(scores)
+        .sort(function (a, b) {
+          return hits[b] - hits[a] || scores[b] - scores[a];
+        })
+        .map(function (id) {
+          var doc = docs[id];
+          return { title: doc[0], url: doc[1], summary: doc[2], complete: hits[id] === tokens.length };
+        });
+    });
+  };
+
+  function escapeHtml(text) {
+    var div = document.createElement("div");
+    div.textContent = text;
+    return div.innerHTML;
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    var container = document.getElementById("static-search-results");
+    if (!container) return;
+    var query = new URLSearchParams(location.search).get("q") || "";
+    var input = document.querySelector("input[name=q]");
+    if (input) input.value = query;
+    if (!query.trim()) return;
+
+    container.innerHTML = '<p class="text-muted">搜索中...</p>';
+    new StaticSearch(container.dataset.index).search(query).then(function (results) {
+      var complete = results.filter(function (r) { return r.complete; });
+      if (complete.length) results = complete;
+      if (!results.length) {
+        container.innerHTML = '<p class="text-muted text-center py-5">没有找到与 "' + escapeHtml(query) + '" 相关的文档</p>';
+        return;
+      }
+      container.innerHTML =
+        '<p class="text-muted">找到 ' + results.length + " 篇相关文档</p>" +
+        results.slice(0, 50).map(function (r) {
+          return '<div class="card shadow-sm border-0 mb-3"><div class="card-body">' +
+            '<h5 class="card-title"><a href="' + encodeURI(r.url) + '" class="text-decoration-none">' +
+            escapeHtml(r.title) + "</a></h5>" +
+            '<p class="card-text text-muted small mb-0">' + escapeHtml(r.summary) + "</p></div></div>";
+        }).join("");
+    }).catch(function () {
+      container.innerHTML = '<p class="text-danger">搜索索引加载失败</p>';
+    });
+  });
+
+  window.StaticSearch = StaticSearch;
+})();